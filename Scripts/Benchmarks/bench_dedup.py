@@ -0,0 +1,77 @@
+"""
+Near-duplicate reduction of the index on a saved crawl.
+
+Reads cleaned pages (pages*.ndjson from StreamingPipeline) that have NOT
+been through the near-duplicate filter yet, runs them through
+scraper.dedup.NearDuplicateIndex in crawl order like CleaningPipeline, and
+reports the pages and characters the filter would drop. With --exhaustive,
+every pair is also compared by exact Jaccard similarity to count the
+near-duplicates that LSH banding missed.
+
+Producing the input from a raw corpus (see RawCorpusPipeline):
+
+    scrapy crawl replay -a corpus=output -s NEAR_DUPLICATE_ENABLED=False \\
+        -s REPLAY_OUTPUT_DIR=output/no-near-dedup
+    python Scripts/Benchmarks/bench_dedup.py output/no-near-dedup --exhaustive
+
+Usage: python Scripts/Benchmarks/bench_dedup.py PAGES_DIR_OR_FILE [--threshold 0.9] [--exhaustive]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src" / "function-app" / "scraper"))
+
+from scraper.dedup import NearDuplicateIndex  # noqa: E402
+from scraper.ndjson import corpus_files, iter_records  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--exhaustive", action="store_true", help="also compare every pair exactly (quadratic)")
+    args = parser.parse_args()
+
+    files = corpus_files(args.pages, stem="pages")
+    if not files:
+        sys.exit(f"No pages*.ndjson files found in {args.pages}")
+
+    index = NearDuplicateIndex(threshold=args.threshold, num_perm=args.num_perm)
+    kept, dropped = [], []  # (url, hashes, chars)
+    started = time.perf_counter()
+    for record in iter_records(files):
+        url, content = record["metadata"]["url"], record["content"]
+        hashes = index.shingle_hashes(content)
+        signature = index.signature(content, hashes)
+        if index.query(signature, hashes) is not None:
+            dropped.append((url, hashes, len(content)))
+            continue
+        index.add(url, signature, hashes)
+        kept.append((url, hashes, len(content)))
+    elapsed = time.perf_counter() - started
+
+    pages = len(kept) + len(dropped)
+    kept_chars = sum(c for _, _, c in kept)
+    dropped_chars = sum(c for _, _, c in dropped)
+    print(f"pages            {pages}")
+    print(f"bands x rows     {index.bands} x {index.rows}")
+    print(f"near-duplicates  {len(dropped)} ({100.0 * len(dropped) / max(pages, 1):.1f}% of pages)")
+    print(f"index reduction  {100.0 * dropped_chars / max(kept_chars + dropped_chars, 1):.1f}% of characters "
+          f"({dropped_chars}/{kept_chars + dropped_chars})")
+    print(f"time per page    {1000 * elapsed / max(pages, 1):.1f} ms")
+
+    if args.exhaustive:
+        # A kept page with an exact match among the earlier kept pages is a miss of the banding
+        missed = 0
+        for i, (_, hashes, _) in enumerate(kept):
+            if any(index.jaccard(hashes, other) >= args.threshold for _, other, _ in kept[:i]):
+                missed += 1
+        found = len(dropped)
+        print(f"missed by LSH    {missed} (recall {100.0 * found / max(found + missed, 1):.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
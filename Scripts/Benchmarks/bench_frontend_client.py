@@ -0,0 +1,210 @@
+"""
+Per-message latency of the frontend's HTTP calls: a new connection per
+message (before) vs one pooled keep-alive connection (after).
+
+src/frontend/app.py used to open a new httpx.AsyncClient for every message,
+i.e. a TCP connect and a TLS handshake before each POST /chat; it now keeps
+one client for the process. This script replays the same round trips against
+a local HTTPS stand-in of the backend (instant /get_auth and /chat, plus
+--backend-ms of server time), reached through a TCP proxy that adds --rtt-ms
+of network round trip, like the path from the Chainlit app to the Container
+Apps ingress:
+
+  before  per message: connect + TLS handshake + POST /chat, then close
+  after   per message: POST /chat on a kept-alive connection
+
+Only the standard library is used (http.client, ssl; the certificate is made
+with the openssl CLI), so the client is not httpx itself: the numbers are the
+network and TLS cost the pooling removes, not httpx's own overhead.
+
+Usage:
+    python Scripts/Benchmarks/bench_frontend_client.py
+    python Scripts/Benchmarks/bench_frontend_client.py --rtt-ms 20 50 100 --messages 50 --tls 1.2
+"""
+import argparse
+import http.client
+import json
+import queue
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+# -------------------------------
+# Backend stand-in
+# -------------------------------
+def make_certificate(directory: Path) -> tuple:
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+         "-keyout", str(key), "-out", str(cert)],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+def serve_backend(cert: Path, key: Path, backend_seconds: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the Container Apps ingress
+        disable_nagle_algorithm = True
+
+        def reply(self, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.reply({"access_token": "bench", "expires_in": 3600})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(backend_seconds)
+            self.reply({"response_text": "Risposta di prova."})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class DelayProxy:
+    """TCP proxy that delays every chunk by half the RTT in each direction."""
+
+    def __init__(self, target_port: int, rtt: float):
+        self.target_port = target_port
+        self.one_way = rtt / 2
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            client, _ = self.listener.accept()
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            upstream = socket.create_connection(("127.0.0.1", self.target_port))
+            upstream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for source, sink in ((client, upstream), (upstream, client)):
+                pending = queue.Queue()
+                threading.Thread(target=self._read, args=(source, pending), daemon=True).start()
+                threading.Thread(target=self._deliver, args=(pending, sink), daemon=True).start()
+
+    def _read(self, source: socket.socket, pending: queue.Queue):
+        # Chunks are stamped on arrival, so back-to-back chunks share one delay
+        try:
+            while True:
+                data = source.recv(65536)
+                pending.put((time.monotonic() + self.one_way, data))
+                if not data:
+                    break
+        except OSError:
+            pending.put((0.0, b""))
+
+    def _deliver(self, pending: queue.Queue, sink: socket.socket):
+        try:
+            while True:
+                due, data = pending.get()
+                time.sleep(max(0.0, due - time.monotonic()))
+                if not data:
+                    break
+                sink.sendall(data)
+        except OSError:
+            pass
+        finally:
+            try:
+                sink.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    def connect_delay(self):
+        # The proxy accepts locally at once: charge the SYN/SYN-ACK round trip here
+        time.sleep(2 * self.one_way)
+
+
+# -------------------------------
+# Clients
+# -------------------------------
+def chat(connection: http.client.HTTPSConnection, message: int) -> None:
+    body = json.dumps({"user_prompt": f"Domanda {message}", "session_id": "bench"})
+    connection.request("POST", "/chat", body=body, headers={
+        "Content-Type": "application/json", "Authorization": "Bearer bench",
+    })
+    response = connection.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f"/chat answered {response.status}")
+
+
+def run(mode: str, proxy: DelayProxy, context: ssl.SSLContext, messages: int) -> list:
+    def connect():
+        proxy.connect_delay()
+        connection = http.client.HTTPSConnection("localhost", proxy.port, context=context, timeout=30)
+        connection.connect()
+        connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # as httpx does
+        return connection
+
+    latencies = []
+    pooled = connect() if mode == "after" else None
+    for message in range(messages):
+        started = time.perf_counter()
+        if pooled is None:
+            connection = connect()
+            chat(connection, message)
+            connection.close()
+        else:
+            chat(pooled, message)
+        latencies.append(time.perf_counter() - started)
+    if pooled is not None:
+        pooled.close()
+    return latencies
+
+
+def pct(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(int(p * len(values)), len(values) - 1)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt-ms", type=float, nargs="+", default=[0, 20, 50, 100])
+    parser.add_argument("--backend-ms", type=float, default=0.0, help="server time per /chat (the RAG pipeline)")
+    parser.add_argument("--messages", type=int, default=30)
+    parser.add_argument("--tls", choices=["1.2", "1.3"], default="1.3")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = make_certificate(Path(tmp))
+        server = serve_backend(cert, key, args.backend_ms / 1000)
+        context = ssl.create_default_context(cafile=str(cert))
+        version = ssl.TLSVersion.TLSv1_2 if args.tls == "1.2" else ssl.TLSVersion.TLSv1_3
+        context.minimum_version = context.maximum_version = version
+
+        print(f"TLS {args.tls}, backend {args.backend_ms:.0f} ms, {args.messages} messages per run")
+        print(f"{'rtt ms':>7} {'mode':<7} {'p50 ms':>8} {'p95 ms':>8} {'saved p50':>10}")
+        try:
+            for rtt in args.rtt_ms:
+                proxy = DelayProxy(server.server_address[1], rtt / 1000)
+                results = {mode: run(mode, proxy, context, args.messages) for mode in ("before", "after")}
+                for mode, latencies in results.items():
+                    saved = pct(results["before"], 0.5) - pct(latencies, 0.5)
+                    print(f"{rtt:>7.0f} {mode:<7} {pct(latencies, 0.5):>8.1f} {pct(latencies, 0.95):>8.1f} "
+                          f"{saved if mode == 'after' else 0.0:>10.1f}")
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Overhead of the always-on crawl instrumentation (scraper.metrics).
+
+Times the calls the pipelines and CrawlMetrics make for every item against
+an empty loop, and sets the per-item total against the cheapest stage they
+measure: the HTML to markdown conversion of CleaningPipeline, run here on a
+SYNTHETIC page shaped like a DMI one (needs markdownify and bs4; skipped
+otherwise).
+
+Per item a crawl with the default pipelines makes about 5 metrics.time()
+blocks (clean.html_to_markdown, clean.hash, clean.near_duplicate,
+blob.list, blob.upload), 3 inc() and 1 observe() (response_received and
+item_scraped in CrawlMetrics).
+
+Usage: python Scripts/Benchmarks/bench_metrics.py [--calls 200000] [--page-kb 30]
+"""
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src" / "function-app" / "scraper"))
+
+from scraper.metrics import MetricsRecorder  # noqa: E402
+
+TIME_BLOCKS_PER_ITEM = 5
+INCS_PER_ITEM = 3
+OBSERVES_PER_ITEM = 1
+
+
+def per_call_ns(stmt, calls: int, repeat: int, **namespace) -> float:
+    best = min(timeit.repeat(stmt, globals=namespace, number=calls, repeat=repeat))
+    return best / calls * 1e9
+
+
+def synthetic_page(kb: int, seed: int = 3) -> str:
+    rng = random.Random(seed)
+    words = [f"parola{i}" for i in range(3000)]
+    parts, size = [], 0
+    while size < kb * 1024:
+        block = (f"<h2>Sezione {len(parts)}</h2><p>{' '.join(rng.choices(words, k=80))}</p>"
+                 f"<ul>{''.join(f'<li><a href=/corsi/{i}>Corso {i}</a></li>' for i in range(5))}</ul>")
+        parts.append(block)
+        size += len(block)
+    return f"<html><body><main id='it-main'>{''.join(parts)}</main></body></html>"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--page-kb", type=int, default=30, help="size of the synthetic page")
+    args = parser.parse_args()
+
+    recorder = MetricsRecorder()
+    baseline = per_call_ns("pass", args.calls, args.repeat)
+    costs = {
+        "metrics.time() block": per_call_ns("with r.time('stage'):\n    pass", args.calls, args.repeat, r=recorder),
+        "observe()": per_call_ns("r.observe('download', 0.05)", args.calls, args.repeat, r=recorder),
+        "inc()": per_call_ns("r.inc('pages')", args.calls, args.repeat, r=recorder),
+    }
+    costs = {name: ns - baseline for name, ns in costs.items()}
+    per_item = (TIME_BLOCKS_PER_ITEM * costs["metrics.time() block"]
+                + INCS_PER_ITEM * costs["inc()"] + OBSERVES_PER_ITEM * costs["observe()"])
+
+    print(f"{'call':<22} {'ns/call':>9}")
+    for name, ns in costs.items():
+        print(f"{name:<22} {ns:>9.0f}")
+    print(f"{'per item':<22} {per_item:>9.0f}  "
+          f"({TIME_BLOCKS_PER_ITEM} time, {INCS_PER_ITEM} inc, {OBSERVES_PER_ITEM} observe)")
+
+    try:
+        from bs4 import BeautifulSoup
+        from markdownify import markdownify as md
+    except ImportError:
+        print("markdownify/bs4 not installed: no comparison with the HTML to markdown stage")
+        return
+    html = synthetic_page(args.page_kb)
+
+    def convert():
+        md(str(BeautifulSoup(html, "html.parser").find("main", id="it-main")))
+
+    convert_ns = min(timeit.repeat(convert, number=5, repeat=args.repeat)) / 5 * 1e9
+    print(f"\nHTML to markdown, {args.page_kb} KB SYNTHETIC page: {convert_ns / 1e6:.2f} ms")
+    print(f"instrumentation per item: {100 * per_item / convert_ns:.4f}% of that stage alone")
+
+
+if __name__ == "__main__":
+    main()
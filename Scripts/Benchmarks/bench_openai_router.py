@@ -0,0 +1,229 @@
+"""
+Azure OpenAI router under throttling, against local fake deployments.
+
+Starts one local HTTP server per fake deployment, speaking the Azure OpenAI
+chat completions API. Each server has its own latency, a token quota per
+window and an error rate. Over quota it answers 429 with retry-after-ms, like
+Azure. Successful responses carry the x-ratelimit-remaining-* headers.
+Closed-loop users then send a rewrite call (64 tokens) and a generation call
+(500 tokens) per iteration through services/openai_service.OpenAIRouter.
+
+Two setups are compared:
+  single  the first generation deployment serves both roles, SDK retries on
+          (the backend before the router)
+  router  every fake deployment, by role, with failover and circuit breaking
+
+Fake deployments: NAME:ROLES:LATENCY_MS:TOKENS_PER_WINDOW[:ERROR_RATE], ROLES
+being "rewrite", "generation" or "rewrite+generation". --outage NAME START END
+makes a deployment fail (500) between START and END seconds into each run.
+
+Usage:
+    python Scripts/Benchmarks/bench_openai_router.py
+    python Scripts/Benchmarks/bench_openai_router.py --users 32 --duration 30 --window 10 \\
+        --fake gen-a:generation:400:40000 gen-b:generation:600:80000 mini:rewrite:80:100000 \\
+        --outage gen-b 10 20
+"""
+import argparse
+import asyncio
+import logging
+import random
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src" / "container-app"))
+
+from services.openai_service import Deployment, OpenAIRouter  # noqa: E402
+
+API_VERSION = "2024-10-21"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def parse_fake(spec: str) -> dict:
+    parts = spec.split(":")
+    if len(parts) not in (4, 5):
+        raise argparse.ArgumentTypeError(f"Expected NAME:ROLES:LATENCY_MS:TOKENS_PER_WINDOW[:ERROR_RATE], got {spec!r}")
+    return {
+        "name": parts[0],
+        "roles": parts[1].split("+"),
+        "latency": float(parts[2]) / 1000,
+        "quota": int(parts[3]),
+        "error_rate": float(parts[4]) if len(parts) == 5 else 0.0,
+    }
+
+
+# -------------------------------
+# Fake Azure OpenAI deployment
+# -------------------------------
+class FakeDeployment:
+    """Token quota per fixed window, like Azure's tokens-per-minute (with a shorter window)."""
+
+    def __init__(self, spec: dict, window: float):
+        self.spec = spec
+        self.window = window
+        self.window_start = time.monotonic()
+        self.used = 0
+        self.requests = 0
+        self.outage = None  # (start, end), monotonic
+
+    def app(self):
+        from fastapi import FastAPI, Request
+        from fastapi.responses import JSONResponse
+
+        app = FastAPI()
+
+        @app.post("/openai/deployments/{deployment}/chat/completions")
+        async def chat(deployment: str, request: Request):
+            body = await request.json()
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start, self.used, self.requests = now, 0, 0
+            retry_ms = int((self.window_start + self.window - now) * 1000) + 1
+            prompt_tokens = sum(len(m.get("content") or "") for m in body["messages"]) // 4
+            cost = prompt_tokens + body.get("max_completion_tokens", 500)
+
+            if self.outage and self.outage[0] <= now < self.outage[1] or random.random() < self.spec["error_rate"]:
+                return JSONResponse({"error": {"code": "InternalServerError", "message": "fake failure"}}, status_code=500)
+            if self.used + cost > self.spec["quota"]:
+                return JSONResponse(
+                    {"error": {"code": "429", "message": "Rate limit is exceeded."}},
+                    status_code=429,
+                    headers={"retry-after-ms": str(retry_ms), "retry-after": str(retry_ms // 1000 + 1),
+                             "x-ratelimit-remaining-tokens": str(max(0, self.spec["quota"] - self.used))},
+                )
+            self.used += cost
+            self.requests += 1
+            await asyncio.sleep(self.spec["latency"] * random.uniform(0.8, 1.3))
+            completion_tokens = min(body.get("max_completion_tokens", 500), 120)
+            return JSONResponse(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": deployment,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "Risposta di prova."}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                },
+                headers={"x-ratelimit-remaining-tokens": str(self.spec["quota"] - self.used),
+                         "x-ratelimit-remaining-requests": str(max(0, 1000 - self.requests))},
+            )
+
+        return app
+
+
+async def start_fakes(specs: list, window: float) -> tuple:
+    import uvicorn
+
+    fakes, servers = {}, []
+    for spec in specs:
+        fake = FakeDeployment(spec, window)
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(fake.app(), host="127.0.0.1", port=port, log_level="warning", access_log=False))
+        servers.append((server, asyncio.create_task(server.serve())))
+        fakes[spec["name"]] = (fake, f"http://127.0.0.1:{port}")
+    while not all(server.started for server, _ in servers):
+        await asyncio.sleep(0.05)
+    return fakes, servers
+
+
+# -------------------------------
+# Load
+# -------------------------------
+def build_router(setup: str, specs: list, fakes: dict) -> OpenAIRouter:
+    from openai import AsyncAzureOpenAI
+
+    def client(name, max_retries):
+        return AsyncAzureOpenAI(api_key="fake", azure_endpoint=fakes[name][1], api_version=API_VERSION, max_retries=max_retries)
+
+    if setup == "single":
+        first = next(s for s in specs if "generation" in s["roles"])
+        return OpenAIRouter([Deployment(first["name"], client(first["name"], 2), first["name"])], max_attempts=1)
+    return OpenAIRouter([Deployment(s["name"], client(s["name"], 0), s["name"], roles=s["roles"]) for s in specs])
+
+
+async def run_setup(setup: str, specs: list, args) -> dict:
+    fakes, servers = await start_fakes(specs, args.window)
+    router = build_router(setup, specs, fakes)
+    for name, start, end in args.outage or []:
+        now = time.monotonic()
+        fakes[name][0].outage = (now + float(start), now + float(end))
+
+    latencies = {"rewrite": [], "generation": []}
+    failures = {"rewrite": 0, "generation": 0}
+    stop_at = time.monotonic() + args.duration
+
+    async def call(role: str, max_tokens: int):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(router.create(
+                role,
+                messages=[{"role": "user", "content": "Quando iniziano le lezioni del secondo semestre? " * 20}],
+                max_completion_tokens=max_tokens,
+            ), timeout=args.timeout)
+            latencies[role].append(time.perf_counter() - started)
+        except Exception:
+            failures[role] += 1
+
+    async def user():
+        while time.monotonic() < stop_at:
+            await call("rewrite", 64)
+            await call("generation", 500)
+
+    try:
+        await asyncio.gather(*(user() for _ in range(args.users)))
+    finally:
+        await router.close()
+        for server, task in servers:
+            server.should_exit = True
+            await task
+
+    def pct(values, p):
+        values = sorted(values)
+        return values[min(int(p * len(values)), len(values) - 1)] * 1000 if values else 0.0
+
+    return {
+        "setup": setup,
+        "roles": {role: {"ok": len(v), "failed": failures[role], "p50_ms": pct(v, 0.5), "p95_ms": pct(v, 0.95)}
+                  for role, v in latencies.items()},
+        "deployments": router.status(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fake", type=parse_fake, nargs="+", default=[
+        parse_fake("gen-a:generation:300:30000"),
+        parse_fake("gen-b:generation:500:60000"),
+        parse_fake("mini:rewrite:80:60000"),
+    ])
+    parser.add_argument("--setups", nargs="+", choices=["single", "router"], default=["single", "router"])
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per setup")
+    parser.add_argument("--window", type=float, default=10.0, help="quota window of the fakes, seconds")
+    parser.add_argument("--timeout", type=float, default=25.0, help="per call, like CHAT_DEADLINE_SECONDS")
+    parser.add_argument("--outage", nargs=3, action="append", metavar=("NAME", "START", "END"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+    for setup in args.setups:
+        result = asyncio.run(run_setup(setup, args.fake, args))
+        print(f"\n== {setup}: users={args.users} duration={args.duration}s window={args.window}s")
+        print(f"{'role':<11} {'ok':>6} {'failed':>6} {'p50 ms':>8} {'p95 ms':>8}")
+        for role, r in result["roles"].items():
+            print(f"{role:<11} {r['ok']:>6} {r['failed']:>6} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}")
+        print(f"{'deployment':<11} {'calls':>6} {'429':>6} {'errors':>6}  circuit  latency EWMA")
+        for d in result["deployments"]:
+            print(f"{d['name']:<11} {d['calls']:>6} {d['throttled']:>6} {d['errors']:>6}  "
+                  f"{'open' if d['circuit_open'] else 'closed':<7}  {d['latency_ewma']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Retrieval quality vs latency over a labelled question set.
+
+Runs retrieval for every configuration of a grid (top_k x snippet fields x
+query type) and reports, per configuration:
+  recall@k, MRR, prompt tokens of the context block, p50/p95 search latency
+plus whether the configuration is Pareto-optimal on (recall, tokens, p95).
+
+Question set: JSON list or JSONL, one object per question:
+    {"question": "Quando iniziano le lezioni del secondo semestre?",
+     "expected_urls": ["https://web.dmi.unict.it/..."]}
+
+Backends:
+  --mode live     query an Azure AI Search index (or a local emulator) given by
+                  --endpoint/--index/--key (defaults: AZURE_AI_SEARCH_URL,
+                  AZURE_AI_SEARCH_INDEX_NAME, AZURE_AI_SEARCH_KEY)
+  --mode record   same as live, and save every response to --recording
+  --mode replay   answer from a recording: no network; latencies are the
+                  recorded ones, so only quality/tokens are exact
+
+Usage:
+    python Scripts/Benchmarks/bench_retrieval.py questions.jsonl --mode record --recording rec.json
+    python Scripts/Benchmarks/bench_retrieval.py questions.jsonl --mode replay --recording rec.json \\
+        --top-k 3 5 8 --snippet-fields chunk,content heading+content --json results.json
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src" / "container-app"))
+
+from services.rag_service import format_context  # noqa: E402
+from services.search_service import search_options, snippet_of  # noqa: E402
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4  # ~4 chars per token
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url or "")
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}{'?' + parts.query if parts.query else ''}"
+
+
+def load_questions(path: Path) -> list:
+    text = path.read_text(encoding="utf-8").strip()
+    items = json.loads(text) if text.startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+    for item in items:
+        if not item.get("question") or not item.get("expected_urls"):
+            raise ValueError(f"Each question needs 'question' and 'expected_urls': {item}")
+    return items
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+
+# -------------------------------
+# Backends: search(question, top_k, query_type) -> (raw docs, seconds)
+# -------------------------------
+class LiveBackend:
+    def __init__(self, endpoint: str, index: str, key: str, semantic_config: str | None):
+        from azure.core.credentials import AzureKeyCredential
+        from azure.search.documents import SearchClient
+
+        self.client = SearchClient(endpoint=endpoint, index_name=index, credential=AzureKeyCredential(key))
+        self.semantic_config = semantic_config
+
+    def search(self, question: str, top_k: int, query_type: str):
+        start = time.perf_counter()
+        docs = [dict(doc) for doc in self.client.search(question, top=top_k, **search_options(query_type, self.semantic_config))]
+        return docs, time.perf_counter() - start
+
+
+class RecordingBackend:
+    """Live backend that keeps every response, saved with save()."""
+
+    def __init__(self, live: LiveBackend, path: Path):
+        self.live = live
+        self.path = path
+        self.records = {}
+
+    def search(self, question: str, top_k: int, query_type: str):
+        docs, seconds = self.live.search(question, top_k, query_type)
+        key = f"{query_type}|{question}"
+        previous = self.records.get(key)
+        # Keep the deepest result list: smaller top_k are replayed by truncation
+        if previous is None or len(docs) >= len(previous["docs"]):
+            self.records[key] = {"docs": docs, "latencies": dict(previous["latencies"]) if previous else {}}
+        self.records[key]["latencies"][str(top_k)] = seconds
+        return docs, seconds
+
+    def save(self):
+        self.path.write_text(json.dumps(self.records, ensure_ascii=False, indent=1, default=str), encoding="utf-8")
+
+
+class ReplayBackend:
+    def __init__(self, path: Path):
+        self.records = json.loads(path.read_text(encoding="utf-8"))
+
+    def search(self, question: str, top_k: int, query_type: str):
+        record = self.records.get(f"{query_type}|{question}")
+        if record is None:
+            raise KeyError(f"No recording for query_type={query_type!r} question={question!r}")
+        latencies = record["latencies"]
+        seconds = latencies.get(str(top_k))
+        if seconds is None:
+            seconds = latencies[min(latencies, key=lambda k: abs(int(k) - top_k))]
+        return record["docs"][:top_k], seconds
+
+
+# -------------------------------
+# Benchmark
+# -------------------------------
+def evaluate(questions: list, responses: list, top_k: int, snippet_fields: tuple, query_type: str) -> dict:
+    """Score one configuration; responses[i] = (raw docs, seconds) for questions[i]."""
+    recalls, reciprocal_ranks, tokens, latencies = [], [], [], []
+    for item, (raw_docs, seconds) in zip(questions, responses):
+        latencies.append(seconds)
+        expected = {normalize_url(u) for u in item["expected_urls"]}
+        retrieved = [normalize_url(d.get("url")) for d in raw_docs]
+
+        recalls.append(len(expected & set(retrieved)) / len(expected))
+        rank = next((i + 1 for i, url in enumerate(retrieved) if url in expected), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+        docs = [SimpleNamespace(title=d.get("title"), url=d.get("url"), snippet=snippet_of(d, snippet_fields))
+                for d in raw_docs]
+        tokens.append(count_tokens(format_context(docs)))
+
+    n = len(questions)
+    return {
+        "top_k": top_k,
+        "snippet_fields": ",".join(snippet_fields),
+        "query_type": query_type,
+        "recall_at_k": round(sum(recalls) / n, 4),
+        "mrr": round(sum(reciprocal_ranks) / n, 4),
+        "prompt_tokens_mean": round(sum(tokens) / n, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+    }
+
+
+def mark_pareto(results: list) -> None:
+    """Pareto-optimal: no other configuration is at least as good on recall,
+    prompt tokens and p95 latency, and strictly better on one of them."""
+    def key(r):
+        return (r["recall_at_k"], -r["prompt_tokens_mean"], -r["latency_p95_ms"])
+
+    for r in results:
+        a = key(r)
+        r["pareto"] = not any(
+            all(x >= y for x, y in zip(key(o), a)) and key(o) != a for o in results if o is not r
+        )
+
+
+def print_table(results: list) -> None:
+    header = f"{'top_k':>5} {'snippet':<16} {'query':<8} {'recall@k':>8} {'MRR':>6} {'tokens':>7} {'p50 ms':>8} {'p95 ms':>8}  pareto"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['top_k']:>5} {r['snippet_fields']:<16} {r['query_type']:<8} {r['recall_at_k']:>8.3f} "
+              f"{r['mrr']:>6.3f} {r['prompt_tokens_mean']:>7.0f} {r['latency_p50_ms']:>8.1f} "
+              f"{r['latency_p95_ms']:>8.1f}  {'*' if r['pareto'] else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", type=Path)
+    parser.add_argument("--mode", choices=["live", "record", "replay"], default="replay")
+    parser.add_argument("--recording", type=Path, default=Path("retrieval_recording.json"))
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3, 5, 8])
+    parser.add_argument("--snippet-fields", nargs="+", default=["chunk,content"],
+                        help="comma separated fields tried in order; 'a+b' joins two fields")
+    parser.add_argument("--query-type", nargs="+", default=["simple"], choices=["simple", "full", "semantic"])
+    parser.add_argument("--semantic-config", default=os.getenv("SEARCH_SEMANTIC_CONFIG"))
+    parser.add_argument("--endpoint", default=os.getenv("AZURE_AI_SEARCH_URL"))
+    parser.add_argument("--index", default=os.getenv("AZURE_AI_SEARCH_INDEX_NAME"))
+    parser.add_argument("--key", default=os.getenv("AZURE_AI_SEARCH_KEY"))
+    parser.add_argument("--json", type=Path, help="also write the results as JSON")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    if args.mode == "replay":
+        backend = ReplayBackend(args.recording)
+    else:
+        if not (args.endpoint and args.index and args.key):
+            parser.error("live/record mode needs --endpoint, --index and --key (or the AZURE_AI_SEARCH_* env vars)")
+        if "semantic" in args.query_type and not args.semantic_config:
+            parser.error("--query-type semantic needs --semantic-config (or SEARCH_SEMANTIC_CONFIG)")
+        backend = LiveBackend(args.endpoint, args.index, args.key, args.semantic_config)
+        if args.mode == "record":
+            backend = RecordingBackend(backend, args.recording)
+
+    results = []
+    # Deepest top_k first, so a recording holds enough results for every smaller k
+    for query_type, top_k in itertools.product(args.query_type, sorted(args.top_k, reverse=True)):
+        # Snippet fields do not change the search: one request per question
+        responses = [backend.search(item["question"], top_k, query_type) for item in questions]
+        for fields in args.snippet_fields:
+            snippet_fields = tuple(f.strip() for f in fields.split(",") if f.strip())
+            results.append(evaluate(questions, responses, top_k, snippet_fields, query_type))
+    if isinstance(backend, RecordingBackend):
+        backend.save()
+        print(f"Recorded {len(backend.records)} responses to {args.recording}")
+
+    results.sort(key=lambda r: (r["query_type"], r["top_k"], r["snippet_fields"]))
+    mark_pareto(results)
+    print(f"{len(questions)} questions, tokens counted with {'tiktoken' if _encoding else '~4 chars/token'}")
+    print_table(results)
+    if args.json:
+        args.json.write_text(json.dumps({"questions": len(questions), "results": results}, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Throughput benchmark of the backend server profile: single vs multi worker.
+
+Runs the real FastAPI app from src/container-app/main.py under uvicorn, with
+the per-worker clients replaced by local stand-ins (in-memory Redis, Azure AI
+Search and Azure OpenAI with configurable latency) and JWT validation
+disabled, then drives POST /chat with a closed-loop load generator.
+
+The stand-ins are installed by replacing main.open_clients/close_clients,
+i.e. the same per-worker hook used in production, so every worker builds its
+own set after the fork. The in-memory Redis is per worker: each virtual user
+keeps its own session, so this only changes which worker sees the history,
+not the amount of work per request.
+
+Usage:
+    python Scripts/Benchmarks/bench_server.py                      # 1 worker vs os.cpu_count()
+    python Scripts/Benchmarks/bench_server.py --workers 1 2 4 --users 64 --duration 20
+    python Scripts/Benchmarks/bench_server.py --openai-ms 0 --search-ms 0   # CPU-bound profile
+
+The load generator runs on the same machine: use --users large enough to
+saturate the server and read the multi-worker numbers relative to the cores
+actually left to the server.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKEND_DIR = Path(__file__).resolve().parents[2] / "src" / "container-app"
+
+# -------------------------------
+# Server side: stand-in app (imported by uvicorn as bench_server:app)
+# -------------------------------
+STANDIN_ENV = {
+    "KEY_VAULT_URL": "https://bench.invalid/",
+    "AZURE_REDIS_CACHE_SECRET_NAME": "bench",
+    "AZURE_OPENAI_SECRET_NAME": "bench",
+    "AZURE_AI_SEARCH_SECRET_NAME": "bench",
+    "AZURE_CLIENT_SECRET_NAME": "bench",
+    "AZURE_AI_SEARCH_URL": "https://bench.invalid",
+    "AZURE_AI_SEARCH_INDEX_NAME": "bench",
+    "AZURE_ENTRAID_CLIENT_ID": "00000000-0000-0000-0000-000000000000",
+    "AZURE_TENANT_ID": "00000000-0000-0000-0000-000000000000",
+    "AZURE_OPENAI_DEPLOYMENT": "bench",
+}
+
+SNIPPET = (
+    "Il Corso di Laurea in Informatica del Dipartimento di Matematica e Informatica "
+    "prevede insegnamenti di base e caratterizzanti, laboratori e un tirocinio finale. "
+) * 8
+
+
+def _latency(name: str) -> float:
+    return float(os.environ.get(name, "0")) / 1000
+
+
+class StandInRedis:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.data = {}
+
+    async def get(self, key):
+        await asyncio.sleep(self.latency)
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        await asyncio.sleep(self.latency)
+        self.data[key] = value
+
+    async def expire(self, key, ttl):
+        return key in self.data
+
+    def pipeline(self, transaction=True):
+        return _StandInPipeline(self)
+
+    async def aclose(self):
+        pass
+
+
+class _StandInPipeline:
+    """Queued commands are applied on execute(), with a single round trip of latency."""
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.commands.clear()
+
+    def zincrby(self, key, amount, member):
+        self.commands.append(("zincrby", key, amount, member))
+
+    def setex(self, key, ttl, value):
+        self.commands.append(("setex", key, value))
+
+    def expire(self, key, ttl):
+        pass
+
+    async def execute(self):
+        await asyncio.sleep(self.redis.latency)
+        for command in self.commands:
+            if command[0] == "setex":
+                self.redis.data[command[1]] = command[2]
+            else:
+                _, key, amount, member = command
+                counts = self.redis.data.setdefault(key, {})
+                counts[member] = counts.get(member, 0) + amount
+
+
+class _SearchResults:
+    def __init__(self, docs):
+        self._docs = docs
+
+    async def __aiter__(self):
+        for doc in self._docs:
+            yield doc
+
+
+class StandInSearch:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def search(self, query, top=5):
+        await asyncio.sleep(self.latency)
+        return _SearchResults([
+            {"title": f"Pagina {i}", "url": f"https://web.dmi.unict.it/pagina-{i}", "content": SNIPPET}
+            for i in range(top)
+        ])
+
+    async def close(self):
+        pass
+
+
+class StandInOpenAI:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            create=self.create, with_raw_response=SimpleNamespace(create=self.create_raw)
+        ))
+
+    async def create(self, messages, max_completion_tokens=500, **kwargs):
+        await asyncio.sleep(self.latency)
+        content = "domanda riscritta" if max_completion_tokens < 100 else "Risposta di prova. " * 20
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    async def create_raw(self, **kwargs):
+        completion = await self.create(**kwargs)
+        return SimpleNamespace(headers={}, parse=lambda: completion)
+
+    async def close(self):
+        pass
+
+
+def _standin_app():
+    for key, value in STANDIN_ENV.items():
+        os.environ.setdefault(key, value)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import main
+
+    async def open_clients():
+        main.redis_client = StandInRedis(_latency("BENCH_REDIS_MS"))
+        main.index_pointer = main.GenerationPointer(main.redis_client, main.AI_SEARCH_INDEX_NAME)
+        main.search_clients[main.AI_SEARCH_INDEX_NAME] = StandInSearch(_latency("BENCH_SEARCH_MS"))
+        main.openai_router = main.OpenAIRouter([main.Deployment("bench", StandInOpenAI(_latency("BENCH_OPENAI_MS")), "bench")])
+        main.write_queue = main.WriteQueue(main.redis_client)
+        main.write_queue.start()
+
+    async def close_clients():
+        await main.write_queue.close()
+
+    main.open_clients = open_clients
+    main.close_clients = close_clients
+    main.app.dependency_overrides[main.verify_jwt] = lambda: {}
+    return main.app
+
+
+if os.environ.get("BENCH_SERVER_STANDIN"):
+    app = _standin_app()
+
+
+# -------------------------------
+# Client side: server runner + load generator
+# -------------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, port: int, args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        BENCH_SERVER_STANDIN="1",
+        BENCH_REDIS_MS=str(args.redis_ms),
+        BENCH_SEARCH_MS=str(args.search_ms),
+        BENCH_OPENAI_MS=str(args.openai_ms),
+    )
+    cmd = [
+        sys.executable, "-m", "uvicorn", "bench_server:app",
+        "--app-dir", str(Path(__file__).resolve().parent),
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ]
+    if not args.no_uvloop:
+        cmd += ["--loop", "uvloop", "--http", "httptools"]
+    return subprocess.Popen(cmd, env=env)
+
+
+async def wait_ready(client, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+async def run_load(base_url: str, users: int, duration: float, turns: int) -> dict:
+    import httpx
+
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_ready(client)
+        stop_at = time.monotonic() + duration
+
+        async def user():
+            nonlocal errors
+            while time.monotonic() < stop_at:
+                session_id = str(uuid.uuid4())
+                for turn in range(turns):
+                    if time.monotonic() >= stop_at:
+                        return
+                    start = time.perf_counter()
+                    try:
+                        resp = await client.post("/chat", json={
+                            "session_id": session_id,
+                            "user_prompt": f"Quali sono gli esami del primo anno? ({turn})",
+                        })
+                        ok = resp.status_code == 200
+                    except httpx.HTTPError:
+                        ok = False
+                    if ok:
+                        latencies.append(time.perf_counter() - start)
+                    else:
+                        errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(user() for _ in range(users)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1000 if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--users", type=int, default=32, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per run")
+    parser.add_argument("--turns", type=int, default=4, help="messages per session (turns > 1 exercise rewriting)")
+    parser.add_argument("--redis-ms", type=float, default=1.0)
+    parser.add_argument("--search-ms", type=float, default=40.0)
+    parser.add_argument("--openai-ms", type=float, default=150.0)
+    parser.add_argument("--no-uvloop", action="store_true", help="use the default asyncio loop and h11")
+    args = parser.parse_args()
+
+    print(f"users={args.users} duration={args.duration}s latencies: redis={args.redis_ms}ms "
+          f"search={args.search_ms}ms openai={args.openai_ms}ms cores={os.cpu_count()}")
+    print(f"{'workers':>7} {'requests':>9} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for workers in args.workers:
+        port = free_port()
+        server = start_server(workers, port, args)
+        try:
+            result = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.users, args.duration, args.turns))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        print(f"{workers:>7} {result['requests']:>9} {result['errors']:>6} {result['rps']:>8.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
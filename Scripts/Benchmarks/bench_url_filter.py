@@ -0,0 +1,113 @@
+"""
+Micro-benchmark for the DMISpider link filter and URL canonicalization.
+
+Compares the previous linear checks (`any(part in url ...)` and one
+`endswith` per denied extension) with the precompiled matchers in
+scraper.urls, and counts how many fetches canonicalization collapses.
+
+By default the links are SYNTHETIC, shaped like the DMI site with
+made-up rates of http links, trailing slashes and session parameters:
+the duplicate count then only reflects those rates. For a real figure,
+pass a link dump with --link-dump (one extracted link per line, e.g.
+collected from a crawl log); the urls/duplicates_avoided crawl stat
+gives the same count for a live crawl.
+
+Usage: python Scripts/Benchmarks/bench_url_filter.py [--links 50000] [--link-dump links.txt]
+"""
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src" / "function-app" / "scraper"))
+
+from scraper.urls import (  # noqa: E402
+    DENY_EXTENSIONS,
+    EXCLUDE_SUBSTRINGS,
+    ExtensionMatcher,
+    SubstringMatcher,
+    canonicalize_url,
+)
+
+SECTIONS = ['corsi/l-31', 'corsi/lm-18', 'corsi/l-35', 'insegnamenti', 'docenti', 'personale',
+            'ricerca', 'laboratori', 'servizi', 'orari', 'didattica', 'dipartimento']
+
+
+def make_links(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    links = []
+    for _ in range(n):
+        section = rng.choice(SECTIONS)
+        path = f"/{section}/{rng.choice(['', 'pagina-', 'info-'])}{rng.randrange(400)}"
+        roll = rng.random()
+        if roll < 0.08:
+            path += f".{rng.choice(['pdf', 'docx', 'jpg', 'zip', 'tar.gz'])}"
+        elif roll < 0.15:
+            path = f"/{rng.choice(['notizie', 'avvisi', 'bandi'])}{path}"
+        scheme = 'http' if rng.random() < 0.1 else 'https'
+        slash = '/' if rng.random() < 0.3 else ''
+        query = ''
+        if rng.random() < 0.2:
+            params = [f"anno={rng.choice(['2024', '2025'])}", f"canale={rng.randrange(3)}"]
+            rng.shuffle(params)
+            if rng.random() < 0.3:
+                params.append(f"PHPSESSID={rng.getrandbits(64):x}")
+            query = '?' + '&'.join(params)
+        links.append(f"{scheme}://web.dmi.unict.it{path}{slash}{query}")
+    return links
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--links", type=int, default=50000, help="number of synthetic links")
+    parser.add_argument("--link-dump", type=Path, help="real links, one per line, instead of synthetic ones")
+    parser.add_argument("--strip-trailing-slash", action="store_true")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.link_dump:
+        links = [line.strip() for line in args.link_dump.read_text(encoding="utf-8").splitlines() if line.strip()]
+        source = f"link dump {args.link_dump}"
+    else:
+        links = make_links(args.links)
+        source = "SYNTHETIC links (made-up duplicate rates)"
+
+    def canonical(u):
+        return canonicalize_url(u, strip_trailing_slash=args.strip_trailing_slash)
+
+    is_excluded = SubstringMatcher(EXCLUDE_SUBSTRINGS)
+    has_denied_extension = ExtensionMatcher(DENY_EXTENSIONS)
+    deny_set = set(DENY_EXTENSIONS)
+
+    def linear():
+        return [
+            not any(part in u for part in EXCLUDE_SUBSTRINGS)
+            and not any(u.lower().endswith('.' + ext) for ext in deny_set)
+            for u in links
+        ]
+
+    def compiled():
+        return [not is_excluded(u) and not has_denied_extension(u) for u in links]
+
+    assert linear() == compiled(), "matchers disagree with the linear checks"
+
+    t_linear = min(timeit.repeat(linear, number=1, repeat=args.repeat))
+    t_compiled = min(timeit.repeat(compiled, number=1, repeat=args.repeat))
+    followed = [u for u, keep in zip(links, compiled()) if keep]
+    t_canon = min(timeit.repeat(lambda: [canonical(u) for u in followed], number=1, repeat=args.repeat))
+
+    raw_unique = len(set(followed))
+    canonical_unique = len({canonical(u) for u in followed})
+
+    print(f"source: {source}")
+    print(f"links: {len(links)}, followed: {len(followed)}")
+    print(f"linear filter:   {1e6 * t_linear / len(links):.2f} us/link")
+    print(f"compiled filter: {1e6 * t_compiled / len(links):.2f} us/link ({t_linear / t_compiled:.1f}x)")
+    print(f"canonicalize:    {1e6 * t_canon / max(len(followed), 1):.2f} us/link")
+    print(f"unique followed URLs: {raw_unique} raw -> {canonical_unique} canonical "
+          f"({raw_unique - canonical_unique} duplicate fetches avoided)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,23 @@
 """ FastAPI + Azure AI Search Integration (Async RAG Orchestrator) """
 import os
 import json
+import time
+import asyncio
 import logging
-from typing import List, Dict, Any
+import uuid
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Tuple
 
 from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 from azure.search.documents.aio import SearchClient
+from azure.search.documents.indexes.aio import SearchIndexClient
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ResourceNotFoundError
 logging.getLogger("azure").setLevel(logging.WARNING)
 
 import jwt
@@ -24,14 +31,39 @@ from openai import AsyncAzureOpenAI
 #from dotenv import load_dotenv
 
 import httpx
-from models.models import ChatRequest, ChatResponse, SourceDocument
+from models.models import (
+    BatchChatRequest,
+    BatchChatResult,
+    BatchQuestion,
+    ChatRequest,
+    ChatResponse,
+    PromoteRequest,
+    SourceDocument,
+    WarmupRequest,
+)
+from services.redis_service import (
+    get_cached_answer,
+    get_cached_retrieval,
+    log_query,
+    normalize_query,
+    rate_limit,
+    set_cached_answer,
+    set_cached_retrieval,
+)
+from services.rag_service import NO_DEADLINE, Deadline, DeadlineExceeded, LatencyTracker, format_context
+from services import index_generations
+from services.index_generations import GenerationConflict, GenerationPointer
+from services.openai_service import Deployment, OpenAIRouter, parse_deployments
+from services.search_service import HedgeBudget, hedged_request, search_options, snippet_of
+from services.summary_service import evict, load_summary, update_summary
+from services import warmup_service
+from services.warmup_service import warm_up
+from services.write_queue import WriteQueue
 import logging
 
 logger = logging.getLogger("liotrag")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
 
-app = FastAPI(title="Azure Container App + OpenAI + AI Search")
-
 # -------------------------------
 # Environment Variables & Key Vault
 # -------------------------------
@@ -46,6 +78,8 @@ CLIENT_SECRET_NAME = os.getenv("AZURE_CLIENT_SECRET_NAME")
 
 AI_SEARCH_URL = os.getenv("AZURE_AI_SEARCH_URL")
 AI_SEARCH_INDEX_NAME = os.getenv("AZURE_AI_SEARCH_INDEX_NAME")
+# Optional: admin key, needed only to create/delete index generations
+AI_SEARCH_ADMIN_SECRET_NAME = os.getenv("AZURE_AI_SEARCH_ADMIN_SECRET_NAME")
 
 CLIENT_ID = os.getenv("AZURE_ENTRAID_CLIENT_ID")
 TENANT_ID = os.getenv("AZURE_TENANT_ID")
@@ -62,6 +96,11 @@ ALLOWED_ISSUERS = {
     f"https://sts.windows.net/{TENANT_ID}/",  # v1 issuer format ends with a trailing slash
 }
 ACCEPTED_AUDIENCES = {CLIENT_ID, f"api://{CLIENT_ID}"}
+# Admin endpoints: callers with this app role in their token, or one of these
+# object ids (e.g. the Function's managed identity). Never grant the role to
+# the client whose tokens /get_auth hands out.
+ADMIN_APP_ROLE = os.getenv("ADMIN_APP_ROLE", "LiotRAG.Admin")
+ADMIN_OBJECT_IDS = frozenset(oid.strip() for oid in os.getenv("ADMIN_OBJECT_IDS", "").split(",") if oid.strip())
 
 REQUIRED_ENV_VARS = [
     ("KEY_VAULT_URL", KEY_VAULT_URL),
@@ -102,10 +141,22 @@ logger.info(
     CLIENT_SECRET_NAME,
 )
 
-logger.info("Initializing credentials and secret client")
-
-credential = DefaultAzureCredential()
-secret_client = SecretClient(vault_url=KEY_VAULT_URL, credential=credential)
+# -------------------------------
+# Per-worker clients
+# -------------------------------
+# Clients own sockets and event-loop state, so they must not be created before
+# uvicorn forks its workers: each worker builds its own set in `lifespan`.
+credential: DefaultAzureCredential | None = None
+secret_client: SecretClient | None = None
+redis_client: redis.Redis | None = None
+openai_router: OpenAIRouter | None = None
+search_credential: AzureKeyCredential | None = None
+search_clients: Dict[str, SearchClient] = {}  # one per index generation in use
+index_pointer: GenerationPointer | None = None
+http_client: httpx.AsyncClient | None = None
+write_queue: WriteQueue | None = None
+warmup_tasks: set = set()  # background warm-up jobs run by this worker
+CLIENT_SECRET: str | None = None
 
 def fetch_secret(secret_name: str, purpose: str) -> str:
     """Retrieve a secret value by name with explicit validation & logging.
@@ -141,37 +192,219 @@ def parse_azure_redis_secret(raw: str) -> str:
         raise ValueError(f"Cannot parse Redis secret: {raw}")
     return f"rediss://:{password}@{host_port}"
 
-raw_redis_secret = fetch_secret(REDIS_SECRET_NAME, "Redis")
-redis_conn_str = parse_azure_redis_secret(raw_redis_secret)
-redis_client = redis.from_url(redis_conn_str, decode_responses=True)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))  # per worker
 REDIS_TTL_SECONDS = int(os.getenv("REDIS_SESSION_TTL", "3600"))  # default 1 hour
 MAX_HISTORY_TURNS = int(os.getenv("MAX_HISTORY_TURNS", "4"))
-logger.info("Redis client configured with TTL=%s, max_history=%s", REDIS_TTL_SECONDS, MAX_HISTORY_TURNS)
+
+# "truncate": keep the last MAX_HISTORY_TURNS turns verbatim.
+# "summary": keep the last HISTORY_SUMMARY_RECENT_TURNS turns verbatim plus a
+# rolling summary of the older ones, updated after each response is sent.
+HISTORY_MODE = os.getenv("HISTORY_MODE", "truncate").lower()
+if HISTORY_MODE not in ("truncate", "summary"):
+    raise ValueError(f"HISTORY_MODE must be 'truncate' or 'summary', got '{HISTORY_MODE}'")
+HISTORY_SUMMARY_RECENT_TURNS = max(1, int(os.getenv("HISTORY_SUMMARY_RECENT_TURNS", "2")))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "250"))
+
+# Shared caches (Redis, so every worker and replica sees them)
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.getenv("RETRIEVAL_CACHE_TTL", "43200"))  # 0 disables
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL", "43200"))  # 0 disables
+TRAFFIC_LOG_DAYS = int(os.getenv("TRAFFIC_LOG_DAYS", "7"))
+
+# Post-response work (history, cache writes, traffic log, summary updates):
+# queued per worker, Redis writes batched across requests, drained on shutdown
+WRITE_QUEUE_MAX_SIZE = int(os.getenv("WRITE_QUEUE_MAX_SIZE", "1000"))
+WRITE_QUEUE_BATCH_SIZE = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "100"))
+WRITE_QUEUE_LINGER_MS = float(os.getenv("WRITE_QUEUE_LINGER_MS", "2"))
+WRITE_QUEUE_MAX_JOBS = int(os.getenv("WRITE_QUEUE_MAX_JOBS", "8"))
+WRITE_QUEUE_DRAIN_SECONDS = float(os.getenv("WRITE_QUEUE_DRAIN_SECONDS", "10"))
+
+# Post-crawl cache warm-up (POST /warmup)
+WARMUP_DAYS = int(os.getenv("WARMUP_DAYS", "7"))
+WARMUP_TOP_QUERIES = int(os.getenv("WARMUP_TOP_QUERIES", "50"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+WARMUP_TOKEN_BUDGET = int(os.getenv("WARMUP_TOKEN_BUDGET", "100000"))
+WARMUP_JOB_TTL_SECONDS = int(os.getenv("WARMUP_JOB_TTL", "86400"))  # how long a job status stays readable
+SEARCH_TOP_K = int(os.getenv("SEARCH_TOP_K", "5"))
+# Retrieval settings (compare candidates with Scripts/Benchmarks/bench_retrieval.py)
+SEARCH_SNIPPET_FIELDS = tuple(f.strip() for f in os.getenv("SEARCH_SNIPPET_FIELDS", "chunk,content").split(",") if f.strip())
+SEARCH_QUERY_TYPE = os.getenv("SEARCH_QUERY_TYPE", "simple")  # simple | full | semantic
+SEARCH_SEMANTIC_CONFIG = os.getenv("SEARCH_SEMANTIC_CONFIG")
+try:
+    SEARCH_OPTIONS = search_options(SEARCH_QUERY_TYPE, SEARCH_SEMANTIC_CONFIG)
+except ValueError as e:
+    raise ValueError(f"Invalid SEARCH_QUERY_TYPE/SEARCH_SEMANTIC_CONFIG: {e}") from None
+
+# Stateless bulk runs (POST /chat/batch)
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+BATCH_RATE_LIMIT_QUESTIONS = int(os.getenv("BATCH_RATE_LIMIT_QUESTIONS", "5000"))  # per caller and window, 0 disables
+BATCH_RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("BATCH_RATE_LIMIT_WINDOW", "3600"))
+
+# Index generations: the live index is resolved through a Redis pointer
+# (see services/index_generations.py), re-read by each worker every N seconds
+SEARCH_GENERATION_POINTER_TTL = float(os.getenv("SEARCH_GENERATION_POINTER_TTL", "5"))
+# Durable copy of the pointer (an Azure AI Search index), checked every N seconds
+SEARCH_CONTROL_INDEX = index_generations.control_index_name(AI_SEARCH_INDEX_NAME or "")
+SEARCH_GENERATION_CONTROL_TTL = float(os.getenv("SEARCH_GENERATION_CONTROL_TTL", "60"))
+SEARCH_SMOKE_QUESTIONS = os.getenv("SEARCH_SMOKE_QUESTIONS")  # JSON list of {question, expected_urls}
+SEARCH_SMOKE_MIN_RECALL = float(os.getenv("SEARCH_SMOKE_MIN_RECALL", "0.8"))
+SEARCH_MIN_DOCUMENT_RATIO = float(os.getenv("SEARCH_MIN_DOCUMENT_RATIO", "0.9"))
+
+# Per-request latency budget (kept below the frontend's 30s client timeout)
+# and the degraded settings used when it runs short
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "25"))
+SEARCH_TOP_K_DEGRADED = int(os.getenv("SEARCH_TOP_K_DEGRADED", "3"))
+MAX_COMPLETION_TOKENS = int(os.getenv("MAX_COMPLETION_TOKENS", "500"))
+MAX_COMPLETION_TOKENS_DEGRADED = int(os.getenv("MAX_COMPLETION_TOKENS_DEGRADED", "200"))
+GENERATION_MIN_SECONDS = float(os.getenv("GENERATION_MIN_SECONDS", "3"))
+SEARCH_HEDGE_MAX_RATIO = float(os.getenv("SEARCH_HEDGE_MAX_RATIO", "0.05"))  # share of searches that may be hedged
+
+# Per-worker stage latencies (p95 of recent calls; env values are used until
+# enough samples exist). They drive search hedging and the degradation steps.
+rewrite_latency = LatencyTracker(initial=float(os.getenv("REWRITE_LATENCY_ESTIMATE", "2")))
+search_latency = LatencyTracker(initial=float(os.getenv("SEARCH_LATENCY_ESTIMATE", "1")))
+generation_latency = LatencyTracker(initial=float(os.getenv("GENERATION_LATENCY_ESTIMATE", "8")))
+# Token-capped generations are faster: kept apart so they do not pull down
+# the p95 the degradation steps plan full-length answers with
+capped_generation_latency = LatencyTracker(initial=float(os.getenv("CAPPED_GENERATION_LATENCY_ESTIMATE", "4")))
+search_hedge_budget = HedgeBudget(ratio=SEARCH_HEDGE_MAX_RATIO)
 
 # -------------------------------
 # Azure OpenAI setup
 # -------------------------------
-openai_api_key = fetch_secret(OPENAI_SECRET_NAME, "OpenAI API key").strip()
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
-
-openai_client = AsyncAzureOpenAI(
-    api_key=openai_api_key,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_version=AZURE_OPENAI_API_VERSION
+# Several deployments (quota pooling, a cheaper rewrite tier): see services/openai_service.parse_deployments
+OPENAI_DEPLOYMENTS = parse_deployments(
+    os.getenv("AZURE_OPENAI_DEPLOYMENTS"), AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_DEPLOYMENT, AZURE_OPENAI_API_VERSION
 )
+OPENAI_CIRCUIT_FAILURES = int(os.getenv("OPENAI_CIRCUIT_FAILURES", "3"))
+OPENAI_CIRCUIT_OPEN_SECONDS = float(os.getenv("OPENAI_CIRCUIT_OPEN_SECONDS", "30"))
+OPENAI_MAX_ATTEMPTS = int(os.getenv("OPENAI_MAX_ATTEMPTS", "3"))
+
+# Outbound HTTP (token endpoint, JWKS): one pooled client per worker
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+JWKS_CACHE_TTL_SECONDS = int(os.getenv("JWKS_CACHE_TTL_SECONDS", "3600"))
 
 # -------------------------------
-# Azure AI Search setup
+# Worker lifecycle
 # -------------------------------
-ai_search_key = fetch_secret(AI_SEARCH_SECRET_NAME, "Azure AI Search key")
-search_client = SearchClient(
-    endpoint=AI_SEARCH_URL,
-    index_name=AI_SEARCH_INDEX_NAME,
-    credential=AzureKeyCredential(ai_search_key)
-)
-logger.info("Azure AI Search client ready for index '%s'", AI_SEARCH_INDEX_NAME)
+async def open_clients():
+    """Fetch secrets and create this worker's clients (runs once per worker, after the fork)."""
+    global credential, secret_client, redis_client, openai_router, search_credential, index_pointer, http_client, write_queue, CLIENT_SECRET
+    logger.info("Initializing credentials and clients (pid=%s)", os.getpid())
+
+    credential = DefaultAzureCredential()
+    secret_client = SecretClient(vault_url=KEY_VAULT_URL, credential=credential)
+    # SecretClient is synchronous: fetch the secrets concurrently off the event loop
+    openai_secret_names = sorted({c.get("secret_name") or OPENAI_SECRET_NAME for c in OPENAI_DEPLOYMENTS})
+    raw_redis_secret, ai_search_key, CLIENT_SECRET, *openai_api_keys = await asyncio.gather(
+        asyncio.to_thread(fetch_secret, REDIS_SECRET_NAME, "Redis"),
+        asyncio.to_thread(fetch_secret, AI_SEARCH_SECRET_NAME, "Azure AI Search key"),
+        asyncio.to_thread(fetch_secret, CLIENT_SECRET_NAME, "Client credential secret"),
+        *(asyncio.to_thread(fetch_secret, name, "OpenAI API key") for name in openai_secret_names),
+    )
+
+    redis_client = redis.from_url(
+        parse_azure_redis_secret(raw_redis_secret),
+        decode_responses=True,
+        max_connections=REDIS_MAX_CONNECTIONS,
+    )
+    logger.info("Redis client configured with TTL=%s, max_history=%s, history_mode=%s",
+                REDIS_TTL_SECONDS, MAX_HISTORY_TURNS, HISTORY_MODE)
+    logger.info("Caches: retrieval TTL=%s, answer TTL=%s", RETRIEVAL_CACHE_TTL_SECONDS, ANSWER_CACHE_TTL_SECONDS)
+    write_queue = WriteQueue(
+        redis_client,
+        maxsize=WRITE_QUEUE_MAX_SIZE,
+        batch_size=WRITE_QUEUE_BATCH_SIZE,
+        linger=WRITE_QUEUE_LINGER_MS / 1000,
+        max_tasks=WRITE_QUEUE_MAX_JOBS,
+    )
+    write_queue.start()
+
+    openai_keys = dict(zip(openai_secret_names, openai_api_keys))
+    openai_router = OpenAIRouter(
+        [
+            Deployment(
+                c["name"],
+                AsyncAzureOpenAI(
+                    api_key=openai_keys[c.get("secret_name") or OPENAI_SECRET_NAME].strip(),
+                    azure_endpoint=c["endpoint"],
+                    api_version=c["api_version"],
+                    max_retries=c["max_retries"]
+                ),
+                c["deployment"],
+                roles=c["roles"],
+                weight=c["weight"]
+            )
+            for c in OPENAI_DEPLOYMENTS
+        ],
+        failure_threshold=OPENAI_CIRCUIT_FAILURES,
+        open_seconds=OPENAI_CIRCUIT_OPEN_SECONDS,
+        max_attempts=OPENAI_MAX_ATTEMPTS,
+    )
+    logger.info("Azure OpenAI deployments: %s", ", ".join(f"{c['name']}{c['roles']}" for c in OPENAI_DEPLOYMENTS))
+
+    search_credential = AzureKeyCredential(ai_search_key)
+    index_pointer = GenerationPointer(redis_client, AI_SEARCH_INDEX_NAME, ttl=SEARCH_GENERATION_POINTER_TTL,
+                                      control=read_generation_control, control_ttl=SEARCH_GENERATION_CONTROL_TTL)
+    live_index = await index_pointer.current()
+    get_search_client(live_index)
+    logger.info("Azure AI Search client ready for index '%s'", live_index)
+
+    http_client = httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    )
+
+def get_search_client(index_name: str) -> SearchClient:
+    """Query client of an index generation, created on first use."""
+    client = search_clients.get(index_name)
+    if client is None:
+        client = search_clients[index_name] = SearchClient(
+            endpoint=AI_SEARCH_URL,
+            index_name=index_name,
+            credential=search_credential
+        )
+    return client
+
+async def close_clients():
+    # Interrupted warm-ups record themselves as failed, which needs Redis
+    for task in list(warmup_tasks):
+        task.cancel()
+    await asyncio.gather(*warmup_tasks, return_exceptions=True)
+    if write_queue is not None:
+        # Drain first: the queued writes still need Redis (and the summary jobs OpenAI)
+        await write_queue.close(WRITE_QUEUE_DRAIN_SECONDS)
+    for name, close in (
+        *((f"search:{index}", client.close) for index, client in search_clients.items()),
+        ("openai", openai_router and openai_router.close),
+        ("redis", redis_client and redis_client.aclose),
+        ("http", http_client and http_client.aclose),
+    ):
+        if close is None:
+            continue
+        try:
+            await close()
+        except Exception:
+            logger.exception("Error closing %s client", name)
+    search_clients.clear()
+    if secret_client is not None:
+        secret_client.close()
+    if credential is not None:
+        credential.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_clients()
+    try:
+        yield
+    finally:
+        await close_clients()
+
+app = FastAPI(title="Azure Container App + OpenAI + AI Search", lifespan=lifespan)
 
 # -------------------------------
 # Jinja2 Environment for Prompts
@@ -183,29 +416,65 @@ jinja_env = Environment(
 )
 GEN_PROMPT_TEMPLATE = "gen_prompt.j2"
 REWRITE_PROMPT_TEMPLATE = "rewrite_prompt.j2"
+SUMMARY_PROMPT_TEMPLATE = "summary_prompt.j2"
 
 # -------------------------------
 # Authentication Flow
 # -------------------------------
-CLIENT_SECRET = fetch_secret(CLIENT_SECRET_NAME, "Client credential secret")
 security = HTTPBearer()
 
-async def get_signing_key(token: str, jwks_uri: str):
-    """Find the correct signing key from the JWKS"""
-    # Get header to find which kid was used
-    header = jwt.get_unverified_header(token)
-    kid = header["kid"]
+class JWKSCache:
+    """Per-worker copy of the Entra ID signing keys, already converted to RSA public keys.
+
+    Keys are public and identical across workers, so each worker keeps its own
+    copy (no shared state needed). An unknown kid triggers a refetch, which
+    picks up key rotation before the TTL expires; refetches are rate limited so
+    tokens with bogus kids cannot hammer the JWKS endpoint.
+    """
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(jwks_uri)
-        if resp.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to fetch JWKS")   
-        jwks = resp.json()
+    def __init__(self, jwks_uri: str, ttl: int, min_refresh_interval: int = 60):
+        self.jwks_uri = jwks_uri
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
 
-    for key in jwks["keys"]:
-        if key["kid"] == kid:
-            return key
-    raise HTTPException(status_code=401, detail="No matching JWK found.")
+    async def _refresh(self, fetched_before: float):
+        async with self._lock:
+            # Another request may have refreshed while we waited for the lock
+            if self._fetched_at > fetched_before:
+                return
+            resp = await http_client.get(self.jwks_uri)
+            if resp.status_code != 200:
+                raise HTTPException(status_code=500, detail="Failed to fetch JWKS")
+            keys = {}
+            for jwk in resp.json()["keys"]:
+                try:
+                    # Convert JWK (dict) -> RSA public key instance accepted by PyJWT
+                    keys[jwk["kid"]] = RSAAlgorithm.from_jwk(json.dumps(jwk))
+                except Exception:
+                    logger.warning("Skipping unusable JWK kid=%s", jwk.get("kid"))
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+    async def get(self, kid: str):
+        fetched_at = self._fetched_at
+        age = time.monotonic() - fetched_at
+        if not self._keys or age > self.ttl or (kid not in self._keys and age > self.min_refresh_interval):
+            await self._refresh(fetched_at)
+        key = self._keys.get(kid)
+        if key is None:
+            raise HTTPException(status_code=401, detail="No matching JWK found.")
+        return key
+
+jwks_cache = JWKSCache(JWKS_URI, JWKS_CACHE_TTL_SECONDS)
+
+async def get_signing_key(token: str):
+    """Find the public key for the token's kid in the (cached) JWKS"""
+    # Get header to find which kid was used
+    header = jwt.get_unverified_header(token)
+    return await jwks_cache.get(header["kid"])
 
 
 async def verify_jwt(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -216,12 +485,9 @@ async def verify_jwt(credentials: HTTPAuthorizationCredentials = Depends(securit
     App ID URI form (api://<client_id>) you may wish to extend audience handling.
     """
     token = credentials.credentials
-    key_dict = await get_signing_key(token, JWKS_URI)
+    public_key = await get_signing_key(token)
 
     try:
-        # Convert JWK (dict) -> RSA public key instance accepted by PyJWT
-        public_key = RSAAlgorithm.from_jwk(json.dumps(key_dict))
-
         # Decode without enforcing iss/aud so we can allow multiple acceptable values
         decoded = jwt.decode(
             token,
@@ -252,6 +518,12 @@ async def verify_jwt(credentials: HTTPAuthorizationCredentials = Depends(securit
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
+async def require_admin(claims: Dict[str, Any] = Depends(verify_jwt)) -> Dict[str, Any]:
+    """verify_jwt plus an admin check: the ADMIN_APP_ROLE app role or an object id in ADMIN_OBJECT_IDS."""
+    if ADMIN_APP_ROLE in (claims.get("roles") or []) or claims.get("oid") in ADMIN_OBJECT_IDS:
+        return claims
+    raise HTTPException(status_code=403, detail="This endpoint requires the admin role")
+
 @app.get("/get_auth")
 async def get_auth():
     """Request an access token from Entra ID using client credentials flow"""
@@ -262,11 +534,10 @@ async def get_auth():
         "grant_type": "client_credentials",
     }
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(TOKEN_ENDPOINT, data=data)
-        if resp.status_code != 200:
-            raise HTTPException(status_code=resp.status_code, detail=resp.text)
-        return resp.json()  # contains access_token, expires_in, etc.
+    resp = await http_client.post(TOKEN_ENDPOINT, data=data)
+    if resp.status_code != 200:
+        raise HTTPException(status_code=resp.status_code, detail=resp.text)
+    return resp.json()  # contains access_token, expires_in, etc.
 
 @app.get("/test_auth")
 async def test_auth(decoded: dict = Depends(verify_jwt)):
@@ -281,7 +552,7 @@ def _conv_redis_key(session_id: str) -> str:
 
 async def load_history(session_id: str) -> List[Dict[str, str]]:
     key = _conv_redis_key(session_id)
-    raw = await redis_client.get(key)
+    raw = await write_queue.get(key)  # sees a previous turn still waiting in the write queue
     if not raw:
         return []
     try:
@@ -290,17 +561,63 @@ async def load_history(session_id: str) -> List[Dict[str, str]]:
         logger.warning("Corrupted history for session %s, resetting", session_id)
         return []
 
-async def save_history(session_id: str, history: List[Dict[str, str]]):
+async def load_conversation(session_id: str) -> Tuple[List[Dict[str, str]], str]:
+    """History window plus, in summary mode, the rolling summary of older turns."""
+    if HISTORY_MODE != "summary":
+        return await load_history(session_id), ""
+    history, summary = await asyncio.gather(load_history(session_id), load_summary(redis_client, session_id))
+    return history, summary
+
+async def save_history(session_id: str, history: List[Dict[str, str]], deadline: Deadline = NO_DEADLINE):
     key = _conv_redis_key(session_id)
-    await redis_client.setex(key, REDIS_TTL_SECONDS, json.dumps(history))
+    await write_queue.setex(key, REDIS_TTL_SECONDS, json.dumps(history), deadline=deadline)
+
+def trim_history(history: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    # Keep only the last N turns * 2 messages (user+assistant); also return the evicted ones
+    turns = HISTORY_SUMMARY_RECENT_TURNS if HISTORY_MODE == "summary" else MAX_HISTORY_TURNS
+    return evict(history, turns)
 
-def trim_history(history: List[Dict[str, str]]) -> List[Dict[str, str]]:
-    # Keep only last MAX_HISTORY_TURNS * 2 messages (user+assistant)
-    max_messages = MAX_HISTORY_TURNS * 2
-    return history[-max_messages:]
+async def append_turn(session_id: str, history: List[Dict[str, str]], user_prompt: str, answer_text: str,
+                      deadline: Deadline = NO_DEADLINE) -> List[Dict[str, str]]:
+    """Queue the new turn for storage; in summary mode evicted turns are summarized after it is written.
+
+    Raises DeadlineExceeded if the write queue has no room for the turn before `deadline`.
+    """
+    history = history + [
+        {"role": "user", "content": user_prompt},
+        {"role": "assistant", "content": answer_text}
+    ]
+    kept, evicted = trim_history(history)
+    await save_history(session_id, kept, deadline)
+    if HISTORY_MODE == "summary" and evicted:
+        try:
+            await write_queue.spawn(session_id, lambda: update_summary(
+                redis_client, session_id, evicted, summarize_turns,
+                ttl=REDIS_TTL_SECONDS, max_chars=HISTORY_SUMMARY_MAX_TOKENS * 4,
+            ), deadline)
+        except DeadlineExceeded:
+            # The turn is stored; only the summary misses the evicted turns
+            logger.warning("Write queue full: summary update skipped for session %s (%d turns)",
+                           session_id, len(evicted) // 2)
+    return kept
 
-def format_history_for_prompt(history: List[Dict[str, str]]) -> str:
-    lines = []
+async def summarize_turns(previous_summary: str, turns: List[Dict[str, str]]) -> str:
+    template = jinja_env.get_template(SUMMARY_PROMPT_TEMPLATE)
+    prompt = template.render(
+        summary=previous_summary,
+        turns=format_history_for_prompt(turns),
+        max_words=HISTORY_SUMMARY_MAX_TOKENS * 3 // 4
+    )
+    completion = await openai_router.create(
+        "rewrite",
+        messages=[{"role": "system", "content": "Conversation Summary"}, {"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_completion_tokens=HISTORY_SUMMARY_MAX_TOKENS
+    )
+    return completion.choices[0].message.content
+
+def format_history_for_prompt(history: List[Dict[str, str]], summary: str = "") -> str:
+    lines = [f"RIASSUNTO DEI TURNI PRECEDENTI: {summary}"] if summary else []
     for m in history:
         role = m.get("role")
         content = m.get("content")
@@ -308,58 +625,110 @@ def format_history_for_prompt(history: List[Dict[str, str]]) -> str:
             lines.append(f"{role.upper()}: {content}")
     return "\n".join(lines)
 
-async def query_rewrite_if_needed(original_question: str, history: List[Dict[str, str]]) -> str:
+async def query_rewrite_if_needed(original_question: str, history: List[Dict[str, str]],
+                                  deadline: Deadline = NO_DEADLINE, summary: str = "") -> str:
     if not history:
         return original_question  # first turn, no rewrite needed
     template = jinja_env.get_template(REWRITE_PROMPT_TEMPLATE)
     prompt = template.render(
-        history=format_history_for_prompt(history),
+        history=format_history_for_prompt(history, summary),
         question=original_question
     )
     logger.debug("Rewrite prompt length=%d", len(prompt))
-    completion = await openai_client.chat.completions.create(
-        model=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+    started = time.monotonic()
+    completion = await deadline.run(openai_router.create(
+        "rewrite",
         messages=[{"role": "system", "content": "Query Rewriting"}, {"role": "user", "content": prompt}],
         temperature=0.2,
         max_completion_tokens=64
-    )
+    ), "rewrite")
+    rewrite_latency.observe(time.monotonic() - started)
     rewritten = completion.choices[0].message.content.strip()
     logger.info("Query rewrite raw output: %s", rewritten)
     return rewritten
 
-async def search_documents(query: str, top_k: int = 5) -> List[SourceDocument]:
+async def _search(query: str, top_k: int, index_name: str) -> List[SourceDocument]:
+    results = await get_search_client(index_name).search(query, top=top_k, **SEARCH_OPTIONS)
+    docs: List[SourceDocument] = []
+    async for doc in results:
+        docs.append(SourceDocument(
+            title=doc.get("title"),
+            url=doc.get("url"),
+            snippet=snippet_of(doc, SEARCH_SNIPPET_FIELDS),
+            content_hash=doc.get("content_hash")
+        ))
+    return docs
+
+async def search_documents(query: str, top_k: int = 5, deadline: Deadline = NO_DEADLINE,
+                           index_name: str | None = None, hedge: bool = True) -> List[SourceDocument]:
+    """Search with hedging: a request slower than the recent p95 gets a second, parallel attempt.
+
+    Queries the live index generation unless `index_name` is given. Background
+    searches (the warm-up) pass hedge=False: a plain request that neither feeds
+    the search p95 /chat relies on nor spends its hedge budget.
+    """
     try:
-        logger.info("Searching AI Search with query='%s' top=%d", query, top_k)
-        results = await search_client.search(query, top=top_k)
-        docs: List[SourceDocument] = []
-        async for doc in results:
-            snippet = doc.get("chunk") or doc.get("content") or ""
-            docs.append(SourceDocument(
-                title=doc.get("title"),
-                url=doc.get("url"),
-                snippet=snippet
-            ))
+        index_name = index_name or await index_pointer.current()
+        logger.info("Searching AI Search index='%s' with query='%s' top=%d", index_name, query, top_k)
+        if not hedge:
+            return await deadline.run(_search(query, top_k, index_name), "search")
+        docs, hedged = await hedged_request(lambda: _search(query, top_k, index_name), search_latency, deadline,
+                                            search_hedge_budget)
+        if hedged:
+            logger.info("Search hedged after %.2fs (p95)", search_latency.p95())
         return docs
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.exception("Search failure: %s", e)
         return []
 
-async def generate_answer(history: List[Dict[str, str]], user_question: str, rewritten_query: str, docs: List[SourceDocument]) -> str:
+async def retrieve_documents(query: str, top_k: int = 5, deadline: Deadline = NO_DEADLINE) -> List[SourceDocument]:
+    """search_documents behind the shared retrieval cache (empty results are not cached)."""
+    generation = await index_pointer.current()
+    if RETRIEVAL_CACHE_TTL_SECONDS <= 0:
+        return await search_documents(query, top_k, deadline, generation)
+    try:
+        cached = await get_cached_retrieval(redis_client, generation, query, top_k)
+        if cached is not None:
+            logger.info("Retrieval cache hit for query='%s'", query)
+            return [SourceDocument(**d) for d in cached]
+    except Exception as e:
+        logger.warning("Retrieval cache read failed: %s", e)
+
+    docs = await search_documents(query, top_k, deadline, generation)
+    if docs:
+        try:
+            await set_cached_retrieval(write_queue.best_effort, generation, query, top_k, [d.model_dump() for d in docs], RETRIEVAL_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning("Retrieval cache write failed: %s", e)
+    return docs
+
+async def generate_answer(history: List[Dict[str, str]], user_question: str, rewritten_query: str, docs: List[SourceDocument],
+                          usage: Dict[str, int] | None = None, max_completion_tokens: int = MAX_COMPLETION_TOKENS,
+                          deadline: Deadline = NO_DEADLINE, summary: str = "", track_latency: bool = True) -> str:
+    """Answer from the retrieved docs; track_latency=False keeps background calls out of the /chat p95s."""
     template = jinja_env.get_template(GEN_PROMPT_TEMPLATE)
-    context_block = "\n\n".join([f"[DOC {i+1}]\nTitle: {d.title}\nURL: {d.url}\nSnippet: {d.snippet}" for i, d in enumerate(docs)])
+    context_block = format_context(docs)
     answer_prompt = template.render(
-        history=format_history_for_prompt(history),
+        history=format_history_for_prompt(history, summary),
         context=context_block,
         question=user_question,
         rewritten_query=rewritten_query
     )
     logger.debug("Generation prompt size=%d chars", len(answer_prompt))
-    completion = await openai_client.chat.completions.create(
-        model=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+    started = time.monotonic()
+    completion = await deadline.run(openai_router.create(
+        "generation",
         messages=[{"role": "system", "content": "You are a university RAG assistant."}, {"role": "user", "content": answer_prompt}],
         temperature=0.3,
-        max_completion_tokens=500
-    )
+        max_completion_tokens=max_completion_tokens
+    ), "generation")
+    if track_latency:
+        tracker = generation_latency if max_completion_tokens >= MAX_COMPLETION_TOKENS else capped_generation_latency
+        tracker.observe(time.monotonic() - started)
+    if usage is not None and completion.usage is not None:
+        usage["total_tokens"] = usage.get("total_tokens", 0) + completion.usage.total_tokens
     return completion.choices[0].message.content.strip()
 
 # -------------------------------
@@ -369,6 +738,312 @@ async def generate_answer(history: List[Dict[str, str]], user_question: str, rew
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics(_: None = Depends(require_admin)):
+    """State of the worker that answers: write queue depth and lag, Azure OpenAI deployments."""
+    return {
+        "write_queue": write_queue.metrics() if write_queue is not None else None,
+        "openai_deployments": openai_router.status() if openai_router is not None else [],
+    }
+
+@app.post("/warmup", status_code=202)
+async def warmup(request: WarmupRequest | None = None, _: None = Depends(require_admin)):
+    """Start pre-answering the most frequent first-turn questions; called after each crawl.
+
+    The warm-up can outlast the ingress request timeout, so it runs in the
+    background: the response carries a job id to poll with GET /warmup/{job_id}.
+    """
+    if RETRIEVAL_CACHE_TTL_SECONDS <= 0 or ANSWER_CACHE_TTL_SECONDS <= 0:
+        raise HTTPException(status_code=400, detail="Caches are disabled (RETRIEVAL_CACHE_TTL/ANSWER_CACHE_TTL)")
+    request = request or WarmupRequest()
+    index_pointer.invalidate()
+    generation = await index_pointer.current()
+    previous = (await generation_status())["previous"]
+
+    # A warm-up burst must not move the latency estimates and hedge budget of /chat
+    async def search(query: str, top_k: int) -> List[SourceDocument]:
+        return await search_documents(query, top_k, index_name=generation, hedge=False)
+
+    async def generate(question: str, docs: List[SourceDocument], usage: Dict[str, int]) -> str:
+        return await generate_answer([], question, None, docs, usage=usage, track_latency=False)
+
+    async def work() -> Dict[str, Any]:
+        return await warm_up(
+            redis_client,
+            search=search,
+            generate=generate,
+            generation=generation,
+            previous_generation=previous,
+            days=request.days or WARMUP_DAYS,
+            limit=request.limit or WARMUP_TOP_QUERIES,
+            concurrency=WARMUP_CONCURRENCY,
+            token_budget=request.token_budget or WARMUP_TOKEN_BUDGET,
+            top_k=SEARCH_TOP_K,
+            retrieval_ttl=RETRIEVAL_CACHE_TTL_SECONDS,
+            answer_ttl=ANSWER_CACHE_TTL_SECONDS,
+        )
+
+    status = warmup_service.new_job(uuid.uuid4().hex, generation=generation, **request.model_dump())
+    await warmup_service.save_job(redis_client, status["job_id"], status, WARMUP_JOB_TTL_SECONDS)
+    task = asyncio.create_task(warmup_service.run_job(redis_client, status, work, WARMUP_JOB_TTL_SECONDS))
+    warmup_tasks.add(task)
+    task.add_done_callback(warmup_tasks.discard)
+    logger.info("Cache warm-up job %s started on generation '%s'", status["job_id"], generation)
+    return dict(status)  # the job updates its own copy
+
+@app.get("/warmup/{job_id}")
+async def warmup_status(job_id: str, _: None = Depends(require_admin)):
+    status = await warmup_service.load_job(redis_client, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"No warm-up job '{job_id}' (unknown or expired)")
+    return status
+
+# -------------------------------
+# Index generations (blue/green reindex)
+# -------------------------------
+async def index_admin_key() -> str:
+    if not AI_SEARCH_ADMIN_SECRET_NAME:
+        raise HTTPException(status_code=503, detail="AZURE_AI_SEARCH_ADMIN_SECRET_NAME is not configured")
+    return await asyncio.to_thread(fetch_secret, AI_SEARCH_ADMIN_SECRET_NAME, "Azure AI Search admin key")
+
+async def index_admin_client() -> SearchIndexClient:
+    return SearchIndexClient(endpoint=AI_SEARCH_URL, credential=AzureKeyCredential(await index_admin_key()))
+
+@asynccontextmanager
+async def control_writer():
+    """index_generations.write_control bound to an admin client of the control index (created if missing)."""
+    async with await index_admin_client() as index_client:
+        await index_generations.create_control_index(index_client, SEARCH_CONTROL_INDEX)
+    async with SearchClient(endpoint=AI_SEARCH_URL, index_name=SEARCH_CONTROL_INDEX,
+                            credential=AzureKeyCredential(await index_admin_key())) as client:
+        yield lambda current, previous: index_generations.write_control(client, current, previous)
+
+async def read_generation_control() -> Dict[str, Any] | None:
+    return await index_generations.read_control(get_search_client(SEARCH_CONTROL_INDEX))
+
+async def generation_status() -> Dict[str, Any]:
+    """Pointer and history; the control index wins over a lost or stale Redis pointer."""
+    control = await read_generation_control()
+    return await index_generations.status(redis_client, AI_SEARCH_INDEX_NAME, control)
+
+async def delete_generation(index_client: SearchIndexClient, name: str):
+    await index_client.delete_index(name)
+    client = search_clients.pop(name, None)
+    if client is not None:
+        await client.close()
+
+@app.get("/index/generations")
+async def index_generation_status(_: None = Depends(require_admin)):
+    return await generation_status()
+
+@app.post("/index/generations")
+async def create_index_generation(_: None = Depends(require_admin)):
+    """Create the next (empty) generation with the live index's schema; the crawler then fills it.
+
+    Generations that are neither live nor the rollback target (failed or
+    abandoned crawls) are deleted first. The number follows the highest
+    existing generation; a concurrent create of the same name gets a 409.
+    """
+    index_pointer.invalidate()
+    live = await index_pointer.current()
+    pointer = await generation_status()
+    keep = {live, pointer["current"], pointer["previous"]}
+    async with await index_admin_client() as index_client:
+        await index_generations.create_control_index(index_client, SEARCH_CONTROL_INDEX)
+        existing = await index_generations.list_generations(index_client, AI_SEARCH_INDEX_NAME)
+        swept = await index_generations.sweep(index_client, existing, keep)
+        for dropped in swept:
+            client = search_clients.pop(dropped, None)
+            if client is not None:
+                await client.close()
+        name = index_generations.next_generation(AI_SEARCH_INDEX_NAME, [*existing, *keep - {None}])
+        try:
+            await index_generations.create_index(index_client, live, name)
+        except GenerationConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    if swept:
+        logger.warning("Deleted stale index generations %s", swept)
+    logger.info("Created index generation '%s' (schema of '%s')", name, live)
+    return {"name": name, "source": live, "swept": swept}
+
+@app.delete("/index/generations/{name}")
+async def delete_index_generation(name: str, _: None = Depends(require_admin)):
+    """Delete a generation that is neither live nor the rollback target (e.g. after a failed crawl)."""
+    if not index_generations.is_generation(AI_SEARCH_INDEX_NAME, name):
+        raise HTTPException(status_code=400, detail=f"'{name}' is not a generation of '{AI_SEARCH_INDEX_NAME}'")
+    index_pointer.invalidate()
+    pointer = await generation_status()
+    if name in (await index_pointer.current(), pointer["current"], pointer["previous"]):
+        raise HTTPException(status_code=409, detail=f"'{name}' is live or the rollback target")
+    async with await index_admin_client() as index_client:
+        try:
+            await delete_generation(index_client, name)
+        except ResourceNotFoundError:
+            raise HTTPException(status_code=404, detail=f"No index '{name}'")
+    logger.info("Deleted index generation '%s'", name)
+    return {"deleted": name}
+
+@app.post("/index/generations/{name}/promote")
+async def promote_index_generation(name: str, request: PromoteRequest | None = None, _: None = Depends(require_admin)):
+    """Smoke-test a generation, then atomically make it live. The replaced one is kept for rollback.
+
+    A generation that fails the smoke checks is deleted (unless forced).
+    """
+    request = request or PromoteRequest()
+    if name != AI_SEARCH_INDEX_NAME and not index_generations.is_generation(AI_SEARCH_INDEX_NAME, name):
+        raise HTTPException(status_code=400, detail=f"'{name}' is not a generation of '{AI_SEARCH_INDEX_NAME}'")
+
+    control = await read_generation_control()
+    await index_generations.sync_from_control(redis_client, control)
+    previous = (await index_generations.status(redis_client, AI_SEARCH_INDEX_NAME, control))["previous"]
+    index_pointer.invalidate()
+    live = await index_pointer.current()
+    if request.smoke_questions is not None:
+        questions = [q.model_dump() for q in request.smoke_questions]
+    else:
+        questions = index_generations.load_questions(SEARCH_SMOKE_QUESTIONS) if SEARCH_SMOKE_QUESTIONS else []
+
+    async def search(query: str, top_k: int) -> List[SourceDocument]:
+        return await search_documents(query, top_k, index_name=name)
+
+    candidate_count, live_count = await asyncio.gather(
+        get_search_client(name).get_document_count(),
+        get_search_client(live).get_document_count(),
+    )
+    report = await index_generations.validate(
+        search, candidate_count, live_count if live != name else 0, questions,
+        top_k=SEARCH_TOP_K, min_recall=SEARCH_SMOKE_MIN_RECALL, min_count_ratio=SEARCH_MIN_DOCUMENT_RATIO,
+    )
+    if not report["ok"] and not request.force:
+        logger.warning("Index generation '%s' failed smoke checks: %s", name, report)
+        detail = {"message": "Smoke checks failed", "report": report}
+        if index_generations.is_generation(AI_SEARCH_INDEX_NAME, name) and name not in (live, previous):
+            try:
+                async with await index_admin_client() as index_client:
+                    await delete_generation(index_client, name)
+                detail["deleted"] = name
+            except Exception:
+                logger.exception("Could not delete rejected index generation '%s'", name)
+        raise HTTPException(status_code=409, detail=detail)
+
+    try:
+        async with control_writer() as write_control:
+            result = await index_generations.promote(redis_client, name, AI_SEARCH_INDEX_NAME, report, write_control)
+    except GenerationConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    index_pointer.invalidate()
+    logger.info("Index generation '%s' is live (previous '%s')", name, result["previous"])
+
+    # Keep only live + previous: drop the generation that fell out of the pair
+    dropped = result.pop("dropped")
+    if index_generations.is_generation(AI_SEARCH_INDEX_NAME, dropped):
+        try:
+            async with await index_admin_client() as index_client:
+                await delete_generation(index_client, dropped)
+            result["deleted"] = dropped
+        except Exception:
+            logger.exception("Could not delete old index generation '%s'", dropped)
+    return {**result, "report": report}
+
+@app.post("/index/generations/rollback")
+async def rollback_index_generation(_: None = Depends(require_admin)):
+    """Instantly make the previous generation live again (and the current one the rollback target)."""
+    await index_generations.sync_from_control(redis_client, await read_generation_control())
+    try:
+        async with control_writer() as write_control:
+            result = await index_generations.rollback(redis_client, AI_SEARCH_INDEX_NAME, write_control)
+    except GenerationConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    index_pointer.invalidate()
+    logger.warning("Index rolled back to '%s' (from '%s')", result["current"], result["previous"])
+    return result
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest, claims: Dict[str, Any] = Depends(require_admin)):
+    """Answer many stateless (first-turn) questions with bounded concurrency.
+
+    One JWT check for the whole batch, no history round trips, no traffic
+    logging. Identical questions share a single retrieval (on top of the
+    Redis retrieval cache). Results are streamed as NDJSON, one
+    BatchChatResult per line, in completion order.
+
+    Admin only, and each caller may ask at most BATCH_RATE_LIMIT_QUESTIONS
+    questions per BATCH_RATE_LIMIT_WINDOW seconds (429 beyond that).
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="No questions")
+    if len(request.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    if BATCH_RATE_LIMIT_QUESTIONS > 0:
+        caller = claims.get("oid") or claims.get("sub")
+        retry_after = await rate_limit(redis_client, f"batch:{caller}", len(request.questions),
+                                       BATCH_RATE_LIMIT_QUESTIONS, BATCH_RATE_LIMIT_WINDOW_SECONDS)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail=f"At most {BATCH_RATE_LIMIT_QUESTIONS} batch questions per {BATCH_RATE_LIMIT_WINDOW_SECONDS}s",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    top_k = max(1, request.top_k or SEARCH_TOP_K)
+    semaphore = asyncio.Semaphore(concurrency)
+    retrievals: Dict[str, asyncio.Task] = {}
+
+    def shared_retrieval(question: str) -> asyncio.Task:
+        key = normalize_query(question)
+        task = retrievals.get(key)
+        if task is None:
+            task = retrievals[key] = asyncio.create_task(
+                retrieve_documents(question, top_k, Deadline(CHAT_DEADLINE_SECONDS))
+            )
+        return task
+
+    async def answer(index: int, item: BatchQuestion) -> BatchChatResult:
+        question = item.question.strip()
+        result = BatchChatResult(id=item.id or str(index), question=question)
+        async with semaphore:
+            deadline = Deadline(CHAT_DEADLINE_SECONDS)
+            try:
+                if not question:
+                    raise ValueError("Empty prompt")
+                cached = None
+                if request.use_answer_cache and ANSWER_CACHE_TTL_SECONDS > 0:
+                    cached = await get_cached_answer(redis_client, await index_pointer.current(), question)
+                if cached is not None:
+                    result.response_text = cached["answer"]
+                    result.cached = True
+                else:
+                    # shield: a waiter hitting its deadline must not cancel the shared retrieval
+                    docs = await deadline.run(asyncio.shield(shared_retrieval(question)), "search")
+                    result.response_text = await generate_answer([], question, None, docs, deadline=deadline)
+                    result.sources = [SourceDocument(title=d.title, url=d.url, content_hash=d.content_hash) for d in docs]
+            except DeadlineExceeded as e:
+                result.error = f"Deadline exceeded during {e.stage}"
+            except Exception as e:
+                logger.exception("Batch question %s failed", result.id)
+                result.error = str(e)
+            result.elapsed_ms = int(deadline.elapsed() * 1000)
+        return result
+
+    async def stream():
+        started = time.monotonic()
+        failed = 0
+        tasks = [asyncio.create_task(answer(i, item)) for i, item in enumerate(request.questions)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                failed += result.error is not None
+                yield result.model_dump_json() + "\n"
+        finally:
+            # Client gone or batch done: stop whatever is still running
+            for task in [*tasks, *retrievals.values()]:
+                task.cancel()
+            logger.info("Batch of %d questions (%d retrievals, concurrency=%d) done in %.2fs, failed=%d",
+                        len(tasks), len(retrievals), concurrency, time.monotonic() - started, failed)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_openai(request: ChatRequest, _: None = Depends(verify_jwt)):
     """Primary chat endpoint implementing naive+iterative RAG with query rewriting and Redis memory."""
@@ -378,51 +1053,113 @@ async def chat_with_openai(request: ChatRequest, _: None = Depends(verify_jwt)):
     if not user_prompt:
         raise HTTPException(status_code=400, detail="Empty prompt")
 
+    # Every stage runs within the request budget; when it runs short the
+    # pipeline degrades in steps (rewrite in parallel -> lower top_k -> cap tokens)
+    deadline = Deadline(CHAT_DEADLINE_SECONDS)
+    degradations: List[str] = []
+
     try:
-        history = await load_history(session_id)
-        logger.info("Session %s history length=%d", session_id, len(history))
+        history, summary = await deadline.run(load_conversation(session_id), "history")
+        logger.info("Session %s history length=%d summary=%d chars", session_id, len(history), len(summary))
+
+        def search_top_k() -> int:
+            if deadline.remaining() < search_latency.p95() + generation_latency.p95():
+                degradations.append("reduce_top_k")
+                return min(SEARCH_TOP_K, SEARCH_TOP_K_DEGRADED)
+            return SEARCH_TOP_K
 
         # Query rewriting + OOD check (only if history exists)
         has_prior = len(history) > 0
-        rewritten_query = await query_rewrite_if_needed(user_prompt, history)
+        rewritten_query = user_prompt
+        prefetched: asyncio.Task | None = None  # retrieval run alongside the rewrite
+        if has_prior:
+            needed = rewrite_latency.p95() + search_latency.p95() + generation_latency.p95()
+            if deadline.remaining() < needed:
+                # No time for rewrite then search: search on the original
+                # question while the rewrite runs, still for the OOD check
+                degradations.append("parallel_rewrite")
+                prefetched = asyncio.create_task(retrieve_documents(user_prompt, top_k=search_top_k(), deadline=deadline))
+                try:
+                    rewritten_query = await query_rewrite_if_needed(user_prompt, history, deadline, summary)
+                except BaseException:
+                    prefetched.cancel()
+                    raise
+            else:
+                rewritten_query = await query_rewrite_if_needed(user_prompt, history, deadline, summary)
         if has_prior and rewritten_query.upper() == "FUORI_DOMINIO":
             logger.info("Out-of-domain detected for session %s", session_id)
+            if prefetched is not None:
+                prefetched.cancel()
             # store user message + short rejection response
             answer_text = "Scusa, non posso aiutarti con questa domanda." 
-            history.extend([
-                {"role": "user", "content": user_prompt},
-                {"role": "assistant", "content": answer_text}
-            ])
-            history = trim_history(history)
-            await save_history(session_id, history)
+            await append_turn(session_id, history, user_prompt, answer_text, deadline)
             return ChatResponse(
                 response_text=answer_text,
             )
-        search_query = rewritten_query if has_prior else user_prompt
+        search_query = rewritten_query if has_prior and prefetched is None else user_prompt
 
-        # Retrieve context docs
-        docs = await search_documents(search_query, top_k=5)
+        # First turn: the answer depends on the question only, so it can be
+        # served from (and stored in) the shared answer cache
+        cached_answer = None
+        generation = await index_pointer.current()
+        if not history:
+            try:
+                await log_query(write_queue.best_effort, user_prompt, TRAFFIC_LOG_DAYS)
+                if ANSWER_CACHE_TTL_SECONDS > 0:
+                    cached_answer = await get_cached_answer(redis_client, generation, user_prompt)
+            except Exception as e:
+                logger.warning("Answer cache/traffic log unavailable: %s", e)
 
-        # Build answer
-        answer_text = await generate_answer(
-            history, 
-            user_prompt, 
-            rewritten_query if has_prior else None, 
-            docs
-        )
+        if cached_answer is not None:
+            logger.info("Answer cache hit for session %s", session_id)
+            answer_text = cached_answer["answer"]
+        else:
+            # Retrieve context docs
+            if prefetched is not None:
+                docs = await prefetched
+            else:
+                docs = await retrieve_documents(search_query, top_k=search_top_k(), deadline=deadline)
+
+            # Build answer
+            max_tokens = MAX_COMPLETION_TOKENS
+            if deadline.remaining() < generation_latency.p95():
+                degradations.append("cap_tokens")
+                max_tokens = min(max_tokens, MAX_COMPLETION_TOKENS_DEGRADED)
+            if deadline.remaining() < GENERATION_MIN_SECONDS:
+                raise DeadlineExceeded("generation")
+            answer_text = await generate_answer(
+                history, 
+                user_prompt, 
+                rewritten_query if has_prior else None, 
+                docs,
+                max_completion_tokens=max_tokens,
+                deadline=deadline,
+                summary=summary
+            )
+            # Degraded answers are not shared with later askers
+            if not history and docs and not degradations and ANSWER_CACHE_TTL_SECONDS > 0:
+                try:
+                    await set_cached_answer(write_queue.best_effort, generation, user_prompt, answer_text,
+                                            [d.model_dump() for d in docs], ANSWER_CACHE_TTL_SECONDS)
+                except Exception as e:
+                    logger.warning("Answer cache write failed: %s", e)
 
         # Update history (append user + assistant)
-        history.extend([
-            {"role": "user", "content": user_prompt},
-            {"role": "assistant", "content": answer_text}
-        ])
-        history = trim_history(history)
-        await save_history(session_id, history)
-        logger.info("Updated history stored for session %s (messages=%d)", session_id, len(history))
+        history = await append_turn(session_id, history, user_prompt, answer_text, deadline)
+        logger.info("Updated history queued for session %s (messages=%d)", session_id, len(history))
+        logger.info("Session %s done in %.2fs degradations=%s", session_id, deadline.elapsed(), degradations or "none")
 
         return ChatResponse(
             response_text=answer_text,
         )
+    except DeadlineExceeded as e:
+        logger.warning("Session %s failed fast at %s after %.2fs degradations=%s",
+                       session_id, e.stage, deadline.elapsed(), degradations or "none")
+        raise HTTPException(
+            status_code=503,
+            detail="Il servizio è momentaneamente sovraccarico e non ha potuto rispondere in tempo. Riprova tra qualche istante.",
+            headers={"Retry-After": "5"},
+        )
     except Exception as e:
         logger.exception("Error in /chat: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -13,11 +13,44 @@ class SourceDocument(BaseModel):
     title: Optional[str] = None
     url: Optional[str] = None
     snippet: Optional[str] = None
+    content_hash: Optional[str] = None  # hash of the indexed chunk, used to detect changed sources
 
 class ChatResponse(BaseModel):
     response_text: str
     #sources: List[SourceDocument] = Field(default_factory=list)
 
+class BatchQuestion(BaseModel):
+    id: Optional[str] = Field(None, description="Caller reference echoed in the result (defaults to the position)")
+    question: str
+
+class BatchChatRequest(BaseModel):
+    questions: List[BatchQuestion]
+    concurrency: Optional[int] = Field(None, description="Questions answered in parallel (capped by BATCH_MAX_CONCURRENCY)")
+    top_k: Optional[int] = None
+    use_answer_cache: bool = Field(False, description="Serve cached first-turn answers (off: regression runs exercise the full pipeline)")
+
+class BatchChatResult(BaseModel):
+    id: str
+    question: str
+    response_text: Optional[str] = None
+    sources: List[SourceDocument] = Field(default_factory=list)
+    cached: bool = False
+    elapsed_ms: int = 0
+    error: Optional[str] = None
+
+class WarmupRequest(BaseModel):
+    days: Optional[int] = Field(None, description="Traffic log window in days (default WARMUP_DAYS)")
+    limit: Optional[int] = Field(None, description="Number of top queries to warm (default WARMUP_TOP_QUERIES)")
+    token_budget: Optional[int] = Field(None, description="Max completion+prompt tokens to spend (default WARMUP_TOKEN_BUDGET)")
+
+class SmokeQuestion(BaseModel):
+    question: str
+    expected_urls: List[str]
+
+class PromoteRequest(BaseModel):
+    smoke_questions: Optional[List[SmokeQuestion]] = Field(None, description="Overrides the SEARCH_SMOKE_QUESTIONS set")
+    force: bool = Field(False, description="Promote even if the smoke checks fail")
+
 class SearchRequest(BaseModel):
     query: str
     top: int = 3  # number of top results to return
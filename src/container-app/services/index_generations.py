@@ -0,0 +1,330 @@
+""" Blue/green Azure AI Search index generations behind a Redis-held pointer
+
+The pointer (current/previous generation) is also kept durably in a small
+control index, `<base>-generations`: promote and rollback write it before
+Redis, and readers trust it when Redis lost the pointer or disagrees.
+"""
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import redis.asyncio as redis
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.search.documents.indexes.models import SearchFieldDataType, SearchIndex, SimpleField
+from redis.exceptions import WatchError
+
+logger = logging.getLogger("liotrag.generations")
+
+CURRENT_KEY = "search:generation:current"
+PREVIOUS_KEY = "search:generation:previous"
+HISTORY_KEY = "search:generation:history"
+HISTORY_LENGTH = 20
+CONTROL_DOCUMENT_ID = "pointer"
+
+ControlReader = Callable[[], Awaitable[Optional[Dict[str, Optional[str]]]]]
+ControlWriter = Callable[[str, Optional[str]], Awaitable[None]]
+
+
+class GenerationConflict(Exception):
+    """The pointer changed while a promote/rollback was in progress, or there is nothing to roll back to."""
+
+
+class GenerationPointer:
+    """Name of the live index, read from Redis and cached per worker for `ttl` seconds.
+
+    Until a generation has been promoted, `default` (AZURE_AI_SEARCH_INDEX_NAME)
+    is live. A switch reaches every worker within `ttl`.
+
+    With a `control` reader, the pointer in the control index is re-read every
+    `control_ttl` seconds, and at once when Redis disagrees with the copy
+    held; if they still disagree (Redis flushed or evicted the key, or a
+    promote died between the two writes) the control index wins.
+    """
+
+    def __init__(self, client: redis.Redis, default: str, ttl: float = 5.0,
+                 control: Optional[ControlReader] = None, control_ttl: float = 60.0):
+        self.client = client
+        self.default = default
+        self.ttl = ttl
+        self.control = control
+        self.control_ttl = control_ttl
+        self._name: Optional[str] = None
+        self._read_at = 0.0
+        self._control_name: Optional[str] = None
+        self._control_read_at: Optional[float] = None
+
+    async def current(self) -> str:
+        if self._name is None or time.monotonic() - self._read_at > self.ttl:
+            name = await self.client.get(CURRENT_KEY)
+            if self.control is not None:
+                name = await self._check_control(name)
+            self._name = name or self.default
+            self._read_at = time.monotonic()
+        return self._name
+
+    async def _check_control(self, name: Optional[str]) -> Optional[str]:
+        now = time.monotonic()
+        stale = self._control_read_at is None or now - self._control_read_at > self.control_ttl
+        if stale or (self._control_name is not None and name != self._control_name):
+            try:
+                pointer = await self.control()
+                self._control_name = pointer.get("current") if pointer else None
+            except Exception:
+                logger.exception("Could not read the index generation control index")
+            self._control_read_at = now
+        if self._control_name is not None and name != self._control_name:
+            logger.error("Index pointer in Redis (%s) disagrees with the control index (%s): using the control index",
+                         name, self._control_name)
+            return self._control_name
+        return name
+
+    def invalidate(self):
+        self._name = None
+
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    """Smoke question set: JSON list or JSONL of {"question", "expected_urls"}."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def generation_name(base: str, number: int) -> str:
+    return f"{base}-g{number:04d}"
+
+
+def is_generation(base: str, name: Optional[str]) -> bool:
+    return bool(name) and name.startswith(f"{base}-g") and name[len(base) + 2:].isdigit()
+
+
+def control_index_name(base: str) -> str:
+    return f"{base}-generations"
+
+
+async def status(client: redis.Redis, default: str, control: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+    current, previous = await client.mget(CURRENT_KEY, PREVIOUS_KEY)
+    history = [json.loads(h) for h in await client.lrange(HISTORY_KEY, 0, -1)]
+    if control and control.get("current"):
+        # The control index is the durable copy: it wins over a lost or stale Redis pointer
+        consistent = (control["current"], control.get("previous")) == (current, previous)
+        current, previous = control["current"], control.get("previous")
+        return {"current": current, "previous": previous, "history": history, "consistent": consistent}
+    return {"current": current or default, "previous": previous, "history": history}
+
+
+async def list_generations(index_client, base: str) -> List[str]:
+    """Generation indexes of `base` that exist, oldest first (aio SearchIndexClient)."""
+    names = [name async for name in index_client.list_index_names() if is_generation(base, name)]
+    return sorted(names, key=lambda name: int(name[len(base) + 2:]))
+
+
+def next_generation(base: str, existing: Iterable[str]) -> str:
+    """Name after the highest generation number among `existing` (index names, pointer values)."""
+    numbers = [int(name[len(base) + 2:]) for name in existing if is_generation(base, name)]
+    return generation_name(base, max(numbers, default=0) + 1)
+
+
+async def create_index(index_client, source_index: str, name: str) -> None:
+    """Create an empty index `name` with the schema of `source_index` (aio SearchIndexClient).
+
+    Raises GenerationConflict if the index already exists (a concurrent create).
+    """
+    index = await index_client.get_index(source_index)
+    index.name = name
+    index.e_tag = None
+    try:
+        await index_client.create_index(index)
+    except ResourceExistsError:
+        raise GenerationConflict(f"Index '{name}' already exists (concurrent create?), retry")
+
+
+async def sweep(index_client, names: Iterable[str], keep: Iterable[Optional[str]]) -> List[str]:
+    """Delete the generations in `names` that are not in `keep`; returns the deleted ones."""
+    keep = set(keep)
+    deleted = []
+    for name in names:
+        if name in keep:
+            continue
+        try:
+            await index_client.delete_index(name)
+            deleted.append(name)
+        except ResourceNotFoundError:
+            pass
+        except Exception:
+            logger.exception("Could not delete index generation '%s'", name)
+    return deleted
+
+
+# -------------------------------
+# Control index: durable copy of the pointer
+# -------------------------------
+async def create_control_index(index_client, name: str) -> None:
+    """Create the control index if it does not exist yet (aio SearchIndexClient)."""
+    fields = [
+        SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+        SimpleField(name="current", type=SearchFieldDataType.String),
+        SimpleField(name="previous", type=SearchFieldDataType.String),
+        SimpleField(name="updated_at", type=SearchFieldDataType.String),
+    ]
+    try:
+        await index_client.create_index(SearchIndex(name=name, fields=fields))
+    except ResourceExistsError:
+        pass
+
+
+async def read_control(search_client) -> Optional[Dict[str, Optional[str]]]:
+    """Pointer held in the control index, None if it has none yet (aio SearchClient)."""
+    try:
+        doc = await search_client.get_document(CONTROL_DOCUMENT_ID)
+    except ResourceNotFoundError:  # no control index or no pointer in it yet
+        return None
+    return {"current": doc.get("current"), "previous": doc.get("previous")}
+
+
+async def write_control(search_client, current: str, previous: Optional[str]) -> None:
+    """Store the pointer in the control index (aio SearchClient with an admin key)."""
+    results = await search_client.upload_documents([{
+        "id": CONTROL_DOCUMENT_ID,
+        "current": current,
+        "previous": previous,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }])
+    failed = [r.error_message for r in results if not r.succeeded]
+    if failed:
+        raise RuntimeError(f"Control index write failed: {failed}")
+
+
+async def validate(
+    search: Callable[[str, int], Awaitable[List[Any]]],
+    document_count: int,
+    reference_count: int,
+    questions: List[Dict[str, Any]],
+    *,
+    top_k: int,
+    min_recall: float,
+    min_count_ratio: float,
+) -> Dict[str, Any]:
+    """Smoke checks of a candidate generation before it goes live.
+
+    - it holds at least min_count_ratio x the documents of the live index
+      (guards against promoting a truncated crawl)
+    - over the smoke questions ({question, expected_urls}) mean recall@top_k
+      is at least min_recall
+    """
+    def norm(url):
+        return (url or "").rstrip("/").lower()
+
+    recalls, misses = [], []
+    for item in questions:
+        docs = await search(item["question"], top_k)
+        expected = {norm(u) for u in item["expected_urls"]}
+        found = expected & {norm(d.url) for d in docs}
+        recalls.append(len(found) / len(expected))
+        if not found:
+            misses.append(item["question"])
+
+    recall = sum(recalls) / len(recalls) if recalls else 1.0
+    min_count = int(reference_count * min_count_ratio)
+    return {
+        "ok": document_count > 0 and document_count >= min_count and recall >= min_recall,
+        "documents": document_count,
+        "reference_documents": reference_count,
+        "min_documents": min_count,
+        "smoke_questions": len(questions),
+        "recall_at_k": round(recall, 4),
+        "min_recall": min_recall,
+        "missed": misses,
+    }
+
+
+async def sync_from_control(client: redis.Redis, control: Optional[Dict[str, Optional[str]]]) -> bool:
+    """Copy the control index pointer into Redis if Redis lost or disagrees with it; True if it did.
+
+    Run before promote/rollback, which build on the pointer they find in Redis.
+    """
+    if not control or not control.get("current"):
+        return False
+    current, previous = await client.mget(CURRENT_KEY, PREVIOUS_KEY)
+    if (current, previous) == (control["current"], control.get("previous")):
+        return False
+    logger.error("Index pointer in Redis (%s, %s) repaired from the control index (%s, %s)",
+                 current, previous, control["current"], control.get("previous"))
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.set(CURRENT_KEY, control["current"])
+        if control.get("previous"):
+            pipe.set(PREVIOUS_KEY, control["previous"])
+        else:
+            pipe.delete(PREVIOUS_KEY)
+        await pipe.execute()
+    return True
+
+
+async def _restore_control(client: redis.Redis, default: str, write: ControlWriter):
+    """After a lost WATCH race, put the control index back in line with Redis (the winner's pointer)."""
+    current, previous = await client.mget(CURRENT_KEY, PREVIOUS_KEY)
+    try:
+        await write(current or default, previous)
+    except Exception:
+        logger.exception("Could not restore the control index after a concurrent pointer change")
+
+
+async def promote(client: redis.Redis, name: str, default: str, report: Optional[Dict[str, Any]] = None,
+                  write_control: Optional[ControlWriter] = None) -> Dict[str, Any]:
+    """Atomically make `name` live; the generation it replaces becomes the rollback target.
+
+    The new pointer goes to the control index (`write_control`) first, then to
+    Redis. Returns {"current", "previous", "dropped"}: `dropped` is the
+    generation that fell out of the current/previous pair and can be deleted.
+    """
+    async with client.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(CURRENT_KEY, PREVIOUS_KEY)
+            current = await pipe.get(CURRENT_KEY) or default
+            previous = await pipe.get(PREVIOUS_KEY)
+            if current == name:
+                return {"current": name, "previous": previous, "dropped": None}
+            entry = {"action": "promote", "name": name, "replaced": current,
+                     "at": datetime.now(timezone.utc).isoformat(), "report": report}
+            if write_control is not None:
+                await write_control(name, current)
+            pipe.multi()
+            pipe.set(PREVIOUS_KEY, current)
+            pipe.set(CURRENT_KEY, name)
+            pipe.lpush(HISTORY_KEY, json.dumps(entry))
+            pipe.ltrim(HISTORY_KEY, 0, HISTORY_LENGTH - 1)
+            await pipe.execute()
+        except WatchError:
+            if write_control is not None:
+                await _restore_control(client, default, write_control)
+            raise GenerationConflict("Index pointer changed concurrently, retry")
+    return {"current": name, "previous": current, "dropped": previous if previous != name else None}
+
+
+async def rollback(client: redis.Redis, default: str, write_control: Optional[ControlWriter] = None) -> Dict[str, Any]:
+    """Atomically swap the live generation with the previous one (control index first, like promote)."""
+    async with client.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(CURRENT_KEY, PREVIOUS_KEY)
+            current = await pipe.get(CURRENT_KEY) or default
+            previous = await pipe.get(PREVIOUS_KEY)
+            if not previous:
+                raise GenerationConflict("No previous generation to roll back to")
+            entry = {"action": "rollback", "name": previous, "replaced": current,
+                     "at": datetime.now(timezone.utc).isoformat()}
+            if write_control is not None:
+                await write_control(previous, current)
+            pipe.multi()
+            pipe.set(CURRENT_KEY, previous)
+            pipe.set(PREVIOUS_KEY, current)
+            pipe.lpush(HISTORY_KEY, json.dumps(entry))
+            pipe.ltrim(HISTORY_KEY, 0, HISTORY_LENGTH - 1)
+            await pipe.execute()
+        except WatchError:
+            if write_control is not None:
+                await _restore_control(client, default, write_control)
+            raise GenerationConflict("Index pointer changed concurrently, retry")
+    return {"current": previous, "previous": current}
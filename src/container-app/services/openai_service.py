@@ -0,0 +1,272 @@
+""" Azure OpenAI router: several deployments per role, picked by latency, quota headroom and health """
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import openai
+
+logger = logging.getLogger("liotrag.openai")
+
+# rewrite: short completions (query rewrite, history summary); generation: the answer
+ROLES = ("rewrite", "generation")
+
+# Rate-limit headers are per minute: older readings say nothing about the current window
+QUOTA_READING_SECONDS = 60
+
+
+class NoDeploymentAvailable(Exception):
+    """Every deployment serving the role is throttled or has its circuit open."""
+
+    def __init__(self, role: str):
+        super().__init__(f"No Azure OpenAI deployment available for role '{role}'")
+        self.role = role
+
+
+def parse_deployments(raw: Optional[str], endpoint: str, deployment: str, api_version: str) -> List[Dict[str, Any]]:
+    """Deployment list from AZURE_OPENAI_DEPLOYMENTS (JSON), e.g.
+
+        [{"name": "gen-swc", "endpoint": "https://...", "deployment": "gpt-4o", "roles": ["generation"], "weight": 2},
+         {"name": "mini-swc", "endpoint": "https://...", "deployment": "gpt-4o-mini", "roles": ["rewrite"],
+          "secret_name": "openai-mini-key"}]
+
+    Optional keys: roles (default both), weight (1), api_version, secret_name
+    (Key Vault secret of the API key, default AZURE_OPENAI_SECRET_NAME) and
+    max_retries (SDK retries; default 0 so that failover, not a retry on the
+    same deployment, handles throttling).
+    Without the variable, the single AZURE_OPENAI_ENDPOINT/DEPLOYMENT serves both roles.
+    """
+    if not raw:
+        return [{"name": deployment, "endpoint": endpoint, "deployment": deployment,
+                 "roles": list(ROLES), "weight": 1.0, "api_version": api_version, "max_retries": 2}]
+    configs = json.loads(raw)
+    if not isinstance(configs, list) or not configs:
+        raise ValueError("AZURE_OPENAI_DEPLOYMENTS must be a non-empty JSON list")
+    parsed = []
+    for c in configs:
+        if not c.get("endpoint") or not c.get("deployment"):
+            raise ValueError(f"Each deployment needs 'endpoint' and 'deployment': {c}")
+        roles = c.get("roles") or list(ROLES)
+        unknown = set(roles) - set(ROLES)
+        if unknown:
+            raise ValueError(f"Unknown roles {sorted(unknown)} for deployment {c.get('name') or c['deployment']}")
+        parsed.append({
+            **c,
+            "name": c.get("name") or c["deployment"],
+            "roles": roles,
+            "weight": float(c.get("weight", 1.0)),
+            "api_version": c.get("api_version") or api_version,
+            "max_retries": int(c.get("max_retries", 0)),
+        })
+    names = [c["name"] for c in parsed]
+    if len(set(names)) != len(names):
+        raise ValueError("Deployment names must be unique")
+    return parsed
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(headers, default: float) -> float:
+    """Seconds to back off after a 429 (retry-after-ms, then retry-after)."""
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return default
+
+
+class Deployment:
+    """One Azure OpenAI deployment and its health as seen by this worker."""
+
+    def __init__(self, name: str, client, model: str, roles: Iterable[str] = ROLES, weight: float = 1.0):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.roles = tuple(roles)
+        self.weight = weight
+        self.latency: Dict[str, float] = {}  # EWMA of successful calls, per role
+        self.remaining_tokens: Optional[int] = None
+        self.remaining_requests: Optional[int] = None
+        self.peak_tokens = 0
+        self.peak_requests = 0
+        self.quota_read_at = 0.0
+        self.failures = 0  # consecutive
+        self.unavailable_until = 0.0  # throttled (429) or circuit open
+        self.circuit_open = False
+        self.probing = False
+        self.stats = {"calls": 0, "errors": 0, "throttled": 0}
+
+    def available(self, now: float) -> bool:
+        if now < self.unavailable_until:
+            return False
+        # Half-open: a single probe request decides whether the circuit closes
+        return not (self.circuit_open and self.probing)
+
+    def headroom(self, now: float) -> float:
+        """Remaining share of the per-minute quota (from the last response headers), 0.05..1."""
+        if now - self.quota_read_at > QUOTA_READING_SECONDS:
+            return 1.0
+        shares = [remaining / peak for remaining, peak in (
+            (self.remaining_tokens, self.peak_tokens), (self.remaining_requests, self.peak_requests)
+        ) if remaining is not None and peak]
+        return max(0.05, min([1.0, *shares]))
+
+    def read_quota(self, headers, now: float):
+        tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+        requests = _header_int(headers, "x-ratelimit-remaining-requests")
+        if tokens is None and requests is None:
+            return
+        # The headers carry no limit: the highest remaining value seen stands in for it
+        if tokens is not None:
+            self.remaining_tokens, self.peak_tokens = tokens, max(self.peak_tokens, tokens)
+        if requests is not None:
+            self.remaining_requests, self.peak_requests = requests, max(self.peak_requests, requests)
+        self.quota_read_at = now
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "model": self.model,
+            "roles": list(self.roles),
+            "available": self.available(now),
+            "circuit_open": self.circuit_open,
+            "latency_ewma": {role: round(s, 3) for role, s in self.latency.items()},
+            "headroom": round(self.headroom(now), 3),
+            **self.stats,
+        }
+
+
+class OpenAIRouter:
+    """Picks a deployment per call, with failover.
+
+    The choice is weighted random over the available deployments of the role,
+    with weight x quota headroom / latency EWMA, so that load follows the
+    fastest deployments with quota left without piling onto one of them.
+    - 429: the deployment is skipped for its retry-after, the call fails over
+    - connection errors, timeouts and 5xx: failover; after `failure_threshold`
+      consecutive failures the circuit opens for `open_seconds`, then a single
+      probe request closes it again (or reopens it)
+    - other errors (bad request, content filter) are returned to the caller
+    A role without deployments of its own uses all deployments.
+    """
+
+    def __init__(self, deployments: List[Deployment], *, failure_threshold: int = 3, open_seconds: float = 30,
+                 max_attempts: int = 3, ewma_alpha: float = 0.2, initial_latency: float = 1.0,
+                 throttle_seconds: float = 5):
+        if not deployments:
+            raise ValueError("At least one deployment is required")
+        self.deployments = deployments
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_attempts = max_attempts
+        self.ewma_alpha = ewma_alpha
+        self.initial_latency = initial_latency
+        self.throttle_seconds = throttle_seconds
+
+    def candidates(self, role: str) -> List[Deployment]:
+        return [d for d in self.deployments if role in d.roles] or self.deployments
+
+    def _latency(self, deployment: Deployment, role: str, pool: List[Deployment]) -> float:
+        if role in deployment.latency:
+            return deployment.latency[role]
+        # Not measured yet: assume the best known one, so that it gets tried
+        known = [d.latency[role] for d in pool if role in d.latency]
+        return min(known) if known else self.initial_latency
+
+    def _pick(self, role: str, tried: set) -> Optional[Deployment]:
+        now = time.monotonic()
+        pool = self.candidates(role)
+        ready = [d for d in pool if d.name not in tried and d.available(now)]
+        if not ready:
+            if tried:
+                return None
+            # Nothing available on the first attempt: try the one that recovers first rather than fail
+            ready = [min(pool, key=lambda d: d.unavailable_until)]
+        else:
+            weights = [d.weight * d.headroom(now) / max(self._latency(d, role, pool), 0.01) for d in ready]
+            ready = random.choices(ready, weights=weights)
+        choice = ready[0]
+        if choice.circuit_open:
+            choice.probing = True
+        return choice
+
+    def _succeeded(self, deployment: Deployment, role: str, seconds: float, headers):
+        now = time.monotonic()
+        previous = deployment.latency.get(role)
+        deployment.latency[role] = seconds if previous is None else (
+            self.ewma_alpha * seconds + (1 - self.ewma_alpha) * previous)
+        deployment.read_quota(headers, now)
+        if deployment.circuit_open:
+            logger.info("Azure OpenAI deployment %s recovered, circuit closed", deployment.name)
+        deployment.failures = 0
+        deployment.circuit_open = deployment.probing = False
+
+    def _throttled(self, deployment: Deployment, headers):
+        now = time.monotonic()
+        deployment.stats["throttled"] += 1
+        deployment.unavailable_until = now + retry_after(headers, self.throttle_seconds)
+        deployment.remaining_tokens = deployment.remaining_requests = 0
+        deployment.quota_read_at = now
+        deployment.probing = False
+
+    def _failed(self, deployment: Deployment):
+        deployment.stats["errors"] += 1
+        deployment.failures += 1
+        if deployment.circuit_open or deployment.failures >= self.failure_threshold:
+            if not deployment.circuit_open:
+                logger.warning("Azure OpenAI deployment %s: %d consecutive failures, circuit open for %.0fs",
+                               deployment.name, deployment.failures, self.open_seconds)
+            deployment.circuit_open = True
+            deployment.unavailable_until = time.monotonic() + self.open_seconds
+        deployment.probing = False
+
+    async def create(self, role: str, **kwargs):
+        """chat.completions.create on a deployment of `role` (`model` is set by the router)."""
+        tried, error = set(), None
+        for _ in range(self.max_attempts):
+            deployment = self._pick(role, tried)
+            if deployment is None:
+                break
+            tried.add(deployment.name)
+            deployment.stats["calls"] += 1
+            started = time.monotonic()
+            try:
+                raw = await deployment.client.chat.completions.with_raw_response.create(model=deployment.model, **kwargs)
+                completion = raw.parse()
+            except openai.RateLimitError as e:
+                self._throttled(deployment, e.response.headers)
+                logger.warning("Azure OpenAI deployment %s throttled (%s), failing over", deployment.name, role)
+                error = e
+                continue
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                self._failed(deployment)
+                logger.warning("Azure OpenAI deployment %s failed (%s): %s, failing over", deployment.name, role, e)
+                error = e
+                continue
+            except BaseException:
+                # Caller errors and cancellation (deadline) say nothing about the deployment
+                deployment.probing = False
+                raise
+            self._succeeded(deployment, role, time.monotonic() - started, raw.headers)
+            return completion
+        raise error or NoDeploymentAvailable(role)
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [d.status() for d in self.deployments]
+
+    async def close(self):
+        for d in self.deployments:
+            try:
+                await d.client.close()
+            except Exception:
+                logger.exception("Error closing Azure OpenAI client %s", d.name)
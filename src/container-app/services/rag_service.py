@@ -0,0 +1,81 @@
+""" Per-request latency budget for the RAG pipeline """
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def format_context(docs: Iterable) -> str:
+    """Context block of the generation prompt (docs expose title, url and snippet)."""
+    return "\n\n".join([f"[DOC {i+1}]\nTitle: {d.title}\nURL: {d.url}\nSnippet: {d.snippet}" for i, d in enumerate(docs)])
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage cannot complete within the request budget."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """Absolute deadline of a request, passed down to every stage.
+
+    Deadline(None) never expires (used by background jobs such as the warm-up).
+    """
+
+    def __init__(self, budget_seconds: Optional[float]):
+        self.budget = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds if budget_seconds is not None else math.inf
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        if self.budget is None:
+            return 0.0
+        return self.budget - (self.expires_at - time.monotonic())
+
+    async def run(self, awaitable: Awaitable[T], stage: str) -> T:
+        """Await `awaitable`, cancelling it (and raising DeadlineExceeded) when the budget runs out."""
+        if self.expires_at == math.inf:
+            return await awaitable
+        remaining = self.remaining()
+        if remaining <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(stage)
+        try:
+            return await asyncio.wait_for(awaitable, timeout=remaining)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(stage) from None
+
+
+NO_DEADLINE = Deadline(None)
+
+
+class LatencyTracker:
+    """Recent latencies of one stage (per worker), used to estimate its p95.
+
+    Until `min_samples` observations are available the `initial` estimate is used.
+    """
+
+    def __init__(self, initial: float, window: int = 200, min_samples: int = 20):
+        self.initial = initial
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        if len(self._samples) < self.min_samples:
+            return self.initial
+        ordered = sorted(self._samples)
+        return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+    def p95(self) -> float:
+        return self.percentile(0.95)
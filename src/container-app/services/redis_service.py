@@ -0,0 +1,173 @@
+""" Redis-backed caches and query traffic log shared by all workers and replicas
+
+Cache keys carry the search index generation they were computed against, so
+promoting (or rolling back) a generation invalidates them without a flush.
+The write helpers also accept a WriteQueue (services/write_queue.py) as client.
+"""
+import hashlib
+import json
+import re
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a question, used as cache and traffic-log key.
+
+    "Quando inizia il 2° semestre?" and "quando  inizia il 2 semestre" map to
+    the same string; accented letters are kept (they matter in Italian).
+    """
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+
+def _retrieval_key(generation: str, query: str, top_k: int) -> str:
+    return f"cache:retrieval:{generation}:{top_k}:{_digest(normalize_query(query))}"
+
+
+def _answer_key(generation: str, query: str) -> str:
+    return f"cache:answer:{generation}:{_digest(normalize_query(query))}"
+
+
+def _traffic_key(day: datetime) -> str:
+    return f"traffic:{day.strftime('%Y%m%d')}"
+
+
+def _traffic_raw_key(day: datetime) -> str:
+    return f"traffic:raw:{day.strftime('%Y%m%d')}"
+
+
+def fingerprint(docs: List[Dict[str, Any]]) -> Dict[str, str]:
+    """url -> content hash of the documents an answer was built from."""
+    prints = {}
+    for doc in docs:
+        content_hash = doc.get("content_hash") or hashlib.sha1((doc.get("snippet") or "").encode("utf-8")).hexdigest()
+        prints[f"{doc.get('url')}#{len(prints)}"] = content_hash
+    return prints
+
+
+# -------------------------------
+# Retrieval cache: search query -> documents
+# -------------------------------
+async def get_cached_retrieval(client: redis.Redis, generation: str, query: str,
+                               top_k: int) -> Optional[List[Dict[str, Any]]]:
+    raw = await client.get(_retrieval_key(generation, query, top_k))
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)["docs"]
+    except (json.JSONDecodeError, KeyError):
+        return None
+
+
+async def set_cached_retrieval(client: redis.Redis, generation: str, query: str, top_k: int,
+                               docs: List[Dict[str, Any]], ttl: int):
+    payload = {"query": normalize_query(query), "docs": docs}
+    await client.setex(_retrieval_key(generation, query, top_k), ttl, json.dumps(payload, ensure_ascii=False))
+
+
+# -------------------------------
+# Answer cache: first-turn question -> answer (+ fingerprint of its sources)
+# -------------------------------
+async def get_cached_answer(client: redis.Redis, generation: str, question: str) -> Optional[Dict[str, Any]]:
+    raw = await client.get(_answer_key(generation, question))
+    if not raw:
+        return None
+    try:
+        entry = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+    return entry if entry.get("answer") else None
+
+
+async def set_cached_answer(client: redis.Redis, generation: str, question: str, answer: str,
+                            docs: List[Dict[str, Any]], ttl: int):
+    payload = {
+        "query": normalize_query(question),
+        "answer": answer,
+        "sources": fingerprint(docs),
+        "created": datetime.now(timezone.utc).isoformat(),
+    }
+    await client.setex(_answer_key(generation, question), ttl, json.dumps(payload, ensure_ascii=False))
+
+
+async def touch_cached_answer(client: redis.Redis, generation: str, question: str, ttl: int) -> bool:
+    """Extend the TTL of an answer that is still current."""
+    return bool(await client.expire(_answer_key(generation, question), ttl))
+
+
+# -------------------------------
+# Traffic log: one sorted set of normalized queries per UTC day, plus the
+# latest raw wording of each (what /chat searched and answered with)
+# -------------------------------
+async def log_query(client: redis.Redis, query: str, retention_days: int):
+    normalized = normalize_query(query)
+    if not normalized:
+        return
+    day = datetime.now(timezone.utc)
+    key, raw_key = _traffic_key(day), _traffic_raw_key(day)
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.zincrby(key, 1, normalized)
+        pipe.hset(raw_key, normalized, query)
+        pipe.expire(key, (retention_days + 1) * 86400)
+        pipe.expire(raw_key, (retention_days + 1) * 86400)
+        await pipe.execute()
+
+
+async def top_queries(client: redis.Redis, days: int, limit: int) -> List[Tuple[str, int]]:
+    """Most frequent queries over the last `days` days (today included).
+
+    Queries are counted by their normalized form and returned in their most
+    recent raw wording, so that a warm-up searches and answers exactly like
+    /chat did; days logged before raw wordings were kept fall back to the
+    normalized form.
+    """
+    today = datetime.now(timezone.utc)
+    days_back = [today - timedelta(days=d) for d in range(days)]
+    totals: Dict[str, float] = {}
+    for day in days_back:
+        for query, score in await client.zrevrange(_traffic_key(day), 0, -1, withscores=True):
+            totals[query] = totals.get(query, 0) + score
+    ranked = sorted(totals.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+
+    raw: Dict[str, str] = {}
+    for day in days_back:  # newest first
+        missing = [query for query, _ in ranked if query not in raw]
+        if not missing:
+            break
+        for query, wording in zip(missing, await client.hmget(_traffic_raw_key(day), missing)):
+            if wording:
+                raw[query] = wording
+    return [(raw.get(query, query), int(score)) for query, score in ranked]
+
+
+# -------------------------------
+# Rate limiting: fixed windows shared by all workers and replicas
+# -------------------------------
+async def rate_limit(client: redis.Redis, name: str, cost: int, limit: int, window: int) -> int:
+    """Charge `cost` units to `name` in the current `window`-second window.
+
+    Returns 0 when within `limit`, else the seconds until the window resets;
+    a rejected charge is refunded, so it does not count against later calls.
+    """
+    now = int(datetime.now(timezone.utc).timestamp())
+    key = f"ratelimit:{name}:{now // window}"
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.incrby(key, cost)
+        pipe.expire(key, window)
+        used, _ = await pipe.execute()
+    if used <= limit:
+        return 0
+    await client.decrby(key, cost)
+    return window - now % window
@@ -0,0 +1,123 @@
+""" Hedged Azure AI Search requests """
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple, TypeVar
+
+from services.rag_service import Deadline, DeadlineExceeded, LatencyTracker
+
+T = TypeVar("T")
+
+# Index fields tried in order for the snippet handed to the generation prompt
+DEFAULT_SNIPPET_FIELDS = ("chunk", "content")
+QUERY_TYPES = ("simple", "full", "semantic")
+
+
+def snippet_of(doc: Dict[str, Any], fields: Sequence[str] = DEFAULT_SNIPPET_FIELDS) -> str:
+    """First non-empty snippet field; "heading+content" joins the two fields."""
+    for field in fields:
+        if "+" in field:
+            text = "\n".join(doc.get(part) or "" for part in field.split("+")).strip()
+        else:
+            text = doc.get(field) or ""
+        if text:
+            return text
+    return ""
+
+
+def search_options(query_type: str, semantic_config: Optional[str] = None) -> Dict[str, Any]:
+    """Keyword arguments of SearchClient.search for a retrieval mode (simple | full | semantic).
+
+    Raises ValueError for an unknown mode, or semantic without a semantic
+    configuration (the service rejects the request).
+    """
+    if query_type not in QUERY_TYPES:
+        raise ValueError(f"Search query type must be one of {', '.join(QUERY_TYPES)}, got '{query_type}'")
+    if query_type == "semantic" and not semantic_config:
+        raise ValueError("Semantic search needs the name of the index's semantic configuration")
+    if query_type == "simple":
+        return {}
+    if query_type == "semantic":
+        return {"query_type": "semantic", "semantic_configuration_name": semantic_config}
+    return {"query_type": query_type}
+
+
+class HedgeBudget:
+    """Caps hedging at `ratio` of the last `window` requests (per worker).
+
+    Without a cap, a slow backend makes most requests cross the p95 and the
+    hedges double the load on it exactly when it is struggling.
+    """
+
+    def __init__(self, ratio: float = 0.05, window: int = 1000):
+        self.ratio = ratio
+        self.window = window
+        self._requests = 0
+        self._hedges: deque = deque()  # request numbers of the recent hedges
+
+    def request(self) -> None:
+        self._requests += 1
+
+    def try_hedge(self) -> bool:
+        """Take a hedge from the budget; False once the window has used its share."""
+        while self._hedges and self._hedges[0] <= self._requests - self.window:
+            self._hedges.popleft()
+        if len(self._hedges) + 1 > self.ratio * min(self._requests, self.window):
+            return False
+        self._hedges.append(self._requests)
+        return True
+
+
+async def hedged_request(
+    call: Callable[[], Awaitable[T]],
+    tracker: LatencyTracker,
+    deadline: Deadline,
+    budget: Optional[HedgeBudget] = None,
+    min_hedge_delay: float = 0.05,
+) -> Tuple[T, bool]:
+    """Run `call`; if it is slower than the tracker's recent p95 (and `budget`
+    allows), start a second identical request and return whichever succeeds
+    first (the other is cancelled).
+
+    The tracker gets one sample per request, measured from the start of the
+    first attempt until the request ends, so slow attempts that a hedge
+    cancelled still count and the p95 does not drift down.
+
+    Returns (result, hedged). Raises DeadlineExceeded when neither request
+    completes before the deadline, or the error of the last failed attempt.
+    """
+    start = time.monotonic()
+    if budget is not None:
+        budget.request()
+    tasks = {asyncio.create_task(call())}
+    hedged = failed = False
+    hedge_after = max(min_hedge_delay, tracker.p95())
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=min(hedge_after, deadline.remaining()))
+        if not done and deadline.remaining() > 0 and (budget is None or budget.try_hedge()):
+            tasks.add(asyncio.create_task(call()))
+            hedged = True
+
+        error = None
+        while tasks:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise DeadlineExceeded("search")
+            done, _ = await asyncio.wait(
+                tasks, timeout=None if remaining == float("inf") else remaining,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                raise DeadlineExceeded("search")
+            for task in done:
+                tasks.discard(task)
+                if task.exception() is None:
+                    return task.result(), hedged
+                error = task.exception()
+        failed = True
+        raise error
+    finally:
+        if not failed:  # a fast error says nothing about the latency
+            tracker.observe(time.monotonic() - start)
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,85 @@
+""" Rolling conversation summary stored next to the session in Redis """
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import redis.asyncio as redis
+
+logger = logging.getLogger("liotrag.summary")
+
+# Upper bound for one summary update; the lock expires on its own if a worker dies
+SUMMARY_LOCK_SECONDS = 60
+
+SummarizeFn = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+
+def _summary_key(session_id: str) -> str:
+    return f"{session_id}:summary"
+
+
+def _pending_key(session_id: str) -> str:
+    return f"{session_id}:summary:pending"
+
+
+def _lock_key(session_id: str) -> str:
+    return f"{session_id}:summary:lock"
+
+
+def evict(history: List[Dict[str, str]], keep_turns: int) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """Split `history` into the window of the last `keep_turns` turns (user +
+    assistant messages) and the older messages it evicts, oldest first."""
+    cut = max(0, len(history) - 2 * max(0, keep_turns))
+    return history[cut:], history[:cut]
+
+
+async def load_summary(client: redis.Redis, session_id: str) -> str:
+    return await client.get(_summary_key(session_id)) or ""
+
+
+async def update_summary(
+    client: redis.Redis,
+    session_id: str,
+    evicted: List[Dict[str, str]],
+    summarize: SummarizeFn,
+    ttl: int,
+    max_chars: int,
+):
+    """Fold the turns evicted from the history window into the rolling summary.
+
+    Runs after the response has been sent. Evicted turns are queued in a
+    per-session list first, so concurrent updates for the same session never
+    lose turns: whoever holds the lock drains the queue; turns queued right
+    after it released the lock are folded in by the next update.
+    """
+    pending = _pending_key(session_id)
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.rpush(pending, *[json.dumps(m, ensure_ascii=False) for m in evicted])
+        pipe.expire(pending, ttl)
+        await pipe.execute()
+
+    lock, token = _lock_key(session_id), uuid.uuid4().hex
+    if not await client.set(lock, token, nx=True, ex=SUMMARY_LOCK_SECONDS):
+        return
+    try:
+        while True:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.lrange(pending, 0, -1)
+                pipe.delete(pending)
+                raw, _ = await pipe.execute()
+            if not raw:
+                break
+            try:
+                previous = await load_summary(client, session_id)
+                summary = (await summarize(previous, [json.loads(r) for r in raw])).strip()[:max_chars]
+            except Exception:
+                # Put the turns back (in order) for the next attempt
+                await client.lpush(pending, *reversed(raw))
+                raise
+            await client.setex(_summary_key(session_id), ttl, summary)
+            logger.info("Summary for session %s updated (+%d messages, %d chars)", session_id, len(raw), len(summary))
+    except Exception:
+        logger.exception("Summary update failed for session %s", session_id)
+    finally:
+        if await client.get(lock) == token:
+            await client.delete(lock)
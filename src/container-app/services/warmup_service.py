@@ -0,0 +1,144 @@
+""" Cache warm-up: pre-answer the most frequent questions after a crawl """
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import redis.asyncio as redis
+
+from models.models import SourceDocument
+from services.redis_service import (
+    fingerprint,
+    get_cached_answer,
+    set_cached_answer,
+    set_cached_retrieval,
+    top_queries,
+    touch_cached_answer,
+)
+
+logger = logging.getLogger("liotrag.warmup")
+
+SearchFn = Callable[[str, int], Awaitable[List[SourceDocument]]]
+GenerateFn = Callable[[str, List[SourceDocument], Dict[str, int]], Awaitable[str]]
+
+# Background job states, kept in Redis so any worker or replica can report them
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+async def warm_up(
+    redis_client: redis.Redis,
+    search: SearchFn,
+    generate: GenerateFn,
+    *,
+    generation: str,
+    previous_generation: Optional[str] = None,
+    days: int,
+    limit: int,
+    concurrency: int,
+    token_budget: int,
+    top_k: int,
+    retrieval_ttl: int,
+    answer_ttl: int,
+) -> Dict[str, Any]:
+    """Refresh the retrieval and answer caches for the top `limit` queries of the last `days` days.
+
+    Queries are warmed in the raw wording /chat last received (see
+    top_queries), so the searches and answers match what users get.
+
+    Retrieval is always re-run (it is cheap and the crawl may have changed the
+    ranking). An answer is regenerated only when the fingerprint of its source
+    documents changed; otherwise its TTL is extended, or, right after a
+    generation switch, the answer cached for `previous_generation` is carried
+    over. Generation stops once
+    `token_budget` tokens have been spent (answers already in flight may
+    overshoot it by up to `concurrency - 1` completions); at most
+    `concurrency` queries are processed at a time.
+    """
+    started = time.monotonic()
+    queries = await top_queries(redis_client, days, limit)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    stats = {"queries": len(queries), "recomputed": 0, "unchanged": 0, "no_results": 0,
+             "skipped_budget": 0, "failed": 0, "tokens_used": 0}
+
+    async def warm(query: str):
+        async with semaphore:
+            try:
+                docs = await search(query, top_k)
+                if not docs:
+                    stats["no_results"] += 1
+                    return
+                doc_dicts = [d.model_dump() for d in docs]
+                await set_cached_retrieval(redis_client, generation, query, top_k, doc_dicts, retrieval_ttl)
+
+                sources = fingerprint(doc_dicts)
+                cached = await get_cached_answer(redis_client, generation, query)
+                if cached and cached.get("sources") == sources:
+                    await touch_cached_answer(redis_client, generation, query, answer_ttl)
+                    stats["unchanged"] += 1
+                    return
+                if previous_generation and previous_generation != generation:
+                    carried = await get_cached_answer(redis_client, previous_generation, query)
+                    if carried and carried.get("sources") == sources:
+                        await set_cached_answer(redis_client, generation, query, carried["answer"], doc_dicts, answer_ttl)
+                        stats["unchanged"] += 1
+                        return
+
+                if stats["tokens_used"] >= token_budget:
+                    stats["skipped_budget"] += 1
+                    return
+                usage: Dict[str, int] = {}
+                answer = await generate(query, docs, usage)
+                stats["tokens_used"] += usage.get("total_tokens", 0)
+                await set_cached_answer(redis_client, generation, query, answer, doc_dicts, answer_ttl)
+                stats["recomputed"] += 1
+            except Exception:
+                logger.exception("Warm-up failed for query '%s'", query)
+                stats["failed"] += 1
+
+    await asyncio.gather(*(warm(query) for query, _ in queries))
+    stats["elapsed_seconds"] = round(time.monotonic() - started, 2)
+    logger.info("Cache warm-up done: %s", stats)
+    return stats
+
+
+# -------------------------------
+# Background jobs: POST /warmup returns a job id at once, GET polls it
+# -------------------------------
+def _job_key(job_id: str) -> str:
+    return f"warmup:job:{job_id}"
+
+
+async def save_job(redis_client: redis.Redis, job_id: str, status: Dict[str, Any], ttl: int):
+    await redis_client.setex(_job_key(job_id), ttl, json.dumps(status))
+
+
+async def load_job(redis_client: redis.Redis, job_id: str) -> Optional[Dict[str, Any]]:
+    raw = await redis_client.get(_job_key(job_id))
+    return json.loads(raw) if raw else None
+
+
+def new_job(job_id: str, **params: Any) -> Dict[str, Any]:
+    return {"job_id": job_id, "state": RUNNING, "started_at": time.time(), "params": params}
+
+
+async def run_job(redis_client: redis.Redis, status: Dict[str, Any], work: Callable[[], Awaitable[Dict[str, Any]]], ttl: int):
+    """Run `work` for an accepted job (see new_job) and record its outcome, stats or error.
+
+    A job interrupted by a shutdown is recorded as failed, so a poller does
+    not wait on it until the status expires.
+    """
+    job_id = status["job_id"]
+    try:
+        status.update(state=DONE, stats=await work())
+    except asyncio.CancelledError:
+        status.update(state=FAILED, error="Interrupted by a backend shutdown", finished_at=time.time())
+        await save_job(redis_client, job_id, status, ttl)
+        raise
+    except Exception as e:
+        logger.exception("Cache warm-up job %s failed", job_id)
+        status.update(state=FAILED, error=str(e))
+    status["finished_at"] = time.time()
+    await save_job(redis_client, job_id, status, ttl)
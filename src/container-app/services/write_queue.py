@@ -0,0 +1,315 @@
+""" Post-response work queue: Redis writes batched across requests, plus follow-up jobs """
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from services.rag_service import NO_DEADLINE, Deadline, DeadlineExceeded, LatencyTracker
+
+logger = logging.getLogger("liotrag.queue")
+
+Command = Tuple[str, tuple, dict]
+
+
+class _RecordingPipeline:
+    """Stands in for client.pipeline(): commands are recorded and queued on execute()."""
+
+    def __init__(self, queue: "WriteQueue", essential: bool = True):
+        self._queue = queue
+        self._essential = essential
+        self._commands: List[Command] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._commands = []
+
+    def __getattr__(self, name: str):
+        def record(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return record
+
+    async def execute(self):
+        commands, self._commands = self._commands, []
+        await self._queue.write(commands, essential=self._essential)
+
+
+class _BestEffort:
+    """Client view of the queue for writes that may be shed under load (caches, traffic log)."""
+
+    def __init__(self, queue: "WriteQueue"):
+        self._queue = queue
+
+    async def setex(self, key: str, ttl: int, value: str):
+        await self._queue.setex(key, ttl, value, essential=False)
+
+    def pipeline(self, transaction: bool = False) -> _RecordingPipeline:
+        return _RecordingPipeline(self._queue, essential=False)
+
+
+class _Item:
+    __slots__ = ("commands", "overlay", "task_key", "job", "essential", "enqueued_at")
+
+    def __init__(self, commands=None, overlay=None, task_key=None, job=None, essential=True):
+        self.commands: List[Command] = commands or []
+        self.overlay: List[Tuple[str, int]] = overlay or []
+        self.task_key: Optional[str] = task_key
+        self.job: Optional[Callable[[], Awaitable[Any]]] = job
+        self.essential = essential
+        self.enqueued_at = time.monotonic()
+
+
+class WriteQueue:
+    """Bounded in-process queue for the work that can follow the response.
+
+    - Writes (setex / pipeline commands) are applied by a single consumer in
+      enqueue order, many requests per Redis pipeline round trip.
+    - Values written with setex are readable at once through get()
+      (read-your-writes), until they reach Redis. Another worker or replica
+      sees them once flushed, within the flush lag (milliseconds, see
+      metrics()), well below the time between two turns of a session.
+    - Jobs (e.g. the summary update) start once the writes queued before them
+      are flushed, in order per key, at most `max_tasks` at a time.
+    - Essential writes (the session history, the default) are never dropped:
+      a full queue makes the caller wait, up to its deadline
+      (DeadlineExceeded), and a failing Redis is retried with capped backoff
+      for as long as it takes, their values staying readable meanwhile.
+    - Best-effort writes (`best_effort`: caches, traffic log) are shed when
+      the queue is full, and dropped after `max_retries` failed flushes.
+    - close() drains the queue.
+
+    The queue accepts the calls redis_service makes on a client (setex,
+    pipeline), so its write helpers take the queue (or `best_effort`) in
+    place of the client.
+    """
+
+    def __init__(self, client: redis.Redis, maxsize: int = 1000, batch_size: int = 100,
+                 linger: float = 0.002, max_tasks: int = 8, max_retries: int = 3,
+                 max_backoff: float = 5.0):
+        self.client = client
+        self.best_effort = _BestEffort(self)
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._put_lock = asyncio.Lock()
+        self._enqueued: deque = deque()  # enqueue times, in queue order
+        self._overlay: Dict[str, Tuple[str, int]] = {}  # key -> (value, seq) not yet in Redis
+        self._seq = 0
+        self._chains: Dict[str, asyncio.Task] = {}
+        self._tasks: set = set()
+        self._task_slots = asyncio.Semaphore(max_tasks)
+        self._worker: Optional[asyncio.Task] = None
+        self._closed = False
+        self.lag = LatencyTracker(initial=0.0, window=500, min_samples=1)
+        self.stats = {"writes": 0, "batches": 0, "jobs": 0, "retries": 0, "dropped": 0, "shed": 0,
+                      "backpressure": 0, "deadline_exceeded": 0}
+
+    def start(self):
+        self._worker = asyncio.create_task(self._run())
+
+    # -------------------------------
+    # Producer side
+    # -------------------------------
+    async def _put(self, item: _Item, deadline: Deadline = NO_DEADLINE) -> bool:
+        """Queue `item`; False if it was shed (best effort and no room).
+
+        Essential items wait for room until `deadline`, then raise DeadlineExceeded.
+        """
+        if not self._put_lock.locked() and not self._queue.full():
+            # Room and nobody waiting: queued at once, even with the deadline spent
+            self._queue.put_nowait(item)
+            self._enqueued.append(item.enqueued_at)
+            return True
+        if not item.essential:
+            self.stats["shed"] += 1
+            return False
+
+        async def put():
+            # The lock keeps producers in arrival order while they wait for room
+            async with self._put_lock:
+                if self._queue.full():
+                    self.stats["backpressure"] += 1
+                await self._queue.put(item)
+                self._enqueued.append(item.enqueued_at)
+
+        try:
+            await deadline.run(put(), "write queue")
+        except DeadlineExceeded:
+            self.stats["deadline_exceeded"] += 1
+            raise
+        return True
+
+    async def write(self, commands: List[Command], essential: bool = True, deadline: Deadline = NO_DEADLINE):
+        if not commands:
+            return
+        if self._closed:
+            await self._execute(commands)
+            return
+        await self._put(_Item(commands=commands, essential=essential), deadline)
+
+    async def setex(self, key: str, ttl: int, value: str, essential: bool = True, deadline: Deadline = NO_DEADLINE):
+        if self._closed:
+            await self.client.setex(key, ttl, value)
+            return
+        self._seq += 1
+        seq, pending = self._seq, self._overlay.get(key)
+        self._overlay[key] = (value, seq)
+        queued = False
+        try:
+            queued = await self._put(_Item(commands=[("setex", (key, ttl, value), {})], overlay=[(key, seq)],
+                                           essential=essential), deadline)
+        finally:
+            if not queued and self._overlay.get(key, (None, None))[1] == seq:
+                # Never written: an earlier value still on its way is what readers must see
+                if pending is None:
+                    del self._overlay[key]
+                else:
+                    self._overlay[key] = pending
+
+    def pipeline(self, transaction: bool = False) -> _RecordingPipeline:
+        return _RecordingPipeline(self)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Read through the queue: a value still waiting to be written wins over Redis."""
+        pending = self._overlay.get(key)
+        if pending is not None:
+            return pending[0]
+        return await self.client.get(key)
+
+    async def spawn(self, key: str, job: Callable[[], Awaitable[Any]], deadline: Deadline = NO_DEADLINE):
+        """Run `job` after the writes queued so far, and after earlier jobs with the same key."""
+        if self._closed:
+            await self._run_job(job)
+            return
+        await self._put(_Item(task_key=key, job=job), deadline)
+
+    # -------------------------------
+    # Consumer side
+    # -------------------------------
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self.linger and self._queue.qsize() < self.batch_size:
+                await asyncio.sleep(self.linger)  # let concurrent requests join the batch
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for _ in batch:
+                self._enqueued.popleft()
+            try:
+                await self._flush(batch)
+            except Exception:
+                logger.exception("Write queue batch failed")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[_Item]):
+        items = [item for item in batch if item.commands]
+        attempt = 0
+        while items:
+            commands = [c for item in items for c in item.commands]
+            try:
+                await self._execute(commands)
+                self.stats["writes"] += len(commands)
+                self.stats["batches"] += 1
+                break
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    dropped = [c for item in items if not item.essential for c in item.commands]
+                    if dropped:
+                        self.stats["dropped"] += len(dropped)
+                        logger.error("Write queue: dropped %d best-effort Redis writes after %d attempts: %s",
+                                     len(dropped), attempt, e)
+                        items = [item for item in items if item.essential]
+                    if items:
+                        logger.error("Write queue: %d session writes failed %d times, retrying: %s",
+                                     sum(len(item.commands) for item in items), attempt, e)
+                if items:
+                    # Session writes wait for Redis to come back, their values served from the
+                    # overlay; the queue fills up meanwhile and new writes fail at their deadline
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(min(self.max_backoff, 0.1 * 2 ** (attempt - 1)))
+        for item in batch:
+            for key, seq in item.overlay:
+                if self._overlay.get(key, (None, None))[1] == seq:
+                    del self._overlay[key]
+        now = time.monotonic()
+        for item in batch:
+            self.lag.observe(now - item.enqueued_at)
+            if item.job is not None:
+                self._start_job(item.task_key, item.job)
+
+    async def _execute(self, commands: List[Command]):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for name, args, kwargs in commands:
+                getattr(pipe, name)(*args, **kwargs)
+            await pipe.execute()
+
+    async def _run_job(self, job: Callable[[], Awaitable[Any]]):
+        async with self._task_slots:
+            try:
+                await job()
+            except Exception:
+                logger.exception("Write queue job failed")
+            self.stats["jobs"] += 1
+
+    def _start_job(self, key: str, job: Callable[[], Awaitable[Any]]):
+        previous = self._chains.get(key)
+
+        async def run():
+            if previous is not None:
+                await asyncio.wait({previous})
+            await self._run_job(job)
+
+        task = asyncio.create_task(run())
+        self._chains[key] = task
+        self._tasks.add(task)
+
+        def done(t):
+            self._tasks.discard(t)
+            if self._chains.get(key) is t:
+                del self._chains[key]
+
+        task.add_done_callback(done)
+
+    # -------------------------------
+    # Shutdown and metrics
+    # -------------------------------
+    async def _drain(self):
+        await self._queue.join()
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self, timeout: float = 10.0):
+        """Stop queuing (later writes go straight to Redis) and drain what is queued."""
+        self._closed = True
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Write queue not drained within %.0fs: %d items, %d jobs and %d unwritten keys abandoned",
+                         timeout, self._queue.qsize(), len(self._tasks), len(self._overlay))
+        for task in [self._worker, *self._tasks]:
+            if task is not None:
+                task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "oldest_pending_seconds": round(time.monotonic() - self._enqueued[0], 4) if self._enqueued else 0.0,
+            "unflushed_keys": len(self._overlay),
+            "running_jobs": len(self._tasks),
+            "flush_lag_p50_seconds": round(self.lag.percentile(0.5), 4),
+            "flush_lag_p95_seconds": round(self.lag.p95(), 4),
+            **self.stats,
+        }
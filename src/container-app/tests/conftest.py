@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# main.py imports its modules as top-level packages (models, services)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("redis")
+pytest.importorskip("azure.search.documents")
+
+from services import index_generations  # noqa: E402
+from services.index_generations import CURRENT_KEY, PREVIOUS_KEY, GenerationPointer  # noqa: E402
+
+BASE = "dmi"
+
+
+class FakeRedis:
+    """The commands index_generations uses; a pipeline buffers after multi() (no WATCH conflicts)."""
+
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.lists = {}
+        self.writes = []
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def mget(self, *keys):
+        return [self.values.get(key) for key in keys]
+
+    async def set(self, key, value):
+        self.writes.append(("redis", key, value))
+        self.values[key] = value
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    async def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start:end + 1]
+
+    async def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+        self.buffering = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def watch(self, *keys):
+        self.buffering = False
+
+    def multi(self):
+        self.buffering = True
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if not self.buffering:
+            return method
+
+        def record(*args):
+            self.commands.append((method, args))
+            return self
+        return record
+
+    async def execute(self):
+        return [await method(*args) for method, args in self.commands]
+
+
+class FakeControl:
+    def __init__(self, current=None, previous=None):
+        self.pointer = {"current": current, "previous": previous} if current else None
+        self.reads = 0
+
+    async def read(self):
+        self.reads += 1
+        return self.pointer
+
+
+def test_next_generation_follows_the_highest_existing():
+    existing = [f"{BASE}-g0003", f"{BASE}-g0010", f"{BASE}-generations", "other-g0099", BASE]
+    assert index_generations.next_generation(BASE, existing) == f"{BASE}-g0011"
+    assert index_generations.next_generation(BASE, []) == f"{BASE}-g0001"
+
+
+def test_sweep_keeps_live_and_previous():
+    class IndexClient:
+        deleted = []
+
+        async def delete_index(self, name):
+            self.deleted.append(name)
+
+    names = [f"{BASE}-g0001", f"{BASE}-g0002", f"{BASE}-g0003", f"{BASE}-g0004"]
+    deleted = asyncio.run(index_generations.sweep(IndexClient(), names, {f"{BASE}-g0002", f"{BASE}-g0004", None}))
+    assert deleted == [f"{BASE}-g0001", f"{BASE}-g0003"]
+
+
+def test_pointer_trusts_the_control_index_when_redis_lost_the_key():
+    control = FakeControl(current=f"{BASE}-g0002")
+    pointer = GenerationPointer(FakeRedis(), BASE, ttl=0, control=control.read)
+    assert asyncio.run(pointer.current()) == f"{BASE}-g0002"
+
+
+def test_pointer_follows_a_promote_and_rereads_control_on_mismatch():
+    redis = FakeRedis({CURRENT_KEY: f"{BASE}-g0001"})
+    control = FakeControl(current=f"{BASE}-g0001")
+    pointer = GenerationPointer(redis, BASE, ttl=0, control=control.read, control_ttl=3600)
+
+    async def run():
+        names = [await pointer.current()]
+        # Promote: control first, then Redis
+        control.pointer = {"current": f"{BASE}-g0002", "previous": f"{BASE}-g0001"}
+        redis.values[CURRENT_KEY] = f"{BASE}-g0002"
+        names.append(await pointer.current())
+        # Redis rolled back to a stale value behind the control index's back
+        redis.values[CURRENT_KEY] = f"{BASE}-g0001"
+        names.append(await pointer.current())
+        return names
+
+    assert asyncio.run(run()) == [f"{BASE}-g0001", f"{BASE}-g0002", f"{BASE}-g0002"]
+
+
+def test_pointer_without_control_document_uses_redis():
+    control = FakeControl()
+    pointer = GenerationPointer(FakeRedis({CURRENT_KEY: f"{BASE}-g0004"}), BASE, ttl=0, control=control.read)
+    assert asyncio.run(pointer.current()) == f"{BASE}-g0004"
+
+
+def test_promote_writes_control_before_redis():
+    redis = FakeRedis({CURRENT_KEY: f"{BASE}-g0001"})
+
+    async def write_control(current, previous):
+        redis.writes.append(("control", current, previous))
+
+    result = asyncio.run(index_generations.promote(redis, f"{BASE}-g0002", BASE, None, write_control))
+    assert result == {"current": f"{BASE}-g0002", "previous": f"{BASE}-g0001", "dropped": None}
+    assert redis.writes[0] == ("control", f"{BASE}-g0002", f"{BASE}-g0001")
+    assert ("redis", CURRENT_KEY, f"{BASE}-g0002") in redis.writes[1:]
+
+
+def test_sync_from_control_repairs_redis():
+    redis = FakeRedis({CURRENT_KEY: f"{BASE}-g0001"})
+    control = {"current": f"{BASE}-g0003", "previous": f"{BASE}-g0002"}
+    assert asyncio.run(index_generations.sync_from_control(redis, control))
+    assert (redis.values[CURRENT_KEY], redis.values[PREVIOUS_KEY]) == (f"{BASE}-g0003", f"{BASE}-g0002")
+    assert not asyncio.run(index_generations.sync_from_control(redis, control))
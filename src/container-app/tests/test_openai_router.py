@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import pytest
+
+openai = pytest.importorskip("openai")
+httpx = pytest.importorskip("httpx")
+
+from services import openai_service  # noqa: E402
+from services.openai_service import Deployment, OpenAIRouter  # noqa: E402
+
+REQUEST = httpx.Request("POST", "https://fake.openai.azure.com/openai/deployments/x/chat/completions")
+
+
+def status_error(cls, status, headers=None):
+    return cls("fake", response=httpx.Response(status, headers=headers or {}, request=REQUEST), body=None)
+
+
+class Raw:
+    def __init__(self, name, headers):
+        self.name = name
+        self.headers = headers
+
+    def parse(self):
+        return self.name
+
+
+class FakeClient:
+    """chat.completions.with_raw_response.create that plays `outcomes` in turn (the last one repeats)."""
+
+    def __init__(self, name, *outcomes):
+        self.name = name
+        self.outcomes = list(outcomes) or ["ok"]
+        self.calls = 0
+        self.chat = self.completions = self.with_raw_response = self
+
+    async def create(self, model, **kwargs):
+        outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+        self.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return Raw(self.name, {"x-ratelimit-remaining-tokens": "1000"})
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def in_order(monkeypatch):
+    # The weighted random choice picks the first ready deployment, so the order is known
+    monkeypatch.setattr(openai_service.random, "choices", lambda population, weights: [population[0]])
+
+
+def router(*clients, **kwargs):
+    return OpenAIRouter([Deployment(c.name, c, c.name) for c in clients], **kwargs)
+
+
+def test_throttled_deployment_fails_over_and_is_skipped_for_its_retry_after():
+    a = FakeClient("a", status_error(openai.RateLimitError, 429, {"retry-after-ms": "60000"}), "ok")
+    b = FakeClient("b")
+    r = router(a, b)
+
+    async def run():
+        return [await r.create("generation", messages=[]) for _ in range(3)]
+
+    assert asyncio.run(run()) == ["b", "b", "b"]
+    assert a.calls == 1
+    assert r.deployments[0].stats["throttled"] == 1
+    assert not r.deployments[0].available(time.monotonic())
+
+
+def test_circuit_opens_after_consecutive_failures_then_a_probe_closes_it():
+    a = FakeClient("a", *[status_error(openai.InternalServerError, 500)] * 3, "ok")
+    b = FakeClient("b")
+    r = router(a, b, failure_threshold=3, open_seconds=0.05)
+    a_state = r.deployments[0]
+
+    async def run():
+        answers = [await r.create("generation", messages=[]) for _ in range(4)]
+        assert a_state.circuit_open and a.calls == 3  # fourth call went straight to b
+        await asyncio.sleep(0.06)
+        answers.append(await r.create("generation", messages=[]))  # half-open: a probes and recovers
+        return answers
+
+    assert asyncio.run(run()) == ["b", "b", "b", "b", "a"]
+    assert not a_state.circuit_open and a_state.failures == 0
+
+
+def test_failed_probe_reopens_the_circuit():
+    a = FakeClient("a", status_error(openai.InternalServerError, 500))
+    b = FakeClient("b")
+    r = router(a, b, failure_threshold=1, open_seconds=0.05)
+    a_state = r.deployments[0]
+
+    async def run():
+        await r.create("generation", messages=[])
+        await asyncio.sleep(0.06)
+        await r.create("generation", messages=[])  # probe fails over to b
+
+    asyncio.run(run())
+    assert a.calls == 2
+    assert a_state.circuit_open and not a_state.available(time.monotonic())
+
+
+def test_connection_errors_fail_over():
+    a = FakeClient("a", openai.APIConnectionError(request=REQUEST))
+    r = router(a, FakeClient("b"))
+    assert asyncio.run(r.create("rewrite", messages=[])) == "b"
+    assert r.deployments[0].stats["errors"] == 1
+
+
+def test_caller_errors_are_not_failed_over():
+    a = FakeClient("a", status_error(openai.BadRequestError, 400))
+    b = FakeClient("b")
+    r = router(a, b)
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(r.create("generation", messages=[]))
+    assert b.calls == 0
+    assert r.deployments[0].failures == 0
+
+
+def test_every_deployment_down_raises_the_last_error():
+    a = FakeClient("a", status_error(openai.InternalServerError, 500))
+    b = FakeClient("b", status_error(openai.RateLimitError, 429))
+    r = router(a, b)
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(r.create("generation", messages=[]))
+
+
+def test_roles_route_to_their_deployments():
+    mini, gen = FakeClient("mini"), FakeClient("gen")
+    r = OpenAIRouter([Deployment("mini", mini, "mini", roles=["rewrite"]),
+                      Deployment("gen", gen, "gen", roles=["generation"])])
+
+    async def run():
+        return await r.create("rewrite", messages=[]), await r.create("generation", messages=[])
+
+    assert asyncio.run(run()) == ("mini", "gen")
+
+
+def test_a_failed_deployment_is_not_retried_within_a_call():
+    a = FakeClient("a", status_error(openai.InternalServerError, 500))
+    r = router(a, max_attempts=3)
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(r.create("generation", messages=[]))
+    assert a.calls == 1
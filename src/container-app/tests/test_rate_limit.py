@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("redis")
+
+from services.redis_service import rate_limit  # noqa: E402
+
+WINDOW = 10 ** 9  # no window boundary falls inside the test
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def incrby(self, key, amount):
+        self.values[key] = self.values.get(key, 0) + amount
+        return self.values[key]
+
+    async def decrby(self, key, amount):
+        return await self.incrby(key, -amount)
+
+    async def expire(self, key, ttl):
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def __getattr__(self, name):
+        def record(*args):
+            self.commands.append((name, args))
+            return self
+        return record
+
+    async def execute(self):
+        return [await getattr(self.client, name)(*args) for name, args in self.commands]
+
+
+def test_questions_are_counted_per_caller_and_window():
+    client = FakeRedis()
+
+    async def run():
+        results = [
+            await rate_limit(client, "batch:a", 60, limit=100, window=WINDOW),
+            await rate_limit(client, "batch:a", 60, limit=100, window=WINDOW),  # 120 > 100
+            await rate_limit(client, "batch:a", 40, limit=100, window=WINDOW),  # refunded: 60 + 40
+            await rate_limit(client, "batch:b", 100, limit=100, window=WINDOW),
+        ]
+        return results
+
+    allowed, rejected, last, other = asyncio.run(run())
+    assert allowed == 0 and last == 0 and other == 0
+    assert 0 < rejected <= WINDOW
+    assert sorted(client.values.values()) == [100, 100]
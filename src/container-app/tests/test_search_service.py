@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services.rag_service import format_context
+from services.search_service import search_options, snippet_of
+
+
+def test_snippet_falls_back_in_field_order():
+    doc = {"chunk": "", "content": "Il corso di laurea L-31", "heading": "Informatica"}
+    assert snippet_of(doc) == "Il corso di laurea L-31"
+    assert snippet_of({**doc, "chunk": "Orari"}) == "Orari"
+    assert snippet_of({"chunk": None, "content": "testo"}) == "testo"
+    assert snippet_of(doc, ("missing", "heading")) == "Informatica"
+
+
+def test_snippet_joins_plus_fields_and_skips_empty_joins():
+    doc = {"heading": "Orari", "content": "Lunedi 9-11"}
+    assert snippet_of(doc, ("heading+content",)) == "Orari\nLunedi 9-11"
+    assert snippet_of({"content": "Lunedi 9-11"}, ("heading+content",)) == "Lunedi 9-11"
+    assert snippet_of({"heading": "", "content": None, "chunk": "c"}, ("heading+content", "chunk")) == "c"
+
+
+def test_snippet_of_empty_document():
+    assert snippet_of({}) == ""
+    assert snippet_of({"chunk": "", "content": None}, ("chunk", "content", "heading+content")) == ""
+
+
+def test_search_options_per_query_type():
+    assert search_options("simple") == {}
+    assert search_options("full") == {"query_type": "full"}
+    assert search_options("semantic", "dmi-semantic") == {
+        "query_type": "semantic", "semantic_configuration_name": "dmi-semantic",
+    }
+
+
+@pytest.mark.parametrize("query_type, semantic_config", [("semantic", None), ("semantic", ""), ("vector", None)])
+def test_search_options_rejects_what_the_service_would(query_type, semantic_config):
+    with pytest.raises(ValueError):
+        search_options(query_type, semantic_config)
+
+
+def test_format_context_numbers_the_documents():
+    docs = [SimpleNamespace(title="Orari", url="https://web.dmi.unict.it/orari", snippet="Lunedi 9-11"),
+            SimpleNamespace(title="Docenti", url="https://web.dmi.unict.it/docenti", snippet="")]
+    assert format_context(docs) == (
+        "[DOC 1]\nTitle: Orari\nURL: https://web.dmi.unict.it/orari\nSnippet: Lunedi 9-11\n\n"
+        "[DOC 2]\nTitle: Docenti\nURL: https://web.dmi.unict.it/docenti\nSnippet: "
+    )
+    assert format_context([]) == ""
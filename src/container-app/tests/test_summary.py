@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("redis")
+
+from services.summary_service import evict, load_summary, update_summary  # noqa: E402
+
+
+def turns(*numbers):
+    return [m for n in numbers for m in ({"role": "user", "content": f"q{n}"},
+                                          {"role": "assistant", "content": f"a{n}"})]
+
+
+class FakeRedis:
+    """The commands summary_service uses, on dicts; pipelines run on execute()."""
+
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+        self.lists.pop(key, None)
+
+    async def expire(self, key, ttl):
+        return True
+
+    async def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    async def lpush(self, key, *values):
+        for value in values:
+            self.lists.setdefault(key, []).insert(0, value)
+
+    async def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return record
+
+    async def execute(self):
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+def test_evict_keeps_the_last_turns():
+    kept, evicted = evict(turns(1, 2, 3, 4), keep_turns=2)
+    assert kept == turns(3, 4)
+    assert evicted == turns(1, 2)
+
+
+def test_evict_short_history_and_empty_window():
+    assert evict(turns(1), keep_turns=2) == (turns(1), [])
+    assert evict(turns(1, 2), keep_turns=0) == ([], turns(1, 2))
+
+
+def test_evicted_turns_are_folded_into_the_summary():
+    client, seen = FakeRedis(), []
+
+    async def summarize(previous, messages):
+        seen.append((previous, [m["content"] for m in messages]))
+        return f"{previous} {' '.join(m['content'] for m in messages)}".strip()
+
+    async def run():
+        history = []
+        for n in range(1, 5):
+            history, evicted = evict(history + turns(n), keep_turns=2)
+            if evicted:
+                await update_summary(client, "s", evicted, summarize, ttl=60, max_chars=100)
+        return history, await load_summary(client, "s")
+
+    history, summary = asyncio.run(run())
+    assert history == turns(3, 4)
+    assert summary == "q1 a1 q2 a2"
+    assert seen == [("", ["q1", "a1"]), ("q1 a1", ["q2", "a2"])]
+    assert "s:summary:lock" not in client.values
+
+
+def test_failed_summary_keeps_the_turns_for_the_next_update():
+    client = FakeRedis()
+    calls = []
+
+    async def summarize(previous, messages):
+        calls.append([m["content"] for m in messages])
+        if len(calls) == 1:
+            raise RuntimeError("throttled")
+        return " ".join(m["content"] for m in messages)
+
+    async def run():
+        await update_summary(client, "s", turns(1), summarize, ttl=60, max_chars=100)
+        assert json.loads(client.lists["s:summary:pending"][0])["content"] == "q1"
+        await update_summary(client, "s", turns(2), summarize, ttl=60, max_chars=100)
+        return await load_summary(client, "s")
+
+    assert asyncio.run(run()) == "q1 a1 q2 a2"
+    assert calls[-1] == ["q1", "a1", "q2", "a2"]
+
+
+def test_summary_is_capped():
+    client = FakeRedis()
+
+    async def summarize(previous, messages):
+        return "x" * 500
+
+    asyncio.run(update_summary(client, "s", turns(1), summarize, ttl=60, max_chars=40))
+    assert client.values["s:summary"] == "x" * 40
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("redis")
+
+from services.rag_service import Deadline, DeadlineExceeded  # noqa: E402
+from services.write_queue import WriteQueue  # noqa: E402
+
+
+class FakeRedis:
+    """setex/get plus a pipeline whose executes fail while `failures` lasts or `down` is set."""
+
+    def __init__(self, failures=0):
+        self.values = {}
+        self.executed = []  # commands in the order Redis applied them
+        self.failures = failures
+        self.down = False
+        self.attempts = 0
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def __getattr__(self, name):
+        def record(*args):
+            self.commands.append((name, args))
+            return self
+        return record
+
+    async def execute(self):
+        self.client.attempts += 1
+        if self.client.down or self.client.failures > 0:
+            self.client.failures -= 1
+            raise ConnectionError("redis down")
+        for name, args in self.commands:
+            self.client.executed.append((name, args))
+            if name == "setex":
+                self.client.values[args[0]] = args[2]
+
+
+def queue(client, **kwargs):
+    kwargs.setdefault("linger", 0)
+    q = WriteQueue(client, **kwargs)
+    q.start()
+    return q
+
+
+def test_writes_reach_redis_in_enqueue_order_across_producers():
+    client = FakeRedis()
+
+    async def run():
+        q = queue(client, maxsize=4, batch_size=3)
+
+        async def producer(name):
+            for i in range(5):
+                await q.setex(f"{name}{i}", 60, str(i))
+
+        await asyncio.gather(producer("a"), producer("b"))
+        await q.close()
+        return q
+
+    q = asyncio.run(run())
+    keys = [args[0] for _, args in client.executed]
+    assert sorted(keys) == sorted(f"{n}{i}" for n in "ab" for i in range(5))
+    for name in "ab":
+        assert [k for k in keys if k.startswith(name)] == [f"{name}{i}" for i in range(5)]
+    assert q.stats["writes"] == 10 and q.stats["dropped"] == 0
+
+
+def test_overlay_serves_queued_values_until_they_are_written():
+    client = FakeRedis()
+
+    async def run():
+        q = queue(client)
+        client.down = True
+        await q.setex("conv:s", 60, "turn 1")
+        await q.setex("conv:s", 60, "turn 2")
+        await asyncio.sleep(0.01)
+        seen = [await q.get("conv:s"), client.values.get("conv:s")]
+        client.down = False
+        await q.close()
+        seen.append(q.metrics()["unflushed_keys"])
+        seen.append(await q.get("conv:s"))
+        return seen
+
+    assert asyncio.run(run()) == ["turn 2", None, 0, "turn 2"]
+
+
+def test_history_writes_are_retried_until_redis_is_back():
+    client = FakeRedis(failures=6)
+
+    async def run():
+        q = queue(client, max_retries=1, max_backoff=0.01)
+        await q.setex("conv:s", 60, "history")
+        await q.best_effort.setex("cache:q", 60, "answer")
+        await q.close()
+        return q
+
+    q = asyncio.run(run())
+    assert client.values["conv:s"] == "history"
+    assert q.stats["retries"] == 6
+    assert q.stats["dropped"] == 1 and "cache:q" not in client.values  # same batch, given up on after 2 tries
+
+
+def test_best_effort_writes_are_dropped_after_max_retries():
+    client = FakeRedis(failures=2)
+
+    async def run():
+        q = queue(client, max_retries=1, max_backoff=0.01)
+        pipe = q.best_effort.pipeline()
+        pipe.zincrby("traffic", 1, "q")
+        await pipe.execute()
+        await q.close()
+        return q
+
+    q = asyncio.run(run())
+    assert q.stats["dropped"] == 1 and client.executed == []
+
+
+def test_full_queue_sheds_best_effort_and_bounds_history_by_the_deadline():
+    client = FakeRedis()
+
+    async def run():
+        q = WriteQueue(client, maxsize=1)  # not started: nothing drains
+        await q.setex("conv:a", 60, "a")
+        await q.best_effort.setex("cache:q", 60, "answer")
+        shed_visible = await q.get("cache:q")
+        with pytest.raises(DeadlineExceeded):
+            await q.setex("conv:b", 60, "b", deadline=Deadline(0.02))
+        return q, shed_visible, await q.get("conv:a"), await q.get("conv:b")
+
+    q, shed_visible, a, b = asyncio.run(run())
+    assert (shed_visible, a, b) == (None, "a", None)
+    assert q.stats["shed"] == 1 and q.stats["deadline_exceeded"] == 1
@@ -1,5 +1,7 @@
 import os
+import time
 import uuid
+import asyncio
 import httpx
 import chainlit as cl
 from dotenv import load_dotenv
@@ -13,17 +15,99 @@ if not LLM_API_URL:
     raise ValueError("AZURE_CONTAINER_APP_ENDPOINT must be set in environment variables")
 LLM_API_URL = LLM_API_URL.rstrip("/")
 
+# -------------------------------
+# HTTP client settings
+# -------------------------------
+CHAT_TIMEOUT_SECONDS = float(os.getenv("LLM_API_CHAT_TIMEOUT", "30"))
+AUTH_TIMEOUT_SECONDS = float(os.getenv("LLM_API_AUTH_TIMEOUT", "10"))
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_API_CONNECT_TIMEOUT", "5"))
+MAX_RETRIES = int(os.getenv("LLM_API_MAX_RETRIES", "2"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_API_RETRY_BACKOFF", "0.5"))
+HTTP2_ENABLED = os.getenv("LLM_API_HTTP2", "false").lower() in ("1", "true", "yes")
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+# One pooled keep-alive client per process: messages reuse the TLS connection
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=LLM_API_URL,
+            timeout=httpx.Timeout(CHAT_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120),
+            http2=HTTP2_ENABLED,
+            # Transport retries only cover failed connects (request never sent), so they
+            # are safe for POST /chat as well
+            transport=httpx.AsyncHTTPTransport(retries=MAX_RETRIES, http2=HTTP2_ENABLED),
+        )
+    return _client
+
+
+async def get_with_retry(path: str) -> httpx.Response:
+    """GET an idempotent endpoint with bounded retries and exponential backoff."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = await get_client().get(path, timeout=AUTH_TIMEOUT_SECONDS)
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt == MAX_RETRIES:
+                return response
+        except (httpx.TimeoutException, httpx.TransportError):
+            if attempt == MAX_RETRIES:
+                raise
+        await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+
+class TokenCache:
+    """Process-wide access token, refreshed shortly before it expires."""
+
+    def __init__(self, refresh_margin: int):
+        self.refresh_margin = refresh_margin
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _valid(self) -> bool:
+        return self._token is not None and time.monotonic() < self._expires_at - self.refresh_margin
+
+    async def get(self, stale: str | None = None) -> str:
+        """Return a valid token; `stale` is a token the server just rejected."""
+        if self._valid() and self._token != stale:
+            return self._token
+        async with self._lock:
+            # Another task may have refreshed it while we waited
+            if self._valid() and self._token != stale:
+                return self._token
+            response = await get_with_retry("/get_auth")
+            response.raise_for_status()
+            data = response.json()
+            self._token = data["access_token"]
+            self._expires_at = time.monotonic() + int(data.get("expires_in", 3600))
+            return self._token
+
+
+token_cache = TokenCache(TOKEN_REFRESH_MARGIN_SECONDS)
+
+
+async def post_chat(payload: dict) -> httpx.Response:
+    token = await token_cache.get()
+    response = await get_client().post("/chat", json=payload, headers={"Authorization": f"Bearer {token}"})
+    if response.status_code == 401:
+        # Token revoked/rotated server side: refresh once and retry
+        token = await token_cache.get(stale=token)
+        response = await get_client().post("/chat", json=payload, headers={"Authorization": f"Bearer {token}"})
+    return response
+
 # -------------------------------
 # Chainlit Handlers
 # -------------------------------
 @cl.on_chat_start
 async def start_chat():
     """Initialize a new chat session."""
-    async with httpx.AsyncClient(timeout=90) as client:
-        response = await client.get(f"{LLM_API_URL}/get_auth")
-        response.raise_for_status()
-        data = response.json()
-        cl.user_session.set("access_token", data["access_token"])
+    # Warm the shared token (no-op while the cached one is valid)
+    await token_cache.get()
     # Create a unique session id for Redis conversation tracking (required by backend ChatRequest)
     cl.user_session.set("session_id", str(uuid.uuid4()))
     await cl.Message("Ciao! Sono qui per rispondere alle tue domande sul DMI. Come posso aiutarti oggi?").send()
@@ -38,24 +122,17 @@ async def handle_message(message: cl.Message):
     await assistant_message.send()
 
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            session_id = cl.user_session.get("session_id")
-            if not session_id: # regenerate if missing
-                session_id = str(uuid.uuid4())
-                cl.user_session.set("session_id", session_id)
-            response = await client.post(
-                url=f"{LLM_API_URL}/chat",
-                json={
-                    "user_prompt": user_input,
-                    "session_id": session_id
-                },
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {cl.user_session.get('access_token')}",
-                }
-            )
-            if response.status_code != 200:
-                assistant_text = f"⚠️ Errore Server: {response.status_code} - {response.text}"
+        session_id = cl.user_session.get("session_id")
+        if not session_id: # regenerate if missing
+            session_id = str(uuid.uuid4())
+            cl.user_session.set("session_id", session_id)
+        response = await post_chat({
+            "user_prompt": user_input,
+            "session_id": session_id
+        })
+        if response.status_code != 200:
+            assistant_text = f"⚠️ Errore Server: {response.status_code} - {response.text}"
+        else:
             data = response.json()
             assistant_text = data.get("response_text", "Nessun contenuto disponibile!")
 
@@ -64,4 +141,4 @@ async def handle_message(message: cl.Message):
 
     # Send as a single Chainlit message
     assistant_message.content = assistant_text
-    await assistant_message.update()
\ No newline at end of file
+    await assistant_message.update()
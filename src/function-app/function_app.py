@@ -1,12 +1,229 @@
 import azure.functions as func
+import json
 import logging
 from pathlib import Path
 import os
+import shutil
 import subprocess
 import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from scraper.scraper.sharding import mark_closed
 
 app = func.FunctionApp()
 
+def crawl_state_args(state_dir: Path, resume: bool = True) -> tuple[list[str], bool]:
+    """
+    Scrapy settings that persist the frontier and change history in state_dir,
+    and whether the crawl resumes an interrupted frontier. With resume=False
+    an interrupted frontier is discarded (the change history is kept).
+    """
+    jobdir = state_dir / "jobdir"
+    if (jobdir / ".finished").exists() or not resume:
+        # Previous crawl completed (or must not be resumed): start a fresh frontier
+        shutil.rmtree(jobdir, ignore_errors=True)
+    jobdir.mkdir(parents=True, exist_ok=True)
+    resumed = any(jobdir.iterdir())
+    if resumed:
+        logging.info(f"Resuming the interrupted crawl in {jobdir}")
+    args = [
+        "-s", f"JOBDIR={jobdir}",
+        "-s", f"FRONTIER_HISTORY_PATH={state_dir / 'frontier_history.json'}",
+    ]
+    return args, resumed
+
+def merge_manifests(manifest_paths: list[Path]) -> dict:
+    """Union the per-shard item manifests and sum their numeric stats."""
+    merged = {"shards": [], "stats": {}, "items": {}, "cross_shard_duplicates": 0}
+    url_by_hash = {}
+    for path in manifest_paths:
+        if not path.exists():
+            logging.warning(f"Missing shard manifest: {path}")
+            continue
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        merged["shards"].append({
+            "shard": manifest["shard"],
+            "reason": manifest["reason"],
+            "items": len(manifest["items"]),
+        })
+        for key, value in manifest["stats"].items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged["stats"][key] = merged["stats"].get(key, 0) + value
+        for url, content_hash in manifest["items"].items():
+            merged["items"][url] = content_hash
+            # Each shard deduplicates on its own; count what slipped through across shards
+            if content_hash and url_by_hash.setdefault(content_hash, url) != url:
+                merged["cross_shard_duplicates"] += 1
+    return merged
+
+def run_sharded_crawl(cmd: list[str], shards: int, shard_by: str, state_dir: Path | None,
+                      crawler_dir: Path, env: dict, resume: bool = True) -> dict:
+    """
+    Run one crawler process per shard in parallel, each with its own frontier,
+    then merge their manifests. Per-shard wall-clock times are logged to size N.
+    Without state_dir, the manifests and the link exchange live in a temporary
+    directory removed afterwards.
+    """
+    if state_dir:
+        return _run_shards(cmd, shards, shard_by, state_dir, state_dir, crawler_dir, env, resume)
+    with tempfile.TemporaryDirectory(prefix="crawl-") as work_dir:
+        return _run_shards(cmd, shards, shard_by, None, Path(work_dir), crawler_dir, env, resume)
+
+def _run_shards(cmd: list[str], shards: int, shard_by: str, state_dir: Path | None, work_dir: Path,
+                crawler_dir: Path, env: dict, resume: bool = True) -> dict:
+    manifest_dir = work_dir / "manifests"
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    # Shards hand each other the links they do not own (scraper/sharding.py);
+    # the exchange only describes the current run
+    exchange_dir = work_dir / "exchange"
+    shutil.rmtree(exchange_dir, ignore_errors=True)
+    exchange_dir.mkdir(parents=True)
+
+    running, resumed = {}, False
+    started = time.monotonic()
+    for shard in range(shards):
+        manifest = manifest_dir / f"shard-{shard}.json"
+        manifest.unlink(missing_ok=True)
+        shard_cmd = cmd + [
+            "-a", f"shard={shard}",
+            "-a", f"shards={shards}",
+            "-a", f"shard_by={shard_by}",
+            "-a", f"manifest={manifest}",
+            "-a", f"exchange={exchange_dir}",
+        ]
+        if state_dir:
+            state_args, shard_resumed = crawl_state_args(state_dir / f"shard-{shard}", resume)
+            shard_cmd += state_args
+            resumed = resumed or shard_resumed
+        logging.info(f"Starting crawl shard {shard}/{shards}: {shard_cmd}")
+        running[shard] = (manifest, subprocess.Popen(shard_cmd, cwd=crawler_dir, env=env))
+
+    timings, failed = {}, []
+    while len(timings) < shards:
+        for shard, (_, proc) in running.items():
+            if shard in timings or proc.poll() is None:
+                continue
+            timings[shard] = time.monotonic() - started
+            logging.info(f"Crawl shard {shard} exited with code {proc.returncode} after {timings[shard]:.1f}s")
+            if proc.returncode != 0:
+                failed.append(shard)
+            # A crashed shard never closed itself: the others must not wait for it
+            mark_closed(exchange_dir, shard)
+        time.sleep(1)
+
+    merged = merge_manifests([manifest for manifest, _ in running.values()])
+    for entry in merged["shards"]:
+        entry["elapsed_seconds"] = round(timings[entry["shard"]], 1)
+    merged["elapsed_seconds"] = round(max(timings.values()), 1)
+    merged["resumed"] = resumed
+    (manifest_dir / "manifest.json").write_text(json.dumps(merged), encoding="utf-8")
+    logging.info(
+        f"Sharded crawl finished in {merged['elapsed_seconds']}s: {len(merged['items'])} items, "
+        f"{merged['cross_shard_duplicates']} cross-shard duplicates, "
+        f"slowest/fastest shard {max(timings.values()):.1f}s/{min(timings.values()):.1f}s"
+    )
+    if failed:
+        raise RuntimeError(f"Crawl shards failed: {sorted(failed)}")
+    return merged
+
+def call_backend(path: str, timeout: float, method: str = "POST") -> dict:
+    """
+    {method} {BACKEND_URL}{path}, authenticated with the function's identity
+    for BACKEND_SCOPE (api://<backend client id>/.default).
+    """
+    from azure.identity import DefaultAzureCredential
+
+    token = DefaultAzureCredential().get_token(os.environ["BACKEND_SCOPE"]).token
+    request = urllib.request.Request(
+        os.environ["BACKEND_URL"].rstrip("/") + path,
+        data=b"{}" if method == "POST" else None,
+        method=method,
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as resp:
+        return json.loads(resp.read() or b"{}")
+
+
+def start_index_generation() -> str | None:
+    """
+    With SEARCH_INDEX_GENERATIONS set, ask the backend for a new, empty index
+    generation that this crawl fills instead of the live index. Falls back to
+    the live index (incremental updates) if it cannot be created.
+    """
+    if not os.getenv("BACKEND_URL") or os.getenv("SEARCH_INDEX_GENERATIONS", "false").lower() not in ("1", "true", "yes"):
+        return None
+    try:
+        name = call_backend("/index/generations", timeout=60)["name"]
+        logging.info(f"Crawling into new index generation {name}")
+        return name
+    except Exception:
+        logging.exception("Could not create an index generation; updating the live index instead")
+        return None
+
+
+def discard_index_generation(generation: str | None) -> None:
+    """Delete a generation whose crawl failed: it is never promoted. Best effort."""
+    if not generation:
+        return
+    try:
+        call_backend(f"/index/generations/{generation}", timeout=60, method="DELETE")
+        logging.info(f"Deleted index generation {generation} of the failed crawl")
+    except Exception:
+        logging.exception(f"Could not delete index generation {generation}; the next one created sweeps it")
+
+
+def warm_caches() -> dict:
+    """
+    Start the backend's cache warm-up job and poll it until it finishes or
+    WARMUP_TIMEOUT runs out (the job keeps running on the backend then).
+    """
+    job = call_backend("/warmup", timeout=60)
+    deadline = time.monotonic() + float(os.getenv("WARMUP_TIMEOUT", "1800"))
+    poll_seconds = float(os.getenv("WARMUP_POLL_SECONDS", "15"))
+    while job["state"] == "running":
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Cache warm-up job {job['job_id']} still running after WARMUP_TIMEOUT")
+        time.sleep(poll_seconds)
+        job = call_backend(f"/warmup/{job['job_id']}", timeout=30, method="GET")
+    return job
+
+
+def after_crawl(generation: str | None, resumed: bool = False) -> None:
+    """
+    Promote the freshly built index generation (the backend smoke-tests it
+    first and keeps the previous one for rollback), then warm the caches.
+    Best effort: the backend deletes a generation that fails its smoke checks.
+    A resumed crawl only filled the generation with the pages fetched after
+    the interruption, so its generation is never promoted (crawls into a
+    generation do not resume, this is a safety net).
+    """
+    if not os.getenv("BACKEND_URL"):
+        return
+    if generation and resumed:
+        logging.error(f"Index generation {generation} not promoted: it was built by a resumed crawl")
+        discard_index_generation(generation)
+    elif generation:
+        try:
+            logging.info(f"Index generation promoted: {call_backend(f'/index/generations/{generation}/promote', timeout=300)}")
+        except urllib.error.HTTPError as e:
+            logging.error(f"Index generation {generation} not promoted: {e.code} {e.read().decode('utf-8', 'replace')}")
+        except Exception:
+            logging.exception(f"Index generation {generation} not promoted")
+
+    if os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes"):
+        try:
+            job = warm_caches()
+            if job["state"] == "done":
+                logging.info(f"Cache warm-up: {job['stats']}")
+            else:
+                logging.error(f"Cache warm-up job {job['job_id']} {job['state']}: {job.get('error')}")
+        except Exception:
+            logging.exception("Cache warm-up failed")
+
+
 @app.timer_trigger(
     schedule="0 0 1 * * *",  # every day at 01:00 UTC
     arg_name="myTimer",
@@ -33,12 +250,45 @@ def scrapePapardo(myTimer: func.TimerRequest) -> None:
     # Run the spider via 'python -m scrapy'
     # This works best as subprocess to avoid Twisted reactor issues
     crawler_dir = Path(__file__).resolve().parent / "scraper"
-    cmd = [sys.executable, "-m", "scrapy", "crawl", "dmi_full", "-s", "LOG_LEVEL=INFO"]
+    spider = os.getenv("SCRAPER_SPIDER", "dmi_full")
+    cmd = [sys.executable, "-m", "scrapy", "crawl", spider, "-s", "LOG_LEVEL=INFO"]
+
+    # Blue/green reindex: fill a new index generation, promoted after the crawl
+    generation = start_index_generation()
+    if generation:
+        cmd += ["-s", f"SEARCH_INDEX_NAME={generation}"]
+
+    # Persistent crawl state (e.g. under /home on Linux plans): the frontier
+    # resumes an interrupted run and the change history drives priorities.
+    # A new generation starts empty, so an interrupted frontier is not resumed
+    # into it (the pages fetched before the interruption would be missing).
+    state_dir = os.getenv("SCRAPER_STATE_DIR")
+    resume = generation is None
+
+    # Partition the URL space across N parallel crawler processes
+    shards = int(os.getenv("SCRAPER_SHARDS", "1"))
+    if shards > 1:
+        shard_by = os.getenv("SCRAPER_SHARD_BY", "prefix")
+        try:
+            merged = run_sharded_crawl(cmd, shards, shard_by, Path(state_dir) if state_dir else None,
+                                       crawler_dir, env, resume)
+        except Exception:
+            discard_index_generation(generation)
+            raise
+        after_crawl(generation, merged["resumed"])
+        return
+
+    resumed = False
+    if state_dir:
+        state_args, resumed = crawl_state_args(Path(state_dir), resume)
+        cmd += state_args
     logging.info(f"Starting crawl: {cmd}")
     try:
         subprocess.run(cmd, cwd=crawler_dir, check=True, env=env)
         logging.info("Crawl finished successfully.")
     except subprocess.CalledProcessError as e:
         logging.exception("Crawl failed with non-zero exit code")
+        discard_index_generation(generation)
         raise
+    after_crawl(generation, resumed)
     
\ No newline at end of file
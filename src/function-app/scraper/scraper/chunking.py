@@ -0,0 +1,134 @@
+import hashlib
+import re
+from typing import List, Tuple
+
+_ATX_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_SETEXT_RE = re.compile(r'^(=+|-+)\s*$')
+
+
+def split_sections(markdown: str) -> List[Tuple[List[str], str]]:
+    """
+    Split markdown into (heading_path, text) sections.
+
+    Understands ATX headings ("## Title") and the setext headings
+    ("Title" underlined with === or ---) that markdownify emits for h1/h2.
+    Each section text starts with its own heading line.
+    """
+    sections: List[Tuple[List[str], List[str]]] = [([], [])]
+    stack: List[Tuple[int, str]] = []
+    lines = markdown.splitlines()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        next_line = lines[i + 1] if i + 1 < len(lines) else ""
+        level, title = 0, ""
+        atx = _ATX_RE.match(line)
+        if atx:
+            level, title = len(atx.group(1)), atx.group(2)
+        elif line.strip() and not _SETEXT_RE.match(line) and _SETEXT_RE.match(next_line):
+            level = 1 if next_line.startswith('=') else 2
+            title = line.strip()
+
+        if level and title:
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, title))
+            heading_line = f"{'#' * level} {title}"
+            sections.append(([t for _, t in stack], [heading_line]))
+            i += 2 if not atx else 1
+            continue
+
+        sections[-1][1].append(line)
+        i += 1
+
+    return [(path, "\n".join(body).strip()) for path, body in sections if "\n".join(body).strip()]
+
+
+def _split_long(text: str, max_chars: int, overlap_chars: int) -> List[str]:
+    """Greedy split on paragraphs, then on whitespace, with a trailing-context overlap."""
+    # Leave room for the overlap when a paragraph has to be cut
+    piece_chars = max(max_chars - overlap_chars, max_chars // 2)
+    pieces: List[str] = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        while len(paragraph) > piece_chars:
+            cut = paragraph.rfind(' ', 0, piece_chars)
+            cut = cut if cut > piece_chars // 2 else piece_chars
+            pieces.append(paragraph[:cut].rstrip())
+            paragraph = paragraph[cut:].lstrip()
+        if paragraph:
+            pieces.append(paragraph)
+
+    parts: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 2 + len(piece) > max_chars:
+            parts.append(current)
+            tail = current[-overlap_chars:] if overlap_chars else ""
+            if tail and ' ' in tail:
+                tail = tail[tail.index(' ') + 1:]
+            current = f"{tail}\n\n{piece}" if tail and len(tail) + 2 + len(piece) <= max_chars else piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        parts.append(current)
+    return parts
+
+
+def chunk_markdown(
+    url: str,
+    title: str,
+    markdown: str,
+    max_chars: int = 2000,
+    overlap_chars: int = 200,
+    min_chars: int = 200,
+) -> List[dict]:
+    """
+    Heading-aware, size-bounded chunks of a page.
+
+    Chunk IDs derive from the URL, the heading path and the position of the
+    part inside its section, so editing one section leaves the IDs (and
+    content hashes) of the other chunks unchanged. Chunks, breadcrumb
+    included, are at most max_chars long.
+    """
+    sections = split_sections(markdown)
+
+    # Fold sections too small to stand alone into the following one
+    merged: List[Tuple[List[str], str]] = []
+    carry_path, carry_text = None, ""
+    for path, text in sections:
+        if carry_text:
+            text = f"{carry_text}\n\n{text}"
+            carry_path, carry_text = None, ""
+        if len(text) < min_chars:
+            carry_path, carry_text = path, text
+            continue
+        merged.append((path, text))
+    if carry_text:
+        if merged and len(merged[-1][1]) + len(carry_text) + 2 <= max_chars:
+            merged[-1] = (merged[-1][0], f"{merged[-1][1]}\n\n{carry_text}")
+        else:
+            merged.append((carry_path, carry_text))
+
+    chunks: List[dict] = []
+    occurrences = {}
+    for path, text in merged:
+        heading = " > ".join(path)
+        occurrence = occurrences.get(heading, 0)
+        occurrences[heading] = occurrence + 1
+        # Every part starts with the breadcrumb: split the text within what it leaves
+        breadcrumb = " > ".join([title] + path) if title else heading
+        breadcrumb = breadcrumb[:max_chars // 4].rstrip()
+        budget = max_chars - len(breadcrumb) - 2 if breadcrumb else max_chars
+        for part_index, part in enumerate(_split_long(text, budget, min(overlap_chars, budget // 4))):
+            key = f"{url}\n{heading}\n{occurrence}\n{part_index}"
+            content = f"{breadcrumb}\n\n{part}" if breadcrumb else part
+            chunks.append({
+                "chunk_id": hashlib.sha1(key.encode("utf-8")).hexdigest(),
+                "ordinal": len(chunks),
+                "heading": heading,
+                "content": content,
+                "content_hash": hashlib.sha256(content.encode("utf-8")).hexdigest(),
+            })
+    return chunks
@@ -0,0 +1,151 @@
+import hashlib
+import random
+import re
+from array import array
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_MERSENNE_PRIME = (1 << 61) - 1
+_EMPTY = _MERSENNE_PRIME  # above any bin value
+
+
+def candidate_probability(similarity: float, bands: int, rows: int) -> float:
+    """Probability that a pair with this Jaccard similarity shares at least one band."""
+    return 1.0 - (1.0 - similarity ** rows) ** bands
+
+
+def _choose_bands(num_perm: int, threshold: float, recall: float = 0.99) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows <= num_perm: the most rows per band
+    (fewest false candidates) that still make a pair at exactly `threshold`
+    a candidate with probability >= recall. The steep part of the LSH
+    S-curve then sits below the threshold, not on it.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if candidate_probability(threshold, bands, rows) < recall:
+            break
+        best = (bands, rows)
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures over word shingles, bucketed with LSH banding.
+
+    Signatures use one-permutation hashing with optimal densification
+    (Shrivastava, 2017): each shingle hash is permuted once and lands in one
+    of `num_perm` bins, whose minimum is that bin's signature value; empty
+    bins borrow the value of a bin picked by a fixed probe sequence. Two
+    signatures agree on a position with probability equal to the Jaccard
+    similarity, as with `num_perm` independent permutations, for one
+    multiply-mod per shingle instead of `num_perm`.
+
+    Lookup cost depends on the number of bands and on the size of the
+    colliding buckets, not on the number of pages already indexed.
+    Candidates from the buckets are confirmed with the exact Jaccard
+    similarity of the shingle hashes when they were given to add() and
+    query(), else with the similarity estimated from the full signatures.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _choose_bands(num_perm, threshold)
+
+        rng = random.Random(seed)
+        self._perm = (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+        self._probe = (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(1, _MERSENNE_PRIME),
+                       rng.randrange(0, _MERSENNE_PRIME))
+        self._buckets: List[Dict[Tuple[int, ...], List[str]]] = [{} for _ in range(self.bands)]
+        self._signatures: Dict[str, Tuple[int, ...]] = {}
+        self._shingles: Dict[str, array] = {}  # key -> sorted shingle hashes, 4 bytes each
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def shingles(self, text: str) -> set:
+        words = _WORD_RE.findall(text.lower())
+        k = self.shingle_size
+        if len(words) <= k:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+    def shingle_hashes(self, text: str) -> FrozenSet[int]:
+        return frozenset(
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+            for s in self.shingles(text)
+        )
+
+    def signature(self, text: str, hashes: Optional[FrozenSet[int]] = None) -> Tuple[int, ...]:
+        if hashes is None:
+            hashes = self.shingle_hashes(text)
+        k = self.num_perm
+        a, b = self._perm
+        bins = [_EMPTY] * k
+        for h in hashes:
+            value, i = divmod((a * h + b) % _MERSENNE_PRIME, k)
+            if value < bins[i]:
+                bins[i] = value
+        if not hashes:
+            return tuple(bins)
+
+        # Densification: an empty bin takes the value of the first non-empty bin on its
+        # probe sequence, which depends on the bin only, so both sides of a pair probe alike
+        sig = list(bins)
+        c_bin, c_attempt, c = self._probe
+        for i in range(k):
+            attempt = 0
+            while sig[i] == _EMPTY:
+                attempt += 1
+                sig[i] = bins[(c_bin * i + c_attempt * attempt + c) % _MERSENNE_PRIME % k]
+        return tuple(sig)
+
+    def similarity(self, sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / self.num_perm
+
+    @staticmethod
+    def jaccard(hashes_a: FrozenSet[int], hashes_b) -> float:
+        hashes_b = hashes_b if isinstance(hashes_b, (set, frozenset)) else set(hashes_b)
+        union = len(hashes_a | hashes_b)
+        return len(hashes_a & hashes_b) / union if union else 1.0
+
+    def _band_keys(self, sig: Tuple[int, ...]):
+        r = self.rows
+        for band in range(self.bands):
+            yield band, sig[band * r:(band + 1) * r]
+
+    def query(self, sig: Tuple[int, ...], hashes: Optional[FrozenSet[int]] = None) -> Optional[Tuple[str, float]]:
+        """Return (canonical_key, similarity) of the best match above threshold, if any."""
+        seen = set()
+        best: Optional[Tuple[str, float]] = None
+        for band, key in self._band_keys(sig):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                stored = self._shingles.get(candidate)
+                if hashes is not None and stored is not None:
+                    score = self.jaccard(hashes, stored)
+                else:
+                    score = self.similarity(sig, self._signatures[candidate])
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (candidate, score)
+        return best
+
+    def add(self, key: str, sig: Tuple[int, ...], hashes: Optional[FrozenSet[int]] = None) -> None:
+        self._signatures[key] = sig
+        if hashes is not None:
+            self._shingles[key] = array("I", sorted(hashes))
+        for band, band_key in self._band_keys(sig):
+            self._buckets[band].setdefault(band_key, []).append(key)
@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from .metrics import Gauge, get_recorder
+from .pipelines import create_blob_service
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlMetrics:
+    """
+    Always-on crawl instrumentation.
+
+    Collects, besides the stage timings recorded by the pipelines:
+      - download latency histogram, pages/items throughput
+      - bytes downloaded vs uploaded (blob pipeline)
+      - DropItem reasons
+      - scheduler / downloader / scraper queue depths, sampled every
+        METRICS_SAMPLE_INTERVAL seconds
+    and writes a JSON report at spider_closed to METRICS_REPORT_DIR and,
+    optionally, to the METRICS_BLOB_CONTAINER blob container, so that runs
+    can be compared over time. Each shard of a sharded crawl writes its own
+    report (see report_name()).
+    """
+
+    def __init__(self, crawler, report_dir: Path, sample_interval: float, blob_container: str | None):
+        self.crawler = crawler
+        self.recorder = get_recorder(crawler)
+        self.report_dir = report_dir
+        self.sample_interval = sample_interval
+        self.blob_container = blob_container
+        self.drop_reasons = {}
+        self.queue_depths = {"scheduler": Gauge(), "downloader": Gauge(), "scraper": Gauge()}
+        self.started = None
+        self._sampler = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("METRICS_ENABLED", True):
+            raise NotConfigured
+        report_dir = settings.get("METRICS_REPORT_DIR")
+        if not report_dir:
+            output_dir = settings.get("SCRAPED_OUTPUT_DIR") or Path(Path.cwd(), "output")
+            report_dir = Path(output_dir, "metrics")
+        ext = cls(
+            crawler,
+            report_dir=Path(report_dir),
+            sample_interval=settings.getfloat("METRICS_SAMPLE_INTERVAL", 5.0),
+            blob_container=settings.get("METRICS_BLOB_CONTAINER"),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(ext.item_dropped, signal=signals.item_dropped)
+        return ext
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+        self._sampler = task.LoopingCall(self.sample_queues)
+        self._sampler.start(self.sample_interval, now=False)
+
+    def response_received(self, response, request, spider):
+        self.recorder.inc("pages")
+        self.recorder.inc("bytes_downloaded", len(response.body))
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            self.recorder.observe("download", latency)
+
+    def item_scraped(self, item, response, spider):
+        self.recorder.inc("items")
+
+    def item_dropped(self, item, response, exception, spider):
+        # "Old academic year content: 2023/2024" / "Near-duplicate of <url>" -> one bucket each
+        reason = re.split(r":| of ", str(exception), maxsplit=1)[0].strip(" ,") or type(exception).__name__
+        self.drop_reasons[reason] = self.drop_reasons.get(reason, 0) + 1
+
+    def sample_queues(self):
+        engine = self.crawler.engine
+        if engine is None:
+            return
+        slot = getattr(engine, "_slot", None) or getattr(engine, "slot", None)
+        if slot is not None and slot.scheduler is not None:
+            self.queue_depths["scheduler"].observe(len(slot.scheduler))
+        self.queue_depths["downloader"].observe(len(engine.downloader.active))
+        scraper_slot = getattr(engine.scraper, "slot", None)
+        if scraper_slot is not None:
+            self.queue_depths["scraper"].observe(len(scraper_slot.queue) + len(scraper_slot.active))
+
+    def build_report(self, spider, reason: str) -> dict:
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        counters = dict(self.recorder.counters)
+
+        def per_second(n):
+            return round(n / elapsed, 3) if elapsed else 0.0
+
+        return {
+            "spider": spider.name,
+            "shard": getattr(spider, "shard", 0),
+            "shards": getattr(spider, "shards", 1),
+            "reason": reason,
+            "started": datetime.fromtimestamp(self.recorder.started, timezone.utc).isoformat(),
+            "finished": datetime.now(timezone.utc).isoformat(),
+            "elapsed_seconds": round(elapsed, 2),
+            "throughput": {
+                "pages_per_second": per_second(counters.get("pages", 0)),
+                "items_per_second": per_second(counters.get("items", 0)),
+            },
+            "bytes": {
+                "downloaded": counters.get("bytes_downloaded", 0),
+                "uploaded": counters.get("bytes_uploaded", 0),
+            },
+            "counters": counters,
+            "stages": {name: hist.summary() for name, hist in sorted(self.recorder.histograms.items())},
+            "drop_reasons": self.drop_reasons,
+            "queue_depths": {name: hist.summary() for name, hist in self.queue_depths.items()},
+            "stats": self.crawler.stats.get_stats(),
+        }
+
+    @staticmethod
+    def report_name(spider, finished: datetime) -> str:
+        """<spider>-<UTC time>[-shard<i>of<N>].json: the shards of a crawl close together."""
+        name = f"{spider.name}-{finished.strftime('%Y%m%dT%H%M%SZ')}"
+        shards = getattr(spider, "shards", 1)
+        if shards > 1:
+            name += f"-shard{spider.shard}of{shards}"
+        return f"{name}.json"
+
+    def spider_closed(self, spider, reason):
+        if self._sampler is not None and self._sampler.running:
+            self._sampler.stop()
+
+        report = self.build_report(spider, reason)
+        payload = json.dumps(report, indent=2, default=str)
+        name = self.report_name(spider, datetime.now(timezone.utc))
+
+        try:
+            self.report_dir.mkdir(parents=True, exist_ok=True)
+            (self.report_dir / name).write_text(payload, encoding="utf-8")
+            logger.info(f"Crawl metrics report written to {self.report_dir / name}")
+        except OSError as e:
+            logger.error(f"Could not write crawl metrics report: {e}")
+
+        if self.blob_container:
+            self.upload_report(name, payload)
+
+    def upload_report(self, name: str, payload: str):
+        settings = self.crawler.settings
+        service = create_blob_service(
+            settings.get("AZURE_STORAGE_CONNECTION_STRING") or os.getenv("AZURE_STORAGE_CONNECTION_STRING"),
+            settings.get("AZURE_STORAGE_ACCOUNT_URL") or os.getenv("AZURE_STORAGE_ACCOUNT_URL"),
+        )
+        if service is None:
+            logger.warning("METRICS_BLOB_CONTAINER set but no blob storage configured; report not uploaded")
+            return
+        try:
+            container = service.get_container_client(self.blob_container)
+            try:
+                container.create_container()
+            except Exception:
+                pass
+            container.upload_blob(name, payload.encode("utf-8"), overwrite=True)
+            logger.info(f"Crawl metrics report uploaded to {self.blob_container}/{name}")
+        except Exception as e:
+            logger.error(f"Could not upload crawl metrics report: {e}")
@@ -0,0 +1,199 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Per-document status codes worth retrying (throttling, transient conflicts, service errors)
+RETRYABLE_STATUS_CODES = frozenset([409, 422, 429, 500, 502, 503, 504])
+
+MERGE_OR_UPLOAD = "mergeOrUpload"
+DELETE = "delete"
+
+
+class BatchIndexer:
+    """
+    Push documents straight to an Azure AI Search index.
+
+    - Documents whose content_hash matches the one already in the index are skipped.
+    - Changes are grouped into batches of `batch_size` and sent by at most
+      `max_concurrency` worker threads. Queuing never blocks: callers check
+      backlogged() and wait_for_capacity() off the Scrapy reactor thread.
+    - Documents that fail inside a batch (partial success) are retried alone
+      with exponential backoff; whole-batch failures retry the whole batch,
+      and a 413 splits it in two.
+
+    `client` is a (sync) azure.search.documents.SearchClient, or anything with
+    the same merge_or_upload_documents / delete_documents / search methods.
+    """
+
+    def __init__(
+        self,
+        client,
+        key_field: str = "id",
+        batch_size: int = 500,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        backoff_seconds: float = 1.0,
+    ):
+        self.client = client
+        self.key_field = key_field
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        self.existing: Dict[str, dict] = {}  # key -> {content_hash, parent_id, url}
+        self.children: Dict[str, set] = {}  # parent_id -> keys
+        self.seen_keys = set()
+        self.stats = {"sent": 0, "deleted": 0, "skipped": 0, "failed": 0, "retried": 0, "batches": 0}
+        self._stats_lock = threading.Lock()
+
+        self._pending = {MERGE_OR_UPLOAD: [], DELETE: []}
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="indexer")
+        self._in_flight = set()
+        self._in_flight_changed = threading.Condition()
+        self._started = time.monotonic()
+
+    def load_existing(self, fields=("content_hash", "parent_id", "url")) -> int:
+        """Read key + content_hash of every indexed document (one paged scan)."""
+        select = [self.key_field, *fields]
+        for doc in self.client.search(search_text="*", select=select):
+            key = doc[self.key_field]
+            self.existing[key] = {f: doc.get(f) for f in fields}
+            if doc.get("parent_id"):
+                self.children.setdefault(doc["parent_id"], set()).add(key)
+        return len(self.existing)
+
+    def add(self, doc: dict) -> bool:
+        """Queue a document if it is new or changed. Returns False when skipped."""
+        key = doc[self.key_field]
+        self.seen_keys.add(key)
+        current = self.existing.get(key)
+        if current is not None and current.get("content_hash") == doc.get("content_hash"):
+            self._count("skipped")
+            return False
+        self._queue(MERGE_OR_UPLOAD, doc)
+        return True
+
+    def delete(self, key: str) -> None:
+        self._queue(DELETE, {self.key_field: key})
+
+    def stale_keys(self, parent_id: str, current_keys) -> List[str]:
+        """Indexed documents of a page that the page no longer produces."""
+        return [key for key in self.children.get(parent_id, ()) if key not in current_keys]
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def _queue(self, action: str, doc: dict) -> None:
+        pending = self._pending[action]
+        pending.append(doc)
+        if len(pending) >= self.batch_size:
+            self._pending[action] = []
+            self._submit(action, pending)
+
+    def _submit(self, action: str, docs: List[dict]) -> None:
+        future = self._executor.submit(self._send, action, docs)
+        with self._in_flight_changed:
+            self._in_flight.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future) -> None:
+        with self._in_flight_changed:
+            self._in_flight.discard(future)
+            self._in_flight_changed.notify_all()
+
+    def backlogged(self) -> bool:
+        """More batches submitted than worker threads: the caller should slow down."""
+        with self._in_flight_changed:
+            return len(self._in_flight) > self.max_concurrency
+
+    def wait_for_capacity(self) -> None:
+        """Block until at most max_concurrency batches are in flight (call it off the reactor)."""
+        with self._in_flight_changed:
+            self._in_flight_changed.wait_for(lambda: len(self._in_flight) <= self.max_concurrency)
+
+    def _call(self, action: str, docs: List[dict]):
+        if action == DELETE:
+            return self.client.delete_documents(documents=docs)
+        return self.client.merge_or_upload_documents(documents=docs)
+
+    def _send(self, action: str, docs: List[dict], attempt: int = 0) -> None:
+        self._count("batches")
+        try:
+            results = self._call(action, docs)
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            if status == 413 and len(docs) > 1:
+                half = len(docs) // 2
+                self._send(action, docs[:half], attempt)
+                self._send(action, docs[half:], attempt)
+                return
+            if attempt < self.max_retries:
+                self._count("retried", len(docs))
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+                self._send(action, docs, attempt + 1)
+                return
+            logger.error(f"Indexing batch of {len(docs)} failed after {attempt + 1} attempts: {e}")
+            self._count("failed", len(docs))
+            return
+
+        by_key = {doc[self.key_field]: doc for doc in docs}
+        retry: List[dict] = []
+        succeeded = 0
+        for result in results:
+            if result.succeeded:
+                succeeded += 1
+            elif result.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                retry.append(by_key[result.key])
+            else:
+                logger.error(f"Indexing {result.key} failed ({result.status_code}): {result.error_message}")
+                self._count("failed")
+
+        self._count("deleted" if action == DELETE else "sent", succeeded)
+        if retry:
+            self._count("retried", len(retry))
+            time.sleep(self.backoff_seconds * 2 ** attempt)
+            self._send(action, retry, attempt + 1)
+
+    def flush(self) -> None:
+        for action, docs in self._pending.items():
+            if docs:
+                self._pending[action] = []
+                self._submit(action, docs)
+        with self._in_flight_changed:
+            in_flight = list(self._in_flight)
+        wait(in_flight)
+
+    def close(self) -> dict:
+        self.flush()
+        self._executor.shutdown(wait=True)
+        elapsed = time.monotonic() - self._started
+        summary = dict(self.stats)
+        summary["elapsed_seconds"] = round(elapsed, 2)
+        pushed = self.stats["sent"] + self.stats["deleted"]
+        summary["docs_per_second"] = round(pushed / elapsed, 1) if elapsed else 0.0
+        return summary
+
+
+def documents_for_item(item: dict, parent_id: str, key_field: str = "id") -> List[dict]:
+    """Index documents for a cleaned item: one per chunk, or one for the whole page."""
+    metadata = item.get("metadata") or {}
+    base = {
+        "parent_id": parent_id,
+        "url": metadata.get("url"),
+        "title": metadata.get("title"),
+    }
+    chunks: Optional[list] = item.get("chunks")
+    if not chunks:
+        return [dict(base, **{key_field: parent_id}, heading="", content=item.get("content") or "",
+                     content_hash=metadata.get("content_hash"))]
+    return [
+        dict(base, **{key_field: chunk["chunk_id"]}, heading=chunk["heading"], content=chunk["content"],
+             content_hash=chunk["content_hash"])
+        for chunk in chunks
+    ]
@@ -3,3 +3,4 @@ import scrapy
 class PageItem(scrapy.Item):
     metadata = scrapy.Field()
     content = scrapy.Field()
+    chunks = scrapy.Field()
@@ -0,0 +1,135 @@
+import bisect
+import time
+import weakref
+from contextlib import contextmanager, nullcontext
+
+# Bucket upper bounds in seconds: 0.1ms .. ~100s, 4 buckets per decade
+_BOUNDS = [10 ** (e / 4) for e in range(-16, 9)]
+
+
+class Histogram:
+    """Fixed log-spaced buckets: O(log buckets) per observation, constant memory."""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile (capped at max)."""
+        if not self.count:
+            return 0.0
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(_BOUNDS[i] if i < len(_BOUNDS) else self.max, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "total": round(self.total, 4),
+            "mean": round(self.total / self.count, 6),
+            "min": round(self.min, 6),
+            "p50": round(self.percentile(0.5), 6),
+            "p90": round(self.percentile(0.9), 6),
+            "p99": round(self.percentile(0.99), 6),
+            "max": round(self.max, 6),
+        }
+
+
+class Gauge:
+    """Sampled level (e.g. queue depth): last, mean and max over the samples."""
+
+    __slots__ = ("samples", "total", "max", "last")
+
+    def __init__(self):
+        self.samples = 0
+        self.total = 0
+        self.max = 0
+        self.last = 0
+
+    def observe(self, value) -> None:
+        self.samples += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"samples": 0}
+        return {
+            "samples": self.samples,
+            "mean": round(self.total / self.samples, 2),
+            "max": self.max,
+            "last": self.last,
+        }
+
+
+class MetricsRecorder:
+    """Per-crawl stage timings, counters and gauges shared by pipelines and extensions."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def observe(self, name: str, value: float) -> None:
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram()
+        hist.observe(value)
+
+    def inc(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+
+class NullRecorder:
+    """Used by pipelines built outside a crawler (e.g. direct instantiation)."""
+
+    def observe(self, name, value):
+        pass
+
+    def inc(self, name, n=1):
+        pass
+
+    def time(self, stage):
+        return nullcontext()
+
+
+NULL_RECORDER = NullRecorder()
+_recorders = weakref.WeakKeyDictionary()
+
+
+def get_recorder(crawler) -> MetricsRecorder:
+    """The recorder of a crawler, created on first use."""
+    recorder = _recorders.get(crawler)
+    if recorder is None:
+        recorder = _recorders[crawler] = MetricsRecorder()
+    return recorder
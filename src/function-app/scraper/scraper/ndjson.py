@@ -0,0 +1,120 @@
+import gzip
+import io
+import json
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def _open_write(path: Path, compression: Optional[str], buffer_size: int):
+    if compression == "gzip":
+        return gzip.open(path, "at", encoding="utf-8", compresslevel=6)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression requested but the 'zstandard' package is not installed")
+        raw = open(path, "ab", buffering=buffer_size)
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=3).stream_writer(raw), encoding="utf-8")
+    return open(path, "a", encoding="utf-8", buffering=buffer_size)
+
+
+def _open_read(path: Path):
+    if path.name.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.name.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"Cannot read {path}: the 'zstandard' package is not installed")
+        raw = open(path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True),
+                                encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+class NDJSONWriter:
+    """
+    Single buffered handle over an NDJSON stream, optionally gzip/zstd compressed.
+
+    With max_bytes > 0 files are rotated once they hold max_bytes of
+    (uncompressed) data: {stem}-0000.ndjson, {stem}-0001.ndjson, ...
+    numbered after the files already in the directory. Without rotation
+    records are appended to {stem}.ndjson.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        stem: str,
+        max_bytes: int = 0,
+        compression: Optional[str] = None,
+        buffer_size: int = 1 << 20,
+    ):
+        if compression not in SUFFIXES:
+            raise ValueError(f"Unknown compression {compression!r}; use one of {list(SUFFIXES)}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.stem = stem
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.suffix = ".ndjson" + SUFFIXES[compression]
+
+        self._file = None
+        self._written = 0
+        self._index = self._next_index() if max_bytes else None
+        self.path: Optional[Path] = None
+
+    def _next_index(self) -> int:
+        indexes = []
+        for path in self.directory.glob(f"{self.stem}-*.ndjson*"):
+            number = path.name[len(self.stem) + 1:].split(".", 1)[0]
+            if number.isdigit():
+                indexes.append(int(number))
+        return max(indexes, default=-1) + 1
+
+    def _open(self) -> None:
+        if self._index is None:
+            self.path = self.directory / f"{self.stem}{self.suffix}"
+        else:
+            self.path = self.directory / f"{self.stem}-{self._index:04d}{self.suffix}"
+            self._index += 1
+        self._file = _open_write(self.path, self.compression, self.buffer_size)
+        self._written = 0
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        # Rotation counts encoded bytes: accented text takes more than one byte per character
+        size = len(line.encode("utf-8"))
+        if self._file is None:
+            self._open()
+        elif self.max_bytes and self._written + size > self.max_bytes and self._written:
+            self._file.close()
+            self._open()
+        self._file.write(line)
+        self._written += size
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def corpus_files(source: Path, stem: str = "raw") -> list:
+    """NDJSON files of a corpus: a single file, or {stem}*.ndjson* in a directory (in write order)."""
+    source = Path(source)
+    if source.is_file():
+        return [source]
+    return sorted(source.glob(f"{stem}*.ndjson*"))
+
+
+def iter_records(paths: Iterable[Path]) -> Iterator[dict]:
+    for path in paths:
+        with _open_read(Path(path)) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
@@ -4,57 +4,190 @@ from pathlib import Path
 import re
 from markdownify import markdownify as md
 from bs4 import BeautifulSoup
-from scrapy.exceptions import DropItem
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from twisted.internet.threads import deferToThread
 from typing import Optional
 import hashlib
 import os
 
+from .chunking import chunk_markdown
+from .dedup import NearDuplicateIndex
+from .indexing import BatchIndexer, documents_for_item
+from .metrics import NULL_RECORDER, get_recorder
+from .ndjson import NDJSONWriter
+
 try:
     from azure.storage.blob import BlobServiceClient, ContentSettings
-    from azure.core.exceptions import ResourceNotFoundError
     from azure.identity import DefaultAzureCredential
 except Exception:
     BlobServiceClient = None
     ContentSettings = None
     DefaultAzureCredential = None
 
+try:
+    from azure.search.documents import SearchClient
+    from azure.core.credentials import AzureKeyCredential
+except Exception:
+    SearchClient = None
+    AzureKeyCredential = None
+
+
+def create_blob_service(conn_str: Optional[str] = None, account_url: Optional[str] = None):
+    """
+    BlobServiceClient from an account URL (Managed Identity / DefaultAzureCredential)
+    or a connection string (Azurite/local dev). None if neither is usable.
+    """
+    if BlobServiceClient is None:
+        return None
+    if account_url and DefaultAzureCredential is not None:
+        # Managed Identity / Azure CLI / VS Code signed-in via DefaultAzureCredential
+        return BlobServiceClient(account_url=account_url, credential=DefaultAzureCredential())
+    if conn_str:
+        # Local dev/Azurite path
+        return BlobServiceClient.from_connection_string(conn_str)
+    return None
+
 
 class StreamingPipeline:
     """
     Write each scraped page immediately as NDJSON (streaming).
     Used for LOCAL TESTING / DEBUGGING.
+
+    With emit_chunks, writes one line per chunk (from ChunkingPipeline) to
+    chunks.ndjson instead, with the page metadata plus chunk_id/heading/content_hash.
+
+    Keeps one buffered handle open for the whole crawl; files are rotated
+    every STREAMING_MAX_BYTES and optionally compressed
+    (STREAMING_COMPRESSION = "gzip" or "zstd").
     """
 
-    def __init__(self, output_path: str | None = None):
+    stem = "pages"
+
+    def __init__(
+        self,
+        output_path: str | None = None,
+        emit_chunks: bool = False,
+        max_bytes: int = 0,
+        compression: str | None = None,
+    ):
         self.output_dir = Path(output_path) if output_path else Path(Path.cwd(), "output")
         self.output_dir.mkdir(exist_ok=True, parents=True)
-        self.out_file = self.output_dir / "pages.ndjson"
+        self.emit_chunks = emit_chunks
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.writer = None
 
     @classmethod
     def from_crawler(cls, crawler):
         # could allow override via setting OUTPUT_DIR
         output_path = crawler.settings.get("SCRAPED_OUTPUT_DIR")
-        return cls(output_path)
+        emit_chunks = crawler.settings.getbool("STREAMING_EMIT_CHUNKS", False)
+        return cls(
+            output_path,
+            emit_chunks=emit_chunks,
+            max_bytes=crawler.settings.getint("STREAMING_MAX_BYTES", 0),
+            compression=crawler.settings.get("STREAMING_COMPRESSION") or None,
+        )
+
+    def open_spider(self, spider):
+        stem = "chunks" if self.emit_chunks else self.stem
+        self.writer = NDJSONWriter(self.output_dir, stem, max_bytes=self.max_bytes, compression=self.compression)
+
+    def close_spider(self, spider):
+        if self.writer is not None:
+            self.writer.close()
+
+    def records(self, item):
+        page = dict(item)
+        chunks = page.pop("chunks", None)
+        if not self.emit_chunks or not chunks:
+            yield page
+            return
+        for chunk in chunks:
+            metadata = dict(page.get("metadata") or {})
+            metadata["page_content_hash"] = metadata.pop("content_hash", None)
+            metadata.update({k: v for k, v in chunk.items() if k != "content"})
+            yield {"metadata": metadata, "content": chunk["content"]}
 
     def process_item(self, item, spider):
-        with self.out_file.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(dict(item), ensure_ascii=False) + "\n")
+        for record in self.records(item):
+            self.writer.write(record)
         spider.logger.info(f"Stored: {item.get('metadata')['url']}")
         return item
+
+
+class RawCorpusPipeline(StreamingPipeline):
+    """
+    Save the raw (HTML) pages before CleaningPipeline touches them, as
+    raw*.ndjson in SCRAPED_OUTPUT_DIR, so the corpus can be replayed
+    offline through the cleaning/chunking stages (`scrapy crawl replay`).
+    """
+
+    stem = "raw"
+
+    def __init__(self, *args, **kwargs):
+        kwargs["emit_chunks"] = False
+        super().__init__(*args, **kwargs)
+
+    def process_item(self, item, spider):
+        self.writer.write(dict(item))
+        return item
     
+class DuplicatePage(DropItem):
+    """
+    A page dropped as a (near-)duplicate of another URL kept in this crawl.
+
+    Its blobs and index documents from earlier crawls are deleted, like those
+    of gone (404/410) pages: AzureBlobPipeline and SearchIndexPipeline listen
+    for it on the item_dropped signal.
+    """
+
+
 class CleaningPipeline:
     """
     Performs HTML to markdown, hash calculation, deduplication.
+
+    Exact duplicates are caught by content hash; near-duplicates (same page
+    rendered for another year/channel, staff page variants, ...) by MinHash
+    with LSH banding, confirmed with the exact shingle similarity. Dropped near-duplicates are mapped to the URL of the
+    first page kept with that content in `near_duplicates`. Both are dropped
+    with DuplicatePage when the kept page has another URL.
     """
 
-    def __init__(self, content_min_length: int = 100):
-        self.seen_hashes = set()
+    metrics = NULL_RECORDER
+
+    def __init__(
+        self,
+        content_min_length: int = 100,
+        near_duplicate_threshold: Optional[float] = 0.9,
+        near_duplicate_num_perm: int = 128,
+    ):
+        self.seen_hashes = {}  # content hash -> url kept with it
         self.content_min_length = content_min_length
+        self.near_index = (
+            NearDuplicateIndex(threshold=near_duplicate_threshold, num_perm=near_duplicate_num_perm)
+            if near_duplicate_threshold
+            else None
+        )
+        self.near_duplicates = {}  # dropped url -> canonical url
+        self.kept_chars = 0
+        self.dropped_chars = 0
 
     @classmethod
     def from_crawler(cls, crawler):
         content_min_length = int(crawler.settings.get("CONTENT_MIN_LENGTH", 100))
-        return cls(content_min_length=content_min_length)
+        threshold = None
+        if crawler.settings.getbool("NEAR_DUPLICATE_ENABLED", True):
+            threshold = crawler.settings.getfloat("NEAR_DUPLICATE_THRESHOLD", 0.9)
+        num_perm = crawler.settings.getint("NEAR_DUPLICATE_NUM_PERM", 128)
+        pipeline = cls(
+            content_min_length=content_min_length,
+            near_duplicate_threshold=threshold,
+            near_duplicate_num_perm=num_perm,
+        )
+        pipeline.metrics = get_recorder(crawler)
+        return pipeline
 
     def convert_html_to_markdown(self, item, logger):
 
@@ -94,7 +227,8 @@ class CleaningPipeline:
 
     def process_item(self, item, spider):
         
-        self.convert_html_to_markdown(item, spider.logger) # spider used for logging
+        with self.metrics.time("clean.html_to_markdown"):
+            self.convert_html_to_markdown(item, spider.logger) # spider used for logging
 
         # Basic filtering
         if item['metadata'].get("page_type") == "unknown":
@@ -121,20 +255,133 @@ class CleaningPipeline:
         #         item['content'] = f" {item['metadata'].get('title')} PAGINA PERSONALE - CONTENUTO NON DISPONIBILE"
         
         # Calculate hash
-        hash_value = self.calculate_hash(item['content'])
+        with self.metrics.time("clean.hash"):
+            hash_value = self.calculate_hash(item['content'])
 
         # Deduplicate
         if hash_value in self.seen_hashes:
             spider.logger.info(f"Duplicate content found, skipping URL: {item['metadata']['url']}")
+            self.dropped_chars += len(item['content'])
+            if self.seen_hashes[hash_value] != url:
+                raise DuplicatePage(f"Duplicate item found")
             raise DropItem(f"Duplicate item found")
-        
-        self.seen_hashes.add(hash_value)
+
+        if self.near_index is not None:
+            with self.metrics.time("clean.near_duplicate"):
+                shingles = self.near_index.shingle_hashes(item['content'])
+                signature = self.near_index.signature(item['content'], shingles)
+                match = self.near_index.query(signature, shingles)
+            if match is not None:
+                canonical, score = match
+                self.dropped_chars += len(item['content'])
+                spider.logger.info(f"Near-duplicate ({score:.2f}) of {canonical}, skipping URL: {url}")
+                if canonical == url:
+                    raise DropItem(f"Near-duplicate of {canonical}")
+                self.near_duplicates[url] = canonical
+                raise DuplicatePage(f"Near-duplicate of {canonical}")
+            self.near_index.add(url, signature, shingles)
+
+        self.seen_hashes[hash_value] = url
+        self.kept_chars += len(item['content'])
         item['metadata']['content_hash'] = hash_value
         return item
+
+    def close_spider(self, spider):
+        total_chars = self.kept_chars + self.dropped_chars
+        if not total_chars:
+            return
+        reduction = 100.0 * self.dropped_chars / total_chars
+        spider.logger.info(
+            f"Deduplication: kept {len(self.seen_hashes)} pages, "
+            f"dropped {len(self.near_duplicates)} near-duplicates; "
+            f"indexed content reduced by {reduction:.1f}% ({self.dropped_chars}/{total_chars} chars)"
+        )
+        stats = getattr(getattr(spider, "crawler", None), "stats", None)
+        if stats is not None:
+            stats.set_value("dedup/near_duplicates", len(self.near_duplicates))
+            stats.set_value("dedup/dropped_chars", self.dropped_chars)
+            stats.set_value("dedup/kept_chars", self.kept_chars)
     
+class ChunkingPipeline:
+    """
+    Split the cleaned markdown on headings into overlapping, size-bounded chunks.
+
+    Each chunk gets a stable chunk_id and its own content_hash (see
+    chunking.chunk_markdown), stored in item['chunks'] so that later stages
+    only upload/reindex the chunks that changed.
+
+    Disabled unless CHUNKING_ENABLED: chunk blobs replace the page blobs the
+    search indexer reads (see the index changes listed in settings.py).
+    """
+
+    metrics = NULL_RECORDER
+
+    def __init__(self, max_chars: int = 2000, overlap_chars: int = 200, min_chars: int = 200):
+        self.max_chars = max_chars
+        self.overlap_chars = overlap_chars
+        self.min_chars = min_chars
+        self.chunk_sizes = []
+        self.pages = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("CHUNKING_ENABLED", False):
+            raise NotConfigured
+        pipeline = cls(
+            max_chars=crawler.settings.getint("CHUNK_MAX_CHARS", 2000),
+            overlap_chars=crawler.settings.getint("CHUNK_OVERLAP_CHARS", 200),
+            min_chars=crawler.settings.getint("CHUNK_MIN_CHARS", 200),
+        )
+        pipeline.metrics = get_recorder(crawler)
+        return pipeline
+
+    def process_item(self, item, spider):
+        metadata = item['metadata']
+        with self.metrics.time("chunk.split"):
+            item['chunks'] = chunk_markdown(
+                metadata['url'],
+                metadata.get('title') or "",
+                item['content'],
+                max_chars=self.max_chars,
+                overlap_chars=self.overlap_chars,
+                min_chars=self.min_chars,
+            )
+        self.pages += 1
+        self.chunk_sizes.extend(len(c['content']) for c in item['chunks'])
+        return item
+
+    def close_spider(self, spider):
+        if not self.chunk_sizes:
+            return
+        sizes = sorted(self.chunk_sizes)
+
+        def pct(p):
+            return sizes[min(len(sizes) - 1, int(p * len(sizes)))]
+
+        summary = {
+            "pages": self.pages,
+            "chunks": len(sizes),
+            "chunks_per_page": round(len(sizes) / self.pages, 2),
+            "size_min": sizes[0],
+            "size_p50": pct(0.5),
+            "size_p90": pct(0.9),
+            "size_max": sizes[-1],
+        }
+        spider.logger.info(f"Chunking stats: {summary}")
+        stats = getattr(getattr(spider, "crawler", None), "stats", None)
+        if stats is not None:
+            for key, value in summary.items():
+                stats.set_value(f"chunking/{key}", value)
+
+
 class AzureBlobPipeline:
     """
-    Upload each scraped item to Azure Blob Storage as {sha1(url)}.md.
+    Upload each scraped item to Azure Blob Storage as {sha1(url)}.md, or, for
+    items chunked by ChunkingPipeline, each chunk as {sha1(url)}/{chunk_id}.md
+    (only changed chunks are uploaded, chunks no longer produced are deleted).
+    Blobs of the other layout (the page blob of a chunked page, the chunks of
+    an unchunked one) are deleted, so the indexer never sees both, and so are
+    the blobs of pages dropped as duplicates (DuplicatePage).
     Supports two auth modes:
       1) Connection string (e.g., Azurite/local dev)
       2) Managed Identity/Entra ID via DefaultAzureCredential + account URL
@@ -144,6 +391,8 @@ class AzureBlobPipeline:
       - AZURE_STORAGE_ACCOUNT_URL (e.g., https://<account>.blob.core.windows.net)
       - AZURE_BLOB_CONTAINER (default: 'pages')
     """
+    metrics = NULL_RECORDER
+
     def __init__(
         self,
         conn_str: Optional[str] = None,
@@ -155,22 +404,10 @@ class AzureBlobPipeline:
         self.account_url = account_url or os.getenv("AZURE_STORAGE_ACCOUNT_URL")
         self.container_name = container or os.getenv("AZURE_BLOB_CONTAINER", "pages")
 
-        # Determine if SDKs are available
-        if BlobServiceClient is None:
-            self.enabled = False
-            return
-
         # Initialize client using either connection string or DefaultAzureCredential
-        self.service = None
-        if self.account_url and DefaultAzureCredential is not None:
-            # Managed Identity / Azure CLI / VS Code signed-in via DefaultAzureCredential
-            cred = DefaultAzureCredential()
-            self.service = BlobServiceClient(account_url=self.account_url, credential=cred)
-        elif self.conn_str:
-            # Local dev/Azurite path
-            self.service = BlobServiceClient.from_connection_string(self.conn_str)
-        else:
-            # Not enough information to initialize
+        self.service = create_blob_service(self.conn_str, self.account_url)
+        if self.service is None:
+            # SDK missing or not enough information to initialize
             self.enabled = False
             return
 
@@ -195,7 +432,22 @@ class AzureBlobPipeline:
             crawler.settings.get("AZURE_STORAGE_ACCOUNT_URL")
             or os.getenv("AZURE_STORAGE_ACCOUNT_URL")
         )
-        return cls(conn_str=conn_str, container=container, account_url=account_url)
+        pipeline = cls(conn_str=conn_str, container=container, account_url=account_url)
+        pipeline.metrics = get_recorder(crawler)
+        crawler.signals.connect(pipeline.item_dropped, signal=signals.item_dropped)
+        return pipeline
+
+    def item_dropped(self, item, response, exception, spider):
+        """Delete the blobs a duplicate page left from earlier crawls."""
+        if not self.enabled or not isinstance(exception, DuplicatePage):
+            return
+        url = (item.get("metadata") or {}).get("url")
+        if not url:
+            return
+        remote = self.list_page_blobs(hashlib.sha1(url.encode('utf-8')).hexdigest(), url, spider)
+        if remote:
+            spider.logger.info(f"Deleting {len(remote)} blobs of duplicate page {url}")
+            self.delete_stale(remote, url, spider)
     
     def sanitize(self, val):
         if isinstance(val, str):
@@ -204,6 +456,17 @@ class AzureBlobPipeline:
             return re.sub(r'[^\x20-\x7E]', '_', val)
         return str(val)
 
+    def upload(self, blob_client, content: str, metadata: dict):
+        data = content.encode("utf-8")
+        with self.metrics.time("blob.upload"):
+            blob_client.upload_blob(
+                data,
+                overwrite=True,
+                metadata=metadata,
+                content_settings=ContentSettings(content_type="text/markdown; charset=utf-8"),
+            )
+        self.metrics.inc("bytes_uploaded", len(data))
+
     def process_item(self, item, spider):
         """Upload item to Azure Blob Storage, if changed."""
 
@@ -218,38 +481,241 @@ class AzureBlobPipeline:
             spider.logger.warning("Item missing 'url' metadata; skipping.")
             return item
 
-        new_hash = metadata.get("content_hash")
-        blob_name = f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.md"
-        blob_client = self.container.get_blob_client(blob_name)
+        page_id = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        remote = self.list_page_blobs(page_id, url, spider)
+        if remote is None:
+            return item
+        if item.get("chunks"):
+            self.upload_chunks(item["chunks"], metadata, page_id, remote, url, spider)
+        else:
+            self.upload_page(content, metadata, page_id, remote, url, spider)
+        return item
 
+    def list_page_blobs(self, page_id: str, url: str, spider) -> Optional[dict]:
+        """
+        Name -> content_hash of every blob of one page, in one listing call:
+        the page blob {page_id}.md and the chunk blobs {page_id}/*.md, so that
+        switching chunking on or off leaves no blob of the other layout behind.
+        """
         try:
-            props = blob_client.get_blob_properties() # raises if not exists
-            remote_hash = (props.metadata or {}).get("content_hash")
-            if remote_hash == new_hash:
-                spider.logger.info(f"Skipping (unchanged): {url}")
-                return item
+            with self.metrics.time("blob.list"):
+                return {
+                    blob.name: (blob.metadata or {}).get("content_hash")
+                    for blob in self.container.list_blobs(name_starts_with=page_id, include=["metadata"])
+                }
+        except Exception as e:
+            spider.logger.error(f"Error listing blobs for {url}: {e}")
+            return None
 
-            spider.logger.info(f"Content changed: {url}; updating.")
-            blob_client.upload_blob(
-                content,
-                overwrite=True,
-                metadata=metadata,
-                content_settings=ContentSettings(content_type="text/markdown; charset=utf-8"),
-                #if_match=props.etag,  # optimistic concurrency
-            )
-        except ResourceNotFoundError:
-            spider.logger.info(f"Uploading new blob: {url}")
-            blob_client.upload_blob(
-                content,
-                overwrite=True,
-                metadata=metadata,
-                content_settings=ContentSettings(content_type="text/markdown; charset=utf-8"),
-            )
+    def delete_stale(self, remote: dict, url: str, spider):
+        for blob_name in remote:
+            try:
+                with self.metrics.time("blob.delete"):
+                    self.container.delete_blob(blob_name)
+            except Exception as e:
+                spider.logger.error(f"Error deleting stale blob {blob_name} for {url}: {e}")
+
+    def upload_page(self, content, metadata, page_id, remote, url, spider):
+        blob_name = f"{page_id}.md"
+        existed = blob_name in remote
+        if existed and remote.pop(blob_name) == metadata.get("content_hash"):
+            spider.logger.info(f"Skipping (unchanged): {url}")
+        else:
+            spider.logger.info(f"Content changed: {url}; updating." if existed else f"Uploading new blob: {url}")
+            try:
+                self.upload(self.container.get_blob_client(blob_name), content, metadata)
+            except Exception as e:
+                spider.logger.error(f"Error uploading blob for {url}: {e}")
+                return
+        # Chunk blobs left by a crawl with ChunkingPipeline enabled
+        self.delete_stale(remote, url, spider)
+
+    def upload_chunks(self, chunks, metadata, page_id, remote, url, spider):
+        """Sync the chunk blobs of one page from its blob listing: only the diff is sent."""
+        uploaded = 0
+        for chunk in chunks:
+            blob_name = f"{page_id}/{chunk['chunk_id']}.md"
+            if remote.pop(blob_name, None) == chunk["content_hash"]:
+                continue
+            chunk_metadata = dict(metadata)
+            chunk_metadata.update({
+                "page_content_hash": metadata.get("content_hash", ""),
+                "content_hash": chunk["content_hash"],
+                "chunk_id": chunk["chunk_id"],
+                "chunk_ordinal": str(chunk["ordinal"]),
+                "heading": self.sanitize(chunk["heading"]),
+            })
+            try:
+                self.upload(self.container.get_blob_client(blob_name), chunk["content"], chunk_metadata)
+                uploaded += 1
+            except Exception as e:
+                spider.logger.error(f"Error uploading chunk {blob_name} for {url}: {e}")
+
+        # Whatever is left in `remote` is no longer produced by the page:
+        # stale chunks, and the whole-page blob of a crawl without chunking
+        self.delete_stale(remote, url, spider)
+
+        if uploaded or remote:
+            spider.logger.info(f"Chunks for {url}: {uploaded} uploaded, {len(remote)} deleted, "
+                               f"{len(chunks) - uploaded} unchanged")
+        else:
+            spider.logger.info(f"Skipping (unchanged): {url}")
+
+
+class SearchIndexPipeline:
+    """
+    Push new, changed and deleted documents straight to Azure AI Search,
+    instead of waiting for the blob indexer to rescan the container.
+
+    One document per chunk (or per page when ChunkingPipeline is disabled).
+    The content_hash already in the index is read once at open; unchanged
+    documents are never sent. Chunks a page no longer produces are deleted
+    right away. With SEARCH_INDEX_DELETE_MISSING, the documents of pages
+    confirmed gone (404/410 when fetched in this run) are deleted at close;
+    a page merely not reached (budget, timeout, resumed or sharded crawl,
+    transient error) is never deleted. The documents of pages dropped as
+    duplicates (DuplicatePage) are deleted the same way, always.
+    Batches are sent by worker threads; when they fall behind, process_item
+    returns a Deferred that waits for them in a thread, off the reactor.
+
+    Env/config:
+      - SEARCH_INDEX_ENDPOINT / SEARCH_INDEX_NAME (stage disabled if unset)
+      - SEARCH_INDEX_API_KEY (admin key), else DefaultAzureCredential
+      - SEARCH_INDEX_KEY_FIELD, SEARCH_INDEX_BATCH_SIZE, SEARCH_INDEX_MAX_CONCURRENCY,
+        SEARCH_INDEX_MAX_RETRIES
+    The index needs the fields: key, parent_id, url, title, heading, content, content_hash.
+    """
+
+    metrics = NULL_RECORDER
+
+    def __init__(
+        self,
+        endpoint: Optional[str] = None,
+        index_name: Optional[str] = None,
+        api_key: Optional[str] = None,
+        key_field: str = "id",
+        batch_size: int = 500,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        delete_missing: bool = False,
+    ):
+        self.key_field = key_field
+        self.delete_missing = delete_missing
+        self.gone_urls = set()
+        self.duplicate_urls = set()
+        self.indexer = None
+        if SearchClient is None or not endpoint or not index_name:
+            self.enabled = False
+            return
+
+        if api_key:
+            credential = AzureKeyCredential(api_key)
+        elif DefaultAzureCredential is not None:
+            credential = DefaultAzureCredential()
+        else:
+            self.enabled = False
+            return
+
+        client = SearchClient(endpoint=endpoint, index_name=index_name, credential=credential)
+        self.indexer = BatchIndexer(
+            client,
+            key_field=key_field,
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+            max_retries=max_retries,
+        )
+        self.index_name = index_name
+        self.enabled = True
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            endpoint=settings.get("SEARCH_INDEX_ENDPOINT") or os.getenv("SEARCH_INDEX_ENDPOINT"),
+            index_name=settings.get("SEARCH_INDEX_NAME") or os.getenv("SEARCH_INDEX_NAME"),
+            api_key=settings.get("SEARCH_INDEX_API_KEY") or os.getenv("SEARCH_INDEX_API_KEY"),
+            key_field=settings.get("SEARCH_INDEX_KEY_FIELD", "id"),
+            batch_size=settings.getint("SEARCH_INDEX_BATCH_SIZE", 500),
+            max_concurrency=settings.getint("SEARCH_INDEX_MAX_CONCURRENCY", 4),
+            max_retries=settings.getint("SEARCH_INDEX_MAX_RETRIES", 3),
+            delete_missing=settings.getbool("SEARCH_INDEX_DELETE_MISSING", False),
+        )
+        pipeline.metrics = get_recorder(crawler)
+        # Flushed on spider_closed rather than close_spider: only the signal carries the close reason
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(pipeline.item_dropped, signal=signals.item_dropped)
+        if pipeline.delete_missing:
+            # 404/410 never reach the spider callbacks (HttpErrorMiddleware); the engine signal sees them
+            crawler.signals.connect(pipeline.response_received, signal=signals.response_received)
+        return pipeline
+
+    def response_received(self, response, request, spider):
+        if response.status in (404, 410):
+            self.gone_urls.add(request.url)
+
+    def item_dropped(self, item, response, exception, spider):
+        url = (item.get("metadata") or {}).get("url")
+        if isinstance(exception, DuplicatePage) and url:
+            self.duplicate_urls.add(url)
+
+    def open_spider(self, spider):
+        if not self.enabled:
+            return
+        try:
+            count = self.indexer.load_existing()
+            spider.logger.info(f"Search index '{self.index_name}': {count} documents already indexed")
         except Exception as e:
-            spider.logger.error(f"Error uploading blob for {url}: {e}")
+            # Without the current hashes every document is pushed; still correct, just slower
+            spider.logger.error(f"Could not read current index state: {e}")
 
+    def process_item(self, item, spider):
+        if not self.enabled:
+            return item
+        url = item['metadata'].get('url')
+        if not url:
+            return item
+
+        parent_id = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        docs = documents_for_item(item, parent_id, key_field=self.key_field)
+        with self.metrics.time("index.queue"):
+            for doc in docs:
+                self.indexer.add(doc)
+            for key in self.indexer.stale_keys(parent_id, {doc[self.key_field] for doc in docs}):
+                self.indexer.delete(key)
+        if self.indexer.backlogged():
+            # Batches in flight fall behind: wait for them in a thread, not on the reactor
+            return deferToThread(self.indexer.wait_for_capacity).addCallback(lambda _: item)
         return item
 
+    def spider_closed(self, spider, reason):
+        if not self.enabled:
+            return None
+        self.delete_gone(spider)
+        # The final flush waits for every batch: in a thread, the signal waits for the Deferred
+        return deferToThread(self.indexer.close).addCallback(self.log_summary, spider)
+
+    def delete_gone(self, spider):
+        """Delete the documents of pages that answered 404/410 or were dropped as duplicates in this run."""
+        if not self.gone_urls and not self.duplicate_urls:
+            return
+        canonicalize = getattr(spider, "canonicalize", lambda url: url)
+        gone = {canonicalize(url) for url in self.gone_urls | self.duplicate_urls}
+        deleted = 0
+        for key, fields in self.indexer.existing.items():
+            if fields.get("url") and canonicalize(fields["url"]) in gone:
+                self.indexer.delete(key)
+                deleted += 1
+        spider.logger.info(f"Search index: {len(self.gone_urls)} pages gone (404/410), "
+                           f"{len(self.duplicate_urls)} dropped as duplicates, {deleted} documents deleted")
+
+    def log_summary(self, summary, spider):
+        spider.logger.info(f"Search index push: {summary}")
+        stats = getattr(getattr(spider, "crawler", None), "stats", None)
+        if stats is not None:
+            for key, value in summary.items():
+                stats.set_value(f"search_index/{key}", value)
+            stats.set_value("search_index/gone_urls", len(self.gone_urls))
+
 
 class NoOpPipeline:
     """Simple No-Op pipeline."""
@@ -6,9 +6,30 @@ NEWSPIDER_MODULE = "scraper.spiders"
 ROBOTSTXT_OBEY = True
 
 CONTENT_MIN_LENGTH = 200
+
+# Near-duplicate detection (MinHash + LSH) in CleaningPipeline
+NEAR_DUPLICATE_ENABLED = True
+NEAR_DUPLICATE_THRESHOLD = 0.9  # Jaccard similarity of word 5-gram shingles
+NEAR_DUPLICATE_NUM_PERM = 128
 CONCURRENT_REQUESTS = 4
 DOWNLOAD_DELAY = 0
 
+# Full-site crawl (dmi_frontier spider); 0 disables a budget
+FRONTIER_PAGE_BUDGET = 0
+FRONTIER_TIME_BUDGET = 3 * 60 * 60  # seconds, keep below the Function timeout
+FRONTIER_MAX_CONCURRENCY = 16
+FRONTIER_TARGET_CONCURRENCY = 4.0  # AutoThrottle target, adapts to response latency
+FRONTIER_START_DELAY = 0.5
+FRONTIER_MAX_DELAY = 10.0
+FRONTIER_CHANGE_PRIORITY = 10  # priority boost for pages that always changed in past runs
+FRONTIER_HISTORY_PATH = None  # default: <SCRAPED_OUTPUT_DIR or ./output>/frontier_history.json
+FRONTIER_SEED_HISTORY = True  # also request the pages crawled in past runs (finds removed pages)
+FRONTIER_HISTORY_SAVE_INTERVAL = 60  # seconds between history saves during the crawl; 0 = only on close
+
+# URL canonicalization (scraper.urls.canonicalize_url): drop the trailing slash of
+# followed links. Off until the site is known not to redirect between the two forms.
+URL_STRIP_TRAILING_SLASH = False
+
 COOKIES_ENABLED = False
 TELNETCONSOLE_ENABLED = False
 
@@ -18,10 +39,55 @@ DEFAULT_REQUEST_HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; ScrapyBot/1.0; +https://www.web.dmi.unict.it)"
 }
 
+# Heading-aware chunking (ChunkingPipeline), off by default. Enabling it
+# changes the blob layout the search indexer reads: on the next crawl every
+# {sha1(url)}.md page blob is replaced by {sha1(url)}/{chunk_id}.md chunk
+# blobs (metadata: url, title, heading, chunk_id, chunk_ordinal, content_hash).
+# Change the index side in the same release, before the first chunked crawl:
+#   - skillset: drop the SplitSkill and its index projection, so each blob is
+#     indexed as one document (blob content -> the `chunk` field the backend
+#     reads, blob metadata -> url/title/heading), instead of being chunked again
+#   - indexer: enable deletion detection (native blob soft delete), so the
+#     documents of the deleted page blobs leave the index
+#   - reset and rerun the indexer once the chunked crawl has finished: every
+#     document is rebuilt from the new blobs
+# (With SearchIndexPipeline pushing documents directly, the blob indexer can
+# be disabled instead.)
+CHUNKING_ENABLED = False
+CHUNK_MAX_CHARS = 2000
+CHUNK_OVERLAP_CHARS = 200
+CHUNK_MIN_CHARS = 200
+# StreamingPipeline: one NDJSON line per chunk instead of per page (needs CHUNKING_ENABLED)
+STREAMING_EMIT_CHUNKS = False
+# StreamingPipeline / RawCorpusPipeline output files
+STREAMING_MAX_BYTES = 64 * 1024 * 1024  # rotate after this much data; 0 = single appended file
+STREAMING_COMPRESSION = None  # None, "gzip" or "zstd" (needs the zstandard package)
+
+# Direct push to Azure AI Search (SearchIndexPipeline); disabled unless
+# SEARCH_INDEX_ENDPOINT and SEARCH_INDEX_NAME are set (here, with -s or as env vars)
+SEARCH_INDEX_KEY_FIELD = "id"
+SEARCH_INDEX_BATCH_SIZE = 500
+SEARCH_INDEX_MAX_CONCURRENCY = 4
+SEARCH_INDEX_MAX_RETRIES = 3
+SEARCH_INDEX_DELETE_MISSING = False  # delete the documents of pages that answered 404/410 in the run
+
 ITEM_PIPELINES = {
+    #"scraper.pipelines.RawCorpusPipeline": 50,  # raw HTML corpus for `scrapy crawl replay`
     "scraper.pipelines.CleaningPipeline": 100,
+    "scraper.pipelines.ChunkingPipeline": 150,  # no-op unless CHUNKING_ENABLED
     #"scraper.pipelines.StreamingPipeline": 200,
     "scraper.pipelines.AzureBlobPipeline": 300,
+    "scraper.pipelines.SearchIndexPipeline": 400,
+}
+
+# Crawl instrumentation (scraper.extensions.CrawlMetrics): JSON report per run
+METRICS_ENABLED = True
+METRICS_REPORT_DIR = None  # default: <SCRAPED_OUTPUT_DIR or ./output>/metrics
+METRICS_SAMPLE_INTERVAL = 5.0  # seconds between queue depth samples
+METRICS_BLOB_CONTAINER = None  # e.g. "crawl-metrics" to also upload the report
+
+EXTENSIONS = {
+    "scraper.extensions.CrawlMetrics": 500,
 }
 
 LOG_LEVEL = "INFO"
@@ -0,0 +1,144 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Shard states in the status files
+ACTIVE = "active"
+IDLE = "idle"
+CLOSED = "closed"
+
+
+def status_path(directory: Path, shard: int) -> Path:
+    return Path(directory, f"status-{shard}.json")
+
+
+def read_status(directory: Path, shard: int) -> Optional[dict]:
+    try:
+        return json.loads(status_path(directory, shard).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def write_status(directory: Path, shard: int, status: dict) -> None:
+    path = status_path(directory, shard)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(status), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def mark_closed(directory: Path, shard: int) -> None:
+    """Close a shard whose process exited without doing it (crash, kill)."""
+    status = read_status(directory, shard) or {}
+    if status.get("state") != CLOSED:
+        write_status(directory, shard, {**status, "state": CLOSED})
+
+
+class ShardExchange:
+    """
+    Hands links between the processes of a sharded crawl, through files in a
+    directory they share, so that a page only linked from pages another
+    shard owns is still crawled (by its owner).
+
+        inbox-<receiver>/from-<sender>.txt   links for receiver, one per line,
+                                             appended by sender only
+        status-<shard>.json                  state plus the number of links
+                                             sent to / received from each shard
+
+    A shard is done when every shard is idle or closed and every link sent to
+    a shard still running has been received: nobody has work left and no
+    link is in flight. Callers confirm it on two consecutive checks (see
+    settled()), since the status files are read one at a time.
+    """
+
+    def __init__(self, directory, shard: int, shards: int):
+        self.directory = Path(directory)
+        self.shard = shard
+        self.shards = shards
+        self.inbox = self.directory / f"inbox-{shard}"
+        self.inbox.mkdir(parents=True, exist_ok=True)
+        self.sent: Dict[int, int] = {}
+        self.received: Dict[int, int] = {}
+        self.state = ACTIVE
+        self._sent_urls = set()
+        self._outboxes = {}
+        self._offsets: Dict[int, int] = {}
+        self._last_snapshot = None
+        self.set_state(ACTIVE)
+
+    def send(self, owner: int, url: str) -> bool:
+        """Queue `url` for the shard that owns it; False if it was already sent."""
+        if url in self._sent_urls:
+            return False
+        self._sent_urls.add(url)
+        outbox = self._outboxes.get(owner)
+        if outbox is None:
+            inbox = self.directory / f"inbox-{owner}"
+            inbox.mkdir(parents=True, exist_ok=True)
+            outbox = self._outboxes[owner] = open(inbox / f"from-{self.shard}.txt", "a", encoding="utf-8")
+        outbox.write(url + "\n")
+        self.sent[owner] = self.sent.get(owner, 0) + 1
+        return True
+
+    def flush(self) -> None:
+        for outbox in self._outboxes.values():
+            outbox.flush()
+
+    def receive(self) -> List[str]:
+        """Links other shards sent since the last call (complete lines only)."""
+        urls = []
+        for sender in range(self.shards):
+            if sender == self.shard:
+                continue
+            path = self.inbox / f"from-{sender}.txt"
+            try:
+                with open(path, "rb") as f:
+                    f.seek(self._offsets.get(sender, 0))
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            end = data.rfind(b"\n") + 1
+            if not end:
+                continue
+            self._offsets[sender] = self._offsets.get(sender, 0) + end
+            lines = data[:end].decode("utf-8").splitlines()
+            self.received[sender] = self.received.get(sender, 0) + len(lines)
+            urls.extend(lines)
+        return urls
+
+    def set_state(self, state: str) -> None:
+        # Counted links must be on disk before a status claims them
+        self.flush()
+        self.state = state
+        write_status(self.directory, self.shard, {
+            "state": state,
+            "sent": {str(k): v for k, v in self.sent.items()},
+            "received": {str(k): v for k, v in self.received.items()},
+        })
+
+    def quiescent(self) -> Optional[tuple]:
+        """Snapshot of the shard statuses if the whole crawl looks done, else None."""
+        statuses = [read_status(self.directory, shard) for shard in range(self.shards)]
+        if any(s is None or s.get("state") not in (IDLE, CLOSED) for s in statuses):
+            return None
+        for sender, status in enumerate(statuses):
+            for receiver, count in (status.get("sent") or {}).items():
+                target = statuses[int(receiver)]
+                if target.get("state") == CLOSED:
+                    continue  # a closed shard (budget, crash) crawls nothing more
+                if (target.get("received") or {}).get(str(sender), 0) < count:
+                    return None
+        return tuple(json.dumps(s, sort_keys=True) for s in statuses)
+
+    def settled(self) -> bool:
+        """True on the second consecutive check that finds the crawl done with nothing changed."""
+        snapshot = self.quiescent()
+        settled = snapshot is not None and snapshot == self._last_snapshot
+        self._last_snapshot = snapshot
+        return settled
+
+    def close(self) -> None:
+        self.set_state(CLOSED)
+        for outbox in self._outboxes.values():
+            outbox.close()
+        self._outboxes = {}
@@ -0,0 +1,170 @@
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urljoin
+
+import scrapy
+from scrapy.utils.gz import gunzip
+from scrapy.utils.sitemap import Sitemap, sitemap_urls_from_robots
+
+from .site_spider import FINISHED_MARKER, DMISpider
+
+
+class DMIFrontierSpider(DMISpider):
+    """
+    Full-site crawl of the DMI website.
+
+    - Seeds from the sitemaps listed in robots.txt (or /sitemap.xml) and from the
+      pages crawled in past runs (FRONTIER_SEED_HISTORY) on top of start_urls, so
+      that a page removed from the site is still requested and its 404/410 seen.
+    - Prioritizes shallow pages (DEPTH_PRIORITY) and pages that changed often in
+      past runs (change history kept in FRONTIER_HISTORY_PATH, saved every
+      FRONTIER_HISTORY_SAVE_INTERVAL seconds and on close).
+    - Run with -s JOBDIR=<dir> to persist the frontier: an interrupted run resumes
+      where it stopped. Once a crawl finishes, a marker is written in JOBDIR so
+      the next run can start from scratch. A resumed run only covers part of the
+      site: it never deletes missing documents, and the Function does not
+      promote an index generation built by it.
+    - AutoThrottle adapts concurrency to the observed latency, bounded by the
+      FRONTIER_* page/time budgets.
+    """
+
+    name = "dmi_frontier"
+
+    custom_settings = {
+        'HTTPERROR_ALLOWED_CODES': [301,302,307,308],
+        # breadth-first: shallow pages are scheduled first
+        'DEPTH_PRIORITY': 1,
+        'SCHEDULER_DISK_QUEUE': 'scrapy.squeues.PickleFifoDiskQueue',
+        'SCHEDULER_MEMORY_QUEUE': 'scrapy.squeues.FifoMemoryQueue',
+        'AUTOTHROTTLE_ENABLED': True,
+    }
+
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        # Budgets and throttling bounds (FRONTIER_* in settings.py, overridable with -s)
+        settings.set('CLOSESPIDER_PAGECOUNT', settings.getint('FRONTIER_PAGE_BUDGET', 0), priority='spider')
+        settings.set('CLOSESPIDER_TIMEOUT', settings.getint('FRONTIER_TIME_BUDGET', 0), priority='spider')
+        max_concurrency = settings.getint('FRONTIER_MAX_CONCURRENCY', 16)
+        settings.set('CONCURRENT_REQUESTS', max_concurrency, priority='spider')
+        settings.set('CONCURRENT_REQUESTS_PER_DOMAIN', max_concurrency, priority='spider')
+        settings.set('AUTOTHROTTLE_TARGET_CONCURRENCY',
+                     settings.getfloat('FRONTIER_TARGET_CONCURRENCY', 4.0), priority='spider')
+        settings.set('AUTOTHROTTLE_START_DELAY', settings.getfloat('FRONTIER_START_DELAY', 0.5), priority='spider')
+        settings.set('AUTOTHROTTLE_MAX_DELAY', settings.getfloat('FRONTIER_MAX_DELAY', 10.0), priority='spider')
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        history_path = settings.get('FRONTIER_HISTORY_PATH')
+        if not history_path:
+            output_dir = settings.get('SCRAPED_OUTPUT_DIR') or Path(Path.cwd(), "output")
+            history_path = Path(output_dir, "frontier_history.json")
+        spider.history_path = Path(history_path)
+        spider.history = spider.load_history(spider.history_path)
+        spider.change_priority = settings.getint('FRONTIER_CHANGE_PRIORITY', 10)
+        spider.seed_history = settings.getbool('FRONTIER_SEED_HISTORY', True)
+        crawler.signals.connect(spider.response_received, signal=scrapy.signals.response_received)
+        # Saved periodically too: a killed Function never reaches closed()
+        spider.history_save_interval = settings.getfloat('FRONTIER_HISTORY_SAVE_INTERVAL', 60)
+        spider.history_saved_at = time.monotonic()
+        return spider
+
+    def load_history(self, path: Path) -> dict:
+        if not path.exists():
+            return {}
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            self.logger.warning(f"Could not read crawl history {path}: {e}; starting empty")
+            return {}
+
+    def save_history(self):
+        self.history_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.history_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.history), encoding="utf-8")
+        tmp.replace(self.history_path)
+        self.history_saved_at = time.monotonic()
+
+    def change_rate(self, url: str) -> float:
+        entry = self.history.get(url)
+        if not entry or not entry.get("visits"):
+            return 0.0
+        return entry.get("changes", 0) / entry["visits"]
+
+    def follow_request(self, url: str) -> scrapy.Request:
+        priority = int(self.change_priority * self.change_rate(url))
+        return scrapy.Request(url, callback=self.parse, priority=priority)
+
+    def start_requests(self):
+        for url in self.start_urls:
+            yield self.follow_request(self.canonical_url(url))
+            yield scrapy.Request(urljoin(url, "/robots.txt"), callback=self.parse_robots, dont_filter=True)
+        if self.seed_history:
+            # History keys are canonical URLs
+            for url in list(self.history):
+                if self.should_follow(url) and self.owns(url):
+                    yield self.follow_request(url)
+
+    def response_received(self, response, request, spider):
+        if response.status in (404, 410):
+            # Gone from the site: stop seeding it in the next runs
+            self.history.pop(request.url, None)
+
+    def parse_robots(self, response: scrapy.http.Response):
+        sitemap_urls = list(sitemap_urls_from_robots(response.text, base_url=response.url))
+        if not sitemap_urls:
+            sitemap_urls = [urljoin(response.url, "/sitemap.xml")]
+        for url in sitemap_urls:
+            yield scrapy.Request(url, callback=self.parse_sitemap)
+
+    def parse_sitemap(self, response: scrapy.http.Response):
+        body = response.body
+        if response.url.endswith(".gz") or body[:2] == b"\x1f\x8b":
+            body = gunzip(body)
+        try:
+            sitemap = Sitemap(body)
+        except Exception as e:
+            self.logger.warning(f"Invalid sitemap {response.url}: {e}")
+            return
+
+        if sitemap.type == "sitemapindex":
+            for entry in sitemap:
+                yield scrapy.Request(entry["loc"], callback=self.parse_sitemap)
+        elif sitemap.type == "urlset":
+            for entry in sitemap:
+                url = entry["loc"].split('#')[0]
+                # Every shard reads the sitemap: no need to hand the others their URLs
+                if self.should_follow(url):
+                    url = self.canonical_url(url)
+                    if self.owns(url):
+                        yield self.follow_request(url)
+
+    def item_scraped(self, item, response, spider):
+        """Track per-URL content changes across runs to prioritize volatile pages."""
+        super().item_scraped(item, response, spider)
+        metadata = item.get("metadata") or {}
+        new_hash = metadata.get("content_hash")
+        if not new_hash:
+            return
+        url = self.canonicalize(metadata["url"])
+        entry = self.history.setdefault(url, {"visits": 0, "changes": 0})
+        if entry.get("hash") and entry["hash"] != new_hash:
+            entry["changes"] += 1
+            entry["last_changed"] = metadata.get("timestamp") or datetime.now().isoformat()
+        entry["visits"] += 1
+        entry["hash"] = new_hash
+        if self.history_save_interval and time.monotonic() - self.history_saved_at >= self.history_save_interval:
+            self.save_history()
+
+    def closed(self, reason: str):
+        super().closed(reason)
+        self.save_history()
+        jobdir = self.settings.get("JOBDIR")
+        if jobdir and reason == "finished":
+            # Frontier exhausted: the next run must not resume from this state
+            Path(jobdir, FINISHED_MARKER).touch()
+        self.logger.info(f"Frontier crawl closed ({reason}); history for {len(self.history)} URLs saved")
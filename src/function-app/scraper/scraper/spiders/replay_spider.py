@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import scrapy
+
+from ..items import PageItem
+from ..ndjson import corpus_files, iter_records
+
+RAW_CORPUS_PIPELINE = "scraper.pipelines.RawCorpusPipeline"
+STREAMING_PIPELINE = "scraper.pipelines.StreamingPipeline"
+UPLOAD_PIPELINES = ("scraper.pipelines.AzureBlobPipeline", "scraper.pipelines.SearchIndexPipeline")
+
+
+class ReplaySpider(scrapy.Spider):
+    """
+    Offline replay of a saved raw corpus (see RawCorpusPipeline) through the
+    item pipelines, without any network request:
+
+        scrapy crawl replay -a corpus=output            # raw*.ndjson* in output/
+        scrapy crawl replay -a corpus=output/raw-0003.ndjson.gz -a limit=100
+
+    Results are written by StreamingPipeline to REPLAY_OUTPUT_DIR (default
+    output/replay). Blob/index uploads are skipped unless REPLAY_UPLOAD is set.
+    """
+
+    name = "replay"
+
+    custom_settings = {
+        'ROBOTSTXT_OBEY': False,
+    }
+
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        pipelines = dict(settings.getdict("ITEM_PIPELINES"))
+        pipelines.pop(RAW_CORPUS_PIPELINE, None)
+        if not settings.getbool("REPLAY_UPLOAD", False):
+            for name in UPLOAD_PIPELINES:
+                pipelines.pop(name, None)
+        pipelines.setdefault(STREAMING_PIPELINE, 200)
+        settings.set("ITEM_PIPELINES", pipelines, priority="spider")
+
+        output_dir = settings.get("REPLAY_OUTPUT_DIR") or Path(
+            settings.get("SCRAPED_OUTPUT_DIR") or Path(Path.cwd(), "output"), "replay"
+        )
+        settings.set("SCRAPED_OUTPUT_DIR", str(output_dir), priority="spider")
+
+    def __init__(self, corpus="output", limit=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.files = corpus_files(Path(corpus))
+        if not self.files:
+            raise ValueError(f"No raw corpus files found in {corpus}")
+        self.limit = int(limit) if limit else None
+
+    async def start(self):
+        self.logger.info(f"Replaying {len(self.files)} corpus file(s)")
+        for count, record in enumerate(iter_records(self.files)):
+            if self.limit is not None and count >= self.limit:
+                break
+            yield PageItem(metadata=record["metadata"], content=record["content"])
@@ -1,28 +1,36 @@
+import json
+import time
 from datetime import datetime
+from pathlib import Path
 from urllib.parse import urlparse
 
 import scrapy
+from scrapy.exceptions import DontCloseSpider
 from scrapy.linkextractors import LinkExtractor
 from ..items import PageItem
+from ..sharding import ACTIVE, IDLE, ShardExchange
+from ..urls import (
+    DENY_EXTENSIONS,
+    EXCLUDE_SUBSTRINGS,
+    ExtensionMatcher,
+    SubstringMatcher,
+    canonicalize_url,
+    shard_of,
+)
+
+_is_excluded = SubstringMatcher(EXCLUDE_SUBSTRINGS)
+
+# Written in JOBDIR when a crawl finishes, so that the next run starts a fresh frontier
+FINISHED_MARKER = ".finished"
+
+
+def jobdir_resumes(jobdir) -> bool:
+    """True if JOBDIR holds the frontier of an interrupted run, which this run continues."""
+    if not jobdir:
+        return False
+    seen = Path(jobdir, "requests.seen")
+    return not Path(jobdir, FINISHED_MARKER).exists() and seen.exists() and seen.stat().st_size > 0
 
-EXCLUDE_SUBSTRINGS = [
-    'admin',
-    'avvisi-docente',
-    'avvisi',
-    'archivio',
-    '?eng',
-    '/en/',
-    '&eng',
-    'bandi',
-    'courses',
-    'notizie',
-    'faculty',
-    'seuid',
-    'uid',
-    'calendario',
-    'francesco.russo',
-    'vittorio.romano'
-]
 
 class DMISpider(scrapy.Spider):
 
@@ -37,26 +45,108 @@ class DMISpider(scrapy.Spider):
         'CLOSESPIDER_PAGECOUNT': 200,
     }
 
-    # deny common non-html extensions + anything Scrapy already ignores
-    DENY_EXTENSIONS = set([
-        # archives
-        '7z', '7zip', 'bz2', 'rar', 'tar', 'tar.gz', 'xz', 'zip',
-        # images
-        'mng', 'pct', 'bmp', 'gif', 'jpg', 'jpeg', 'png', 'pst', 'psp', 'tif', 'tiff', 'ai', 'drw', 'dxf', 'eps', 'ps', 'svg', 'cdr', 'ico',
-        # audio
-        'mp3', 'wma', 'ogg', 'wav', 'ra', 'aac', 'mid', 'au', 'aiff',
-        # video
-        '3gp', 'asf', 'asx', 'avi', 'mov', 'mp4', 'mpg', 'qt', 'rm', 'swf', 'wmv', 'm4a', 'm4v', 'flv', 'webm',
-        # office suites
-        'xls', 'xlsx', 'ppt', 'pptx', 'pps', 'doc', 'docx', 'odt', 'ods', 'odg', 'odp',
-        # other
-        'css', 'pdf', 'exe', 'bin', 'rss', 'dmg', 'iso', 'apk',
-    ])
-
     link_extractor = LinkExtractor(allow_domains=allowed_domains)
+    has_denied_extension = ExtensionMatcher(DENY_EXTENSIONS)
+    # URL_STRIP_TRAILING_SLASH: only once the site is known to serve both forms without a redirect
+    strip_trailing_slash = False
+    force_https = True
+    resumed = False
+
+    # Seconds between two reads of the cross-shard inbox while the shard is busy
+    exchange_interval = 2.0
+
+    def __init__(self, *args, shard=0, shards=1, shard_by="hash", manifest=None, exchange=None, site=None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        if site:
+            # Crawl another site with the same rules, e.g. a local stand-in for tests
+            self.start_urls = [site]
+            self.allowed_domains = [urlparse(site).hostname]
+            self.force_https = urlparse(site).scheme == "https"
+            # allow_domains does not match hosts with a port; should_follow checks the host
+            self.link_extractor = LinkExtractor()
+        # Raw and canonical forms of every followed link, to count how many
+        # fetches canonicalization saved (the dupefilter only sees canonical URLs)
+        self._seen_raw_urls = set()
+        self._seen_canonical_urls = set()
+
+        # Sharded crawl (-a shard=i -a shards=N -a exchange=DIR): only fetch and
+        # emit the URLs this shard owns; links owned by another shard are handed
+        # to it through the exchange directory shared by all the shards.
+        # Start URLs are fetched by every shard for link discovery.
+        self.shard = int(shard)
+        self.shards = int(shards)
+        self.shard_by = shard_by
+        if not 0 <= self.shard < self.shards:
+            raise ValueError(f"Invalid shard {self.shard} of {self.shards}")
+        self.exchange = ShardExchange(exchange, self.shard, self.shards) if exchange and self.shards > 1 else None
+        self._exchanged_at = 0.0
+
+        # Optional JSON manifest (url -> content_hash + crawl stats) written on close
+        self.manifest_path = Path(manifest) if manifest else None
+        self.manifest_items = {}
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.strip_trailing_slash = crawler.settings.getbool("URL_STRIP_TRAILING_SLASH", False)
+        # A resumed run never re-fetches the pages crawled before the interruption:
+        # it must not treat them as gone (see SearchIndexPipeline)
+        spider.resumed = jobdir_resumes(crawler.settings.get("JOBDIR"))
+        if spider.resumed:
+            spider.logger.info(f"Resuming the interrupted crawl in {crawler.settings.get('JOBDIR')}")
+        crawler.signals.connect(spider.item_scraped, signal=scrapy.signals.item_scraped)
+        if spider.exchange is not None:
+            crawler.signals.connect(spider.spider_idle, signal=scrapy.signals.spider_idle)
+        elif spider.shards > 1:
+            spider.logger.warning("Sharded crawl without -a exchange=DIR: links owned by other shards are dropped")
+        return spider
+
+    def owner(self, url: str) -> int:
+        """Shard owning a canonical URL."""
+        return shard_of(url, self.shards, self.shard_by)
+
+    def owns(self, url: str) -> bool:
+        """Whether this shard owns a canonical URL."""
+        return self.shards <= 1 or self.owner(url) == self.shard
+
+    def route(self, url: str):
+        """Request for a canonical URL this shard owns; otherwise hand it to its owner (None)."""
+        if self.owns(url):
+            return self.follow_request(url)
+        if self.exchange is not None and self.exchange.send(self.owner(url), url):
+            self.crawler.stats.inc_value("shard/links_handed_off")
+        return None
+
+    def exchanged_requests(self, force: bool = False):
+        """Requests for the links other shards handed to this one (at most every exchange_interval)."""
+        if self.exchange is None:
+            return []
+        now = time.monotonic()
+        if not force and now - self._exchanged_at < self.exchange_interval:
+            return []
+        self._exchanged_at = now
+        self.exchange.flush()
+        urls = self.exchange.receive()
+        if urls:
+            self.crawler.stats.inc_value("shard/links_received", len(urls))
+        return [self.follow_request(url) for url in urls]
+
+    def spider_idle(self, spider):
+        requests = self.exchanged_requests(force=True)
+        if requests:
+            self.exchange.set_state(ACTIVE)
+            for request in requests:
+                self.crawler.engine.crawl(request)
+            raise DontCloseSpider
+        if self.exchange.state != IDLE:
+            self.exchange.set_state(IDLE)
+        if not self.exchange.settled():
+            # Other shards may still hand links to this one
+            raise DontCloseSpider
 
     def is_excluded(self, url: str) -> bool:
-        return any(part in url for part in EXCLUDE_SUBSTRINGS)
+        return _is_excluded(url)
 
     def is_html(self, response: scrapy.http.Response) -> bool:
         ctype = response.headers.get(b'Content-Type', b'').decode('latin-1').lower()
@@ -67,10 +157,10 @@ class DMISpider(scrapy.Spider):
     def should_follow(self, url: str) -> bool:
         if self.is_excluded(url):
             return False
-        if any(url.lower().endswith('.' + ext) for ext in self.DENY_EXTENSIONS):
+        if self.has_denied_extension(url):
             return False
         parsed = urlparse(url)
-        if parsed.netloc and parsed.netloc not in self.allowed_domains:
+        if parsed.hostname and parsed.hostname not in self.allowed_domains:
             return False
         return True
 
@@ -88,13 +178,61 @@ class DMISpider(scrapy.Spider):
             },
             content=response.text, #Page HTML
         )
-        # Yield item if not excluded
+        # Yield item if not excluded; a page redirected to another shard's URL goes to that shard
         if not self.is_excluded(response.url):
-            self.logger.info(f"Processing: {response.url}")
-            yield item
+            canonical = self.canonicalize(response.url)
+            if self.owns(canonical):
+                self.logger.info(f"Processing: {response.url}")
+                yield item
+            elif self.exchange is not None:
+                self.exchange.send(self.owner(canonical), canonical)
 
         # extract links and follow
         for link in self.link_extractor.extract_links(response):
             url = link.url.split('#')[0]
             if self.should_follow(url):
-                yield scrapy.Request(url, callback=self.parse)
+                request = self.route(self.canonical_url(url))
+                if request is not None:
+                    yield request
+        yield from self.exchanged_requests()
+
+    def follow_request(self, url: str) -> scrapy.Request:
+        """Request for a canonical URL."""
+        return scrapy.Request(url, callback=self.parse)
+
+    def canonicalize(self, url: str) -> str:
+        return canonicalize_url(url, force_https=self.force_https, strip_trailing_slash=self.strip_trailing_slash)
+
+    def canonical_url(self, url: str) -> str:
+        canonical = self.canonicalize(url)
+        if url not in self._seen_raw_urls:
+            self._seen_raw_urls.add(url)
+            if canonical in self._seen_canonical_urls:
+                self.crawler.stats.inc_value("urls/duplicates_avoided")
+            self._seen_canonical_urls.add(canonical)
+        return canonical
+
+    def item_scraped(self, item, response, spider):
+        if self.manifest_path is None:
+            return
+        metadata = item.get("metadata") or {}
+        if metadata.get("url"):
+            self.manifest_items[metadata["url"]] = metadata.get("content_hash")
+
+    def closed(self, reason: str):
+        if self.exchange is not None:
+            self.exchange.close()
+        if self.manifest_path is None:
+            return
+        manifest = {
+            "spider": self.name,
+            "shard": self.shard,
+            "shards": self.shards,
+            "reason": reason,
+            "resumed": self.resumed,
+            "stats": self.crawler.stats.get_stats(),
+            "items": self.manifest_items,
+        }
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        self.manifest_path.write_text(json.dumps(manifest, default=str), encoding="utf-8")
+        self.logger.info(f"Manifest with {len(self.manifest_items)} items written to {self.manifest_path}")
@@ -0,0 +1,146 @@
+import hashlib
+import re
+from typing import Iterable
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+# Query parameters that only identify a session or a tracking campaign
+SESSION_PARAMS = frozenset([
+    'phpsessid', 'jsessionid', 'sid', 'sessionid', 'session_id',
+    'fbclid', 'gclid', 'mc_cid', 'mc_eid',
+])
+SESSION_PARAM_PREFIXES = ('utm_',)
+
+_PATH_SESSION_RE = re.compile(r';jsessionid=[^/?#]*', re.IGNORECASE)
+_MULTI_SLASH_RE = re.compile(r'/{2,}')
+
+# Links containing any of these are neither followed nor emitted
+EXCLUDE_SUBSTRINGS = [
+    'admin',
+    'avvisi-docente',
+    'avvisi',
+    'archivio',
+    '?eng',
+    '/en/',
+    '&eng',
+    'bandi',
+    'courses',
+    'notizie',
+    'faculty',
+    'seuid',
+    'uid',
+    'calendario',
+    'francesco.russo',
+    'vittorio.romano'
+]
+
+# deny common non-html extensions + anything Scrapy already ignores
+DENY_EXTENSIONS = frozenset([
+    # archives
+    '7z', '7zip', 'bz2', 'rar', 'tar', 'tar.gz', 'xz', 'zip',
+    # images
+    'mng', 'pct', 'bmp', 'gif', 'jpg', 'jpeg', 'png', 'pst', 'psp', 'tif', 'tiff', 'ai', 'drw', 'dxf', 'eps', 'ps', 'svg', 'cdr', 'ico',
+    # audio
+    'mp3', 'wma', 'ogg', 'wav', 'ra', 'aac', 'mid', 'au', 'aiff',
+    # video
+    '3gp', 'asf', 'asx', 'avi', 'mov', 'mp4', 'mpg', 'qt', 'rm', 'swf', 'wmv', 'm4a', 'm4v', 'flv', 'webm',
+    # office suites
+    'xls', 'xlsx', 'ppt', 'pptx', 'pps', 'doc', 'docx', 'odt', 'ods', 'odg', 'odp',
+    # other
+    'css', 'pdf', 'exe', 'bin', 'rss', 'dmg', 'iso', 'apk',
+])
+
+
+class SubstringMatcher:
+    """
+    Precompiled "does the URL contain any of these substrings" check.
+
+    The alternation is compiled once, so each lookup is a single regex
+    search instead of one `in` test per substring.
+    """
+
+    def __init__(self, substrings: Iterable[str]):
+        parts = sorted(set(substrings), key=len, reverse=True)
+        self._regex = re.compile('|'.join(re.escape(p) for p in parts)) if parts else None
+
+    def __call__(self, url: str) -> bool:
+        return self._regex is not None and self._regex.search(url) is not None
+
+
+class ExtensionMatcher:
+    """
+    Set lookup on the last one or two dot-separated suffixes of the URL,
+    equivalent to `url.lower().endswith('.' + ext)` for every ext.
+    """
+
+    def __init__(self, extensions: Iterable[str]):
+        self.extensions = frozenset(e.lower().lstrip('.') for e in extensions)
+
+    def __call__(self, url: str) -> bool:
+        tail = url.rsplit('/', 1)[-1].lower()
+        parts = tail.rsplit('.', 2)
+        if len(parts) < 2:
+            return False
+        if parts[-1] in self.extensions:
+            return True
+        return len(parts) == 3 and f"{parts[-2]}.{parts[-1]}" in self.extensions
+
+
+def canonicalize_url(url: str, force_https: bool = True, strip_trailing_slash: bool = False) -> str:
+    """
+    Normalize a URL so that variants of the same page map to one string:
+    lowercase scheme/host, https, no default port, no fragment, no session
+    or tracking parameters, query sorted by key, no duplicate slashes.
+
+    The query is reordered as raw `key[=value]` segments, never decoded and
+    re-encoded: `?a` and `?a=` stay distinct, escapes and `+` are kept as
+    sent, and repeated keys keep their relative order.
+
+    The trailing slash is kept unless strip_trailing_slash is set: on a
+    server that redirects /page to /page/ (or the reverse), the wrong form
+    costs a redirect per fetched page.
+    """
+    scheme, netloc, path, query, _ = urlsplit(url.strip())
+    scheme = scheme.lower()
+    if force_https and scheme == 'http':
+        scheme = 'https'
+
+    netloc = netloc.lower()
+    if netloc.endswith(':80') or netloc.endswith(':443'):
+        netloc = netloc.rsplit(':', 1)[0]
+
+    path = _PATH_SESSION_RE.sub('', path)
+    path = _MULTI_SLASH_RE.sub('/', path) or '/'
+    if strip_trailing_slash and len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+
+    params = []
+    for segment in query.split('&'):
+        if not segment:
+            continue
+        key = segment.split('=', 1)[0]
+        name = unquote_plus(key).lower()  # decoded for the check only
+        if name not in SESSION_PARAMS and not name.startswith(SESSION_PARAM_PREFIXES):
+            params.append((key, segment))
+    params.sort(key=lambda param: param[0])  # stable: repeated keys keep their order
+    query = '&'.join(segment for _, segment in params)
+
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def shard_of(url: str, shards: int, by: str = "hash") -> int:
+    """
+    Shard owning a (canonical) URL.
+
+    by="hash":   uniform split on the whole URL.
+    by="prefix": split on the first path segment, so a site section stays on
+                 one shard and its intra-section links are not lost.
+    """
+    if shards <= 1:
+        return 0
+    if by == "prefix":
+        key = urlsplit(url).path.strip('/').split('/', 1)[0]
+    elif by == "hash":
+        key = url
+    else:
+        raise ValueError(f"Unknown shard strategy: {by!r}")
+    return int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:8], 'big') % shards
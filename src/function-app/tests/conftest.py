@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The Scrapy project package lives in scraper/scraper (scrapy.cfg sits in scraper/)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scraper"))
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from scraper.chunking import chunk_markdown, split_sections
+
+
+def page(rng, sections=6, words=700):
+    vocabulary = [f"parola{i}" for i in range(2000)]
+    parts = []
+    for i in range(sections):
+        parts.append(f"## Sezione {i} con un titolo piuttosto lungo per il breadcrumb")
+        for _ in range(3):
+            parts.append(" ".join(rng.choices(vocabulary, k=words // 3)))
+    return "\n\n".join(parts)
+
+
+def test_chunks_fit_max_chars_with_breadcrumb():
+    rng = random.Random(5)
+    title = "Corso di Laurea in Informatica L-31 - Dipartimento di Matematica e Informatica"
+    for max_chars in (500, 1000, 2000):
+        chunks = chunk_markdown("https://web.dmi.unict.it/corsi/l-31", title, page(rng), max_chars=max_chars)
+        assert len(chunks) > 1
+        assert max(len(c["content"]) for c in chunks) <= max_chars
+        assert all(c["content"].startswith(title) for c in chunks)
+
+
+def test_overlong_breadcrumb_is_truncated():
+    title = "T" * 1000
+    chunks = chunk_markdown("https://x/y", title, "testo " * 400, max_chars=400, min_chars=10)
+    assert max(len(c["content"]) for c in chunks) <= 400
+
+
+def test_chunk_ids_stable_across_unrelated_edits():
+    rng = random.Random(9)
+    markdown = page(rng)
+    edited = markdown.replace("## Sezione 5", "## Sezione 5\n\nparagrafo aggiunto", 1)
+
+    def untouched(text):
+        chunks = chunk_markdown("https://x/y", "Titolo", text)
+        return {c["chunk_id"]: c["content_hash"] for c in chunks if "Sezione 5" not in c["heading"]}
+
+    assert untouched(markdown) and untouched(markdown) == untouched(edited)
+
+
+def test_split_sections_setext_and_atx():
+    sections = split_sections("Titolo\n======\n\nintro\n\n## Orari\n\nlunedi")
+    assert [path for path, _ in sections] == [["Titolo"], ["Titolo", "Orari"]]
+
+
+def test_chunking_pipeline_is_opt_in():
+    pytest.importorskip("markdownify")
+    from scrapy.exceptions import NotConfigured
+    from scrapy.utils.test import get_crawler
+    from scraper.pipelines import ChunkingPipeline
+
+    with pytest.raises(NotConfigured):
+        ChunkingPipeline.from_crawler(get_crawler(settings_dict={}))
+    pipeline = ChunkingPipeline.from_crawler(get_crawler(settings_dict={"CHUNKING_ENABLED": True, "CHUNK_MAX_CHARS": 500}))
+    assert pipeline.max_chars == 500
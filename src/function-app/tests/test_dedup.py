@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from scraper.dedup import NearDuplicateIndex, _choose_bands, candidate_probability
+
+
+def random_hashes(rng, n):
+    return frozenset(rng.sample(range(1 << 32), n))
+
+
+def near_copy(rng, hashes, shared):
+    """A set with `shared` of the elements of `hashes` and new ones for the rest."""
+    kept = rng.sample(sorted(hashes), shared)
+    return frozenset(kept) | random_hashes(rng, len(hashes) - shared)
+
+
+def test_bands_put_threshold_past_the_steep_part():
+    for threshold in (0.8, 0.85, 0.9, 0.95):
+        bands, rows = _choose_bands(128, threshold)
+        assert bands * rows <= 128
+        assert candidate_probability(threshold, bands, rows) >= 0.99
+        # One more row per band would drop below the target recall
+        assert candidate_probability(threshold, 128 // (rows + 1), rows + 1) < 0.99
+
+
+def test_default_bands():
+    assert _choose_bands(128, 0.9) == (12, 10)
+
+
+def test_recall_at_threshold():
+    rng = random.Random(7)
+    index = NearDuplicateIndex(threshold=0.9, num_perm=128)
+    pairs = []
+    for i in range(100):
+        base = random_hashes(rng, 200)
+        copy = near_copy(rng, base, 190)  # Jaccard 190/210 = 0.905
+        index.add(f"page-{i}", index.signature("", base), base)
+        pairs.append((f"page-{i}", copy))
+
+    found = 0
+    for key, copy in pairs:
+        match = index.query(index.signature("", copy), copy)
+        if match is not None:
+            assert match[0] == key
+            assert abs(match[1] - 190 / 210) < 1e-9
+            found += 1
+    assert found >= 95
+
+
+def test_candidates_below_threshold_are_rejected_by_exact_similarity():
+    rng = random.Random(11)
+    index = NearDuplicateIndex(threshold=0.9, num_perm=128)
+    base = random_hashes(rng, 200)
+    index.add("base", index.signature("", base), base)
+    for _ in range(50):
+        copy = near_copy(rng, base, 170)  # Jaccard 170/230 = 0.74
+        assert index.query(index.signature("", copy), copy) is None
+
+
+def test_text_near_duplicate():
+    rng = random.Random(3)
+    vocabulary = [f"parola{i}" for i in range(5000)]
+    index = NearDuplicateIndex()
+    words = rng.choices(vocabulary, k=800)
+    page = " ".join(words)
+    edited = " ".join(words[:400] + ["modificata"] + words[401:])
+    other = " ".join(rng.choices(vocabulary, k=800))
+
+    hashes = index.shingle_hashes(page)
+    index.add("page", index.signature(page, hashes), hashes)
+
+    edited_hashes = index.shingle_hashes(edited)
+    match = index.query(index.signature(edited, edited_hashes), edited_hashes)
+    assert match is not None and match[0] == "page" and match[1] >= 0.9
+    other_hashes = index.shingle_hashes(other)
+    assert index.query(index.signature(other, other_hashes), other_hashes) is None
+
+
+def test_signature_only_falls_back_to_estimate():
+    index = NearDuplicateIndex()
+    text = " ".join(f"w{i}" for i in range(300))
+    index.add("page", index.signature(text))
+    assert index.query(index.signature(text)) == ("page", 1.0)
+
+
+def test_signature_agreement_estimates_jaccard():
+    # Small sets leave most bins empty: densification must keep the estimate unbiased
+    rng = random.Random(13)
+    index = NearDuplicateIndex(num_perm=128)
+    for size in (20, 500):
+        errors = []
+        for _ in range(400):
+            base = random_hashes(rng, size)
+            copy = near_copy(rng, base, round(size * 0.8))
+            estimate = index.similarity(index.signature("", base), index.signature("", copy))
+            errors.append(estimate - index.jaccard(base, copy))
+        assert abs(sum(errors) / len(errors)) < 0.02
+
+
+# -------------------------------
+# Duplicate pages leave the blob container and the index
+# -------------------------------
+def pages(rng, n, words=300):
+    vocabulary = [f"parola{i}" for i in range(5000)]
+    return [" ".join(rng.choices(vocabulary, k=words)) for _ in range(n)]
+
+
+def cleaned(pipeline, url, text):
+    item = {"content": f"<html><body><main id='it-main'><p>{text}</p></main></body></html>", "metadata": {"url": url}}
+    return pipeline.process_item(item, SimpleNamespace(logger=logging.getLogger("test")))
+
+
+def test_duplicates_of_another_url_are_dropped_as_duplicate_pages():
+    pytest.importorskip("markdownify")
+    from scrapy.exceptions import DropItem
+    from scraper.pipelines import CleaningPipeline, DuplicatePage
+
+    page, other = pages(random.Random(5), 2)
+    pipeline = CleaningPipeline()
+    cleaned(pipeline, "https://web.dmi.unict.it/a", page)
+    cleaned(pipeline, "https://web.dmi.unict.it/b", other)
+    with pytest.raises(DuplicatePage):
+        cleaned(pipeline, "https://web.dmi.unict.it/a-2024", page)  # exact
+    with pytest.raises(DuplicatePage, match="Near-duplicate of https://web.dmi.unict.it/b"):
+        cleaned(pipeline, "https://web.dmi.unict.it/b-2024", other.replace("parola", "parola ", 1))
+    with pytest.raises(DropItem) as dropped:
+        cleaned(pipeline, "https://web.dmi.unict.it/a", page)  # the kept page itself, emitted twice
+    assert not isinstance(dropped.value, DuplicatePage)
+
+
+def test_duplicate_pages_take_the_deletion_path_of_gone_pages():
+    pytest.importorskip("markdownify")
+    from scrapy.exceptions import DropItem
+    from scraper.pipelines import AzureBlobPipeline, DuplicatePage, SearchIndexPipeline
+
+    spider = SimpleNamespace(logger=logging.getLogger("test"))
+    dup, kept = "https://web.dmi.unict.it/b-2024", "https://web.dmi.unict.it/b"
+    dup_id = hashlib.sha1(dup.encode("utf-8")).hexdigest()
+
+    class Container:
+        blobs = {f"{dup_id}.md": "h1", f"{dup_id}/c1.md": "h2"}
+        deleted = []
+
+        def list_blobs(self, name_starts_with, include):
+            return [SimpleNamespace(name=n, metadata={"content_hash": h})
+                    for n, h in self.blobs.items() if n.startswith(name_starts_with)]
+
+        def delete_blob(self, name):
+            self.deleted.append(name)
+
+    class Indexer:
+        existing = {"d1": {"url": dup}, "d2": {"url": dup}, "k1": {"url": kept}}
+        deleted = []
+
+        def delete(self, key):
+            self.deleted.append(key)
+
+    blobs = AzureBlobPipeline()
+    blobs.enabled, blobs.container = True, Container()
+    index = SearchIndexPipeline()
+    index.indexer = Indexer()
+    for pipeline in (blobs, index):
+        pipeline.item_dropped({"metadata": {"url": kept}}, None, DropItem("Content too short"), spider)
+        pipeline.item_dropped({"metadata": {"url": dup}}, None, DuplicatePage(f"Near-duplicate of {kept}"), spider)
+    index.delete_gone(spider)
+
+    assert sorted(Container.deleted) == sorted(Container.blobs)
+    assert sorted(Indexer.deleted) == ["d1", "d2"]
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from scraper.indexing import BatchIndexer, documents_for_item
+
+
+class PayloadTooLarge(Exception):
+    status_code = 413
+
+
+class Result:
+    def __init__(self, key, succeeded=True, status_code=200):
+        self.key = key
+        self.succeeded = succeeded
+        self.status_code = status_code
+        self.error_message = "" if succeeded else "failed"
+
+
+class FakeSearchClient:
+    """merge_or_upload_documents answers 413 above `max_docs` per request."""
+
+    def __init__(self, max_docs=None, fail_once=(), delay=0.0, existing=()):
+        self.max_docs = max_docs
+        self.fail_once = set(fail_once)
+        self.delay = delay
+        self.existing = list(existing)
+        self.calls = []
+        self.accepted = []
+        self.indexed = {}
+        self.deleted = []
+        self.lock = threading.Lock()
+
+    def search(self, search_text, select):
+        return iter(self.existing)
+
+    def merge_or_upload_documents(self, documents):
+        with self.lock:
+            self.calls.append(len(documents))
+        if self.max_docs and len(documents) > self.max_docs:
+            raise PayloadTooLarge("Request Entity Too Large")
+        time.sleep(self.delay)
+        with self.lock:
+            self.accepted.append(len(documents))
+        results = []
+        for doc in documents:
+            with self.lock:
+                if doc["id"] in self.fail_once:
+                    self.fail_once.discard(doc["id"])
+                    results.append(Result(doc["id"], succeeded=False, status_code=503))
+                    continue
+                self.indexed[doc["id"]] = doc
+            results.append(Result(doc["id"]))
+        return results
+
+    def delete_documents(self, documents):
+        self.deleted.extend(d["id"] for d in documents)
+        return [Result(d["id"]) for d in documents]
+
+
+def docs(n, prefix="d"):
+    return [{"id": f"{prefix}{i}", "content_hash": f"h{i}"} for i in range(n)]
+
+
+def test_batch_split_on_413():
+    client = FakeSearchClient(max_docs=30)
+    indexer = BatchIndexer(client, batch_size=100, max_concurrency=2, backoff_seconds=0)
+    for doc in docs(250):
+        indexer.add(doc)
+    summary = indexer.close()
+
+    assert len(client.indexed) == 250
+    assert summary["sent"] == 250 and summary["failed"] == 0
+    assert 100 in client.calls  # full batches were tried first, then split
+    assert max(client.accepted) <= 30 and sum(client.accepted) == 250
+
+
+def test_partial_failures_are_retried_alone():
+    client = FakeSearchClient(fail_once={"d3", "d7"})
+    indexer = BatchIndexer(client, batch_size=10, backoff_seconds=0)
+    for doc in docs(10):
+        indexer.add(doc)
+    summary = indexer.close()
+    assert len(client.indexed) == 10
+    assert summary["retried"] == 2
+    assert client.calls == [10, 2]
+
+
+def test_unchanged_documents_are_skipped_and_stale_chunks_found():
+    existing = [{"id": "c1", "content_hash": "h1", "parent_id": "p", "url": "u"},
+                {"id": "c2", "content_hash": "old", "parent_id": "p", "url": "u"}]
+    client = FakeSearchClient(existing=existing)
+    indexer = BatchIndexer(client)
+    assert indexer.load_existing() == 2
+    assert not indexer.add({"id": "c1", "content_hash": "h1"})
+    assert indexer.stale_keys("p", {"c1"}) == ["c2"]
+    indexer.close()
+
+
+def test_queuing_never_blocks_and_reports_backlog():
+    client = FakeSearchClient(delay=0.2)
+    indexer = BatchIndexer(client, batch_size=1, max_concurrency=1, backoff_seconds=0)
+    started = time.monotonic()
+    for doc in docs(4):
+        indexer.add(doc)  # four batches, one worker
+    assert time.monotonic() - started < 0.1
+    assert indexer.backlogged()
+    indexer.wait_for_capacity()
+    assert not indexer.backlogged()
+    indexer.close()
+    assert len(client.indexed) == 4
+
+
+def test_documents_for_item():
+    item = {"metadata": {"url": "u", "title": "t", "content_hash": "ph"}, "content": "page"}
+    assert documents_for_item(item, "p") == [
+        {"parent_id": "p", "url": "u", "title": "t", "id": "p", "heading": "", "content": "page", "content_hash": "ph"}
+    ]
+    item["chunks"] = [{"chunk_id": "c", "heading": "h", "content": "x", "content_hash": "ch"}]
+    assert [d["id"] for d in documents_for_item(item, "p")] == ["c"]
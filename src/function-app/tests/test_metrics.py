@@ -0,0 +1,130 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from scraper.metrics import Gauge, Histogram, MetricsRecorder, get_recorder
+
+
+def test_empty_histogram():
+    hist = Histogram()
+    assert hist.percentile(0.5) == 0.0
+    assert hist.summary() == {"count": 0}
+
+
+def test_percentile_is_the_upper_bound_of_its_bucket():
+    hist = Histogram()
+    for _ in range(90):
+        hist.observe(0.001)  # exactly a bucket bound: counted in that bucket
+    for _ in range(10):
+        hist.observe(1.0)
+    assert hist.percentile(0.5) == pytest.approx(0.001)
+    assert hist.percentile(0.9) == pytest.approx(0.001)
+    assert hist.percentile(0.99) == pytest.approx(1.0)
+
+    hist = Histogram()
+    hist.observe(0.0012)
+    hist.observe(0.005)
+    assert hist.percentile(0.5) == pytest.approx(10 ** -2.75)  # 0.0012 is in (0.001, 0.00178]
+
+
+def test_percentile_is_capped_at_the_max_and_overflow_reports_it():
+    hist = Histogram()
+    hist.observe(0.0012)
+    assert hist.percentile(0.5) == 0.0012
+    hist = Histogram()
+    hist.observe(250.0)  # beyond the last bound (100s)
+    assert hist.percentile(0.99) == 250.0
+
+
+def test_histogram_summary():
+    hist = Histogram()
+    for value in (0.1, 0.2, 0.3):
+        hist.observe(value)
+    summary = hist.summary()
+    assert summary["count"] == 3
+    assert summary["total"] == pytest.approx(0.6)
+    assert summary["mean"] == pytest.approx(0.2)
+    assert (summary["min"], summary["max"]) == (0.1, 0.3)
+    assert summary["p50"] <= summary["p90"] <= summary["p99"] <= summary["max"]
+
+
+def test_gauge_summary():
+    gauge = Gauge()
+    assert gauge.summary() == {"samples": 0}
+    for depth in (4, 10, 1):
+        gauge.observe(depth)
+    assert gauge.summary() == {"samples": 3, "mean": 5.0, "max": 10, "last": 1}
+
+
+def test_recorder_times_stages_even_when_they_raise():
+    recorder = MetricsRecorder()
+    with recorder.time("clean.hash"):
+        pass
+    with pytest.raises(ValueError):
+        with recorder.time("clean.hash"):
+            raise ValueError
+    recorder.inc("pages")
+    recorder.inc("bytes_downloaded", 512)
+    assert recorder.histograms["clean.hash"].count == 2
+    assert recorder.counters == {"pages": 1, "bytes_downloaded": 512}
+
+
+# -------------------------------
+# CrawlMetrics extension
+# -------------------------------
+@pytest.fixture
+def crawl(tmp_path):
+    pytest.importorskip("markdownify")  # CrawlMetrics imports the pipelines
+    from scrapy import Spider
+    from scrapy.utils.test import get_crawler
+    from scraper.extensions import CrawlMetrics
+
+    crawler = get_crawler(Spider, {"METRICS_REPORT_DIR": str(tmp_path)})
+    return crawler, CrawlMetrics.from_crawler(crawler), Spider(name="dmi_full")
+
+
+def test_recorder_is_shared_per_crawler(crawl):
+    from scrapy import Spider
+    from scrapy.utils.test import get_crawler
+
+    crawler, ext, _ = crawl
+    assert get_recorder(crawler) is ext.recorder
+    assert get_recorder(get_crawler(Spider)) is not ext.recorder
+
+
+def test_signals_feed_the_report_written_at_close(crawl, tmp_path):
+    from scrapy import signals
+    from scrapy.exceptions import DropItem
+    from scrapy.http import HtmlResponse, Request
+
+    crawler, ext, spider = crawl
+    url = "https://web.dmi.unict.it/corsi/l-31"
+    request = Request(url, meta={"download_latency": 0.25})
+    crawler.signals.send_catch_log(signals.response_received, response=HtmlResponse(url, body=b"x" * 100),
+                                   request=request, spider=spider)
+    crawler.signals.send_catch_log(signals.item_scraped, item={}, response=None, spider=spider)
+    for reason in ("Near-duplicate of https://web.dmi.unict.it/a", "Near-duplicate of https://web.dmi.unict.it/b",
+                   "Old academic year content: 2023/2024"):
+        crawler.signals.send_catch_log(signals.item_dropped, item={}, response=None, exception=DropItem(reason),
+                                       spider=spider)
+    ext.recorder.observe("clean.hash", 0.002)
+    crawler.signals.send_catch_log(signals.spider_closed, spider=spider, reason="finished")
+
+    [path] = list(tmp_path.glob("dmi_full-*.json"))
+    report = json.loads(path.read_text(encoding="utf-8"))
+    assert (report["spider"], report["reason"], report["shard"], report["shards"]) == ("dmi_full", "finished", 0, 1)
+    assert report["counters"] == {"pages": 1, "bytes_downloaded": 100, "items": 1}
+    assert report["bytes"] == {"downloaded": 100, "uploaded": 0}
+    assert report["drop_reasons"] == {"Near-duplicate": 2, "Old academic year content": 1}
+    assert report["stages"]["download"]["count"] == 1 and report["stages"]["download"]["max"] == 0.25
+    assert report["stages"]["clean.hash"]["count"] == 1
+    assert set(report["queue_depths"]) == {"scheduler", "downloader", "scraper"}
+
+
+def test_report_name_carries_the_shard(crawl):
+    _, ext, spider = crawl
+    finished = datetime(2025, 3, 1, 1, 2, 3, tzinfo=timezone.utc)
+    assert ext.report_name(spider, finished) == "dmi_full-20250301T010203Z.json"
+    spider.shard, spider.shards = 1, 4
+    assert ext.report_name(spider, finished) == "dmi_full-20250301T010203Z-shard1of4.json"
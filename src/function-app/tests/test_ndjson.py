@@ -0,0 +1,22 @@
+from scraper.ndjson import NDJSONWriter, corpus_files, iter_records
+
+
+def test_rotation_counts_encoded_bytes(tmp_path):
+    records = [{"metadata": {"url": f"https://x/{i}"}, "content": "perché è già così " * 20} for i in range(50)]
+    writer = NDJSONWriter(tmp_path, "pages", max_bytes=4096)
+    for record in records:
+        writer.write(record)
+    writer.close()
+
+    files = corpus_files(tmp_path, stem="pages")
+    assert len(files) > 1
+    assert all(path.stat().st_size <= 4096 for path in files)
+    assert list(iter_records(files)) == records
+
+
+def test_gzip_round_trip(tmp_path):
+    writer = NDJSONWriter(tmp_path, "raw", compression="gzip")
+    writer.write({"content": "àèìòù"})
+    writer.close()
+    assert [p.name for p in corpus_files(tmp_path)] == ["raw.ndjson.gz"]
+    assert list(iter_records(corpus_files(tmp_path))) == [{"content": "àèìòù"}]
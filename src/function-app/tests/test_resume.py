@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip("scrapy")
+
+from scraper.spiders.site_spider import FINISHED_MARKER, jobdir_resumes  # noqa: E402
+
+
+def test_fresh_jobdir_does_not_resume(tmp_path):
+    assert not jobdir_resumes(None)
+    assert not jobdir_resumes(tmp_path)
+    (tmp_path / "requests.seen").write_text("")
+    assert not jobdir_resumes(tmp_path)
+
+
+def test_interrupted_jobdir_resumes(tmp_path):
+    (tmp_path / "requests.seen").write_text("0123abcd\n")
+    assert jobdir_resumes(tmp_path)
+
+
+def test_finished_jobdir_does_not_resume(tmp_path):
+    (tmp_path / "requests.seen").write_text("0123abcd\n")
+    (tmp_path / FINISHED_MARKER).touch()
+    assert not jobdir_resumes(tmp_path)
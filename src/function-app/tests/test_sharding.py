@@ -0,0 +1,255 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from scraper.sharding import ACTIVE, CLOSED, IDLE, ShardExchange, mark_closed, read_status
+from scraper.urls import shard_of
+
+SCRAPER_DIR = Path(__file__).resolve().parents[1] / "scraper"
+SECTIONS = ["corsi", "docenti", "ricerca", "servizi", "orari", "didattica"]
+
+
+def site_graph(pages_per_section=20):
+    """
+    Path -> linked paths. The home page links to every section index; each
+    section is a chain of pages; some sections are only reachable through
+    links from another section's pages (docenti from corsi, orari from
+    didattica), like staff pages linked from course pages.
+    """
+    graph = {"/": [f"/{s}/" for s in SECTIONS if s not in ("docenti", "orari")]}
+    for section in SECTIONS:
+        pages = [f"/{section}/"] + [f"/{section}/pagina-{i}" for i in range(pages_per_section)]
+        for page, following in zip(pages, pages[1:] + [None]):
+            graph[page] = [following] if following else []
+    for i in range(0, pages_per_section, 4):
+        graph[f"/corsi/pagina-{i}"].append(f"/docenti/pagina-{i}")
+        graph[f"/didattica/pagina-{i}"].append(f"/orari/pagina-{i}")
+    graph["/corsi/pagina-0"].append("/docenti/")
+    graph["/didattica/pagina-0"].append("/orari/")
+    return graph
+
+
+def reachable(graph, start="/"):
+    seen, queue = {start}, deque([start])
+    while queue:
+        for link in graph[queue.popleft()]:
+            if link not in seen:
+                seen.add(link)
+                queue.append(link)
+    return seen
+
+
+class SimulatedShard:
+    """DMISpider's routing in one step-by-step process: fetch, emit if owned, route links."""
+
+    def __init__(self, graph, shard, shards, by, exchange_dir):
+        self.graph, self.shard, self.shards, self.by = graph, shard, shards, by
+        self.exchange = ShardExchange(exchange_dir, shard, shards) if exchange_dir else None
+        self.frontier = deque(["/"])  # start URLs are fetched by every shard
+        self.seen, self.emitted = set(), set()
+        self.done = False
+
+    def owns(self, path):
+        return shard_of(f"https://web.dmi.unict.it{path}", self.shards, self.by) == self.shard
+
+    def step(self):
+        if self.frontier:
+            path = self.frontier.popleft()
+            if path in self.seen:
+                return
+            self.seen.add(path)
+            if self.owns(path):
+                self.emitted.add(path)
+            for link in self.graph[path]:
+                if self.owns(link):
+                    self.frontier.append(link)
+                elif self.exchange is not None:
+                    owner = shard_of(f"https://web.dmi.unict.it{link}", self.shards, self.by)
+                    self.exchange.send(owner, link)
+            return
+        # Idle: like spider_idle
+        if self.exchange is None:
+            self.done = True
+            return
+        received = self.exchange.receive()
+        if received:
+            self.exchange.set_state(ACTIVE)
+            self.frontier.extend(received)
+        elif self.exchange.state != IDLE:
+            self.exchange.set_state(IDLE)
+        elif self.exchange.settled():
+            self.exchange.close()
+            self.done = True
+
+
+def simulate(graph, shards, by, exchange_dir):
+    workers = [SimulatedShard(graph, shard, shards, by, exchange_dir) for shard in range(shards)]
+    for _ in range(100000):
+        if all(w.done for w in workers):
+            break
+        for worker in workers:
+            if not worker.done:
+                worker.step()
+    else:
+        pytest.fail("sharded crawl did not terminate")
+    emitted = [w.emitted for w in workers]
+    assert sum(len(e) for e in emitted) == len(set().union(*emitted)), "a page was emitted by two shards"
+    return set().union(*emitted)
+
+
+@pytest.mark.parametrize("by", ["hash", "prefix"])
+@pytest.mark.parametrize("shards", [2, 3, 5])
+def test_sharded_coverage_matches_unsharded(tmp_path, by, shards):
+    graph = site_graph()
+    assert simulate(graph, shards, by, tmp_path / "exchange") == reachable(graph)
+
+
+def test_without_exchange_shards_lose_pages(tmp_path):
+    graph = site_graph()
+    assert len(simulate(graph, 3, "hash", None)) < len(reachable(graph)) // 2
+
+
+def test_exchange_counts_and_partial_lines(tmp_path):
+    a = ShardExchange(tmp_path, 0, 2)
+    b = ShardExchange(tmp_path, 1, 2)
+    assert a.send(1, "https://x/1") and not a.send(1, "https://x/1")
+    a.flush()
+    with open(tmp_path / "inbox-1" / "from-0.txt", "a", encoding="utf-8") as f:
+        f.write("https://x/partial")  # being written: no newline yet
+    assert b.receive() == ["https://x/1"]
+    assert b.received == {0: 1}
+    with open(tmp_path / "inbox-1" / "from-0.txt", "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert b.receive() == ["https://x/partial"]
+
+
+def test_not_quiescent_while_links_are_in_flight(tmp_path):
+    a = ShardExchange(tmp_path, 0, 2)
+    b = ShardExchange(tmp_path, 1, 2)
+    a.send(1, "https://x/1")
+    a.set_state(IDLE)
+    b.set_state(IDLE)
+    assert a.quiescent() is None  # b has not read the link yet
+    b.receive()
+    b.set_state(IDLE)
+    assert a.quiescent() is not None
+    assert not a.settled() and a.settled()
+
+
+def test_closed_shard_is_not_waited_for(tmp_path):
+    a = ShardExchange(tmp_path, 0, 2)
+    ShardExchange(tmp_path, 1, 2)  # started, then crashed
+    a.send(1, "https://x/1")
+    a.set_state(IDLE)
+    assert a.quiescent() is None
+    mark_closed(tmp_path, 1)
+    assert read_status(tmp_path, 1)["state"] == CLOSED
+    assert a.quiescent() is not None
+
+
+# -------------------------------
+# Local stand-in site, real spiders
+# -------------------------------
+def serve(graph):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            links = graph.get(self.path)
+            if links is None:
+                self.send_error(404)
+                return
+            body = "<html><head><title>{0}</title></head><body><h1>{0}</h1>{1}</body></html>".format(
+                self.path, "".join(f'<a href="{link}">{link}</a>' for link in links)
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def crawl_cmd(site, manifest, *extra):
+    return [
+        sys.executable, "-m", "scrapy", "crawl", "dmi_full",
+        "-a", f"site={site}", "-a", f"manifest={manifest}", *extra,
+        "-s", "ITEM_PIPELINES={}", "-s", "EXTENSIONS={}", "-s", "ROBOTSTXT_OBEY=False",
+        "-s", "LOG_LEVEL=WARNING",
+    ]
+
+
+def manifest_paths(path):
+    site_items = json.loads(Path(path).read_text(encoding="utf-8"))["items"]
+    return {url.split("127.0.0.1", 1)[1].split("/", 1)[1] for url in site_items}
+
+
+@pytest.mark.parametrize("by", ["hash", "prefix"])
+def test_stand_in_site_sharded_vs_unsharded(tmp_path, by):
+    pytest.importorskip("scrapy")
+    graph = site_graph(pages_per_section=10)
+    server = serve(graph)
+    site = f"http://127.0.0.1:{server.server_address[1]}/"
+    env = {**os.environ, "SCRAPY_SETTINGS_MODULE": "scraper.settings"}
+    try:
+        subprocess.run(crawl_cmd(site, tmp_path / "full.json"), cwd=SCRAPER_DIR, env=env, check=True, timeout=120)
+        shards = 3
+        procs = [
+            subprocess.Popen(crawl_cmd(
+                site, tmp_path / f"shard-{shard}.json",
+                "-a", f"shard={shard}", "-a", f"shards={shards}", "-a", f"shard_by={by}",
+                "-a", f"exchange={tmp_path / 'exchange'}",
+            ), cwd=SCRAPER_DIR, env=env)
+            for shard in range(shards)
+        ]
+        for proc in procs:
+            assert proc.wait(timeout=180) == 0
+    finally:
+        server.shutdown()
+
+    full = manifest_paths(tmp_path / "full.json")
+    sharded = [manifest_paths(tmp_path / f"shard-{shard}.json") for shard in range(shards)]
+    # Paths are compared without the leading slash: the spider may have canonicalized them
+    assert full == {path.lstrip("/") for path in reachable(graph)}
+    assert set().union(*sharded) == full
+    assert sum(len(s) for s in sharded) == len(full)
+
+
+def test_each_shard_writes_its_own_metrics_report(tmp_path):
+    pytest.importorskip("scrapy")
+    pytest.importorskip("markdownify")  # CrawlMetrics imports the pipelines
+    server = serve(site_graph(pages_per_section=3))
+    site = f"http://127.0.0.1:{server.server_address[1]}/"
+    env = {**os.environ, "SCRAPY_SETTINGS_MODULE": "scraper.settings"}
+    reports = tmp_path / "metrics"
+    shards = 2
+    try:
+        procs = [
+            subprocess.Popen(crawl_cmd(
+                site, tmp_path / f"shard-{shard}.json",
+                "-a", f"shard={shard}", "-a", f"shards={shards}", "-a", f"exchange={tmp_path / 'exchange'}",
+            ) + [  # after crawl_cmd's EXTENSIONS={}, which they override
+                "-s", 'EXTENSIONS={"scraper.extensions.CrawlMetrics": 500}', "-s", f"METRICS_REPORT_DIR={reports}",
+            ], cwd=SCRAPER_DIR, env=env)
+            for shard in range(shards)
+        ]
+        for proc in procs:
+            assert proc.wait(timeout=180) == 0
+    finally:
+        server.shutdown()
+
+    written = list(reports.glob("*.json"))
+    # The shards may close in different seconds: compare the suffixes only
+    assert sorted(p.name.rsplit("-", 1)[1] for p in written) == ["shard0of2.json", "shard1of2.json"]
+    assert sorted(json.loads(p.read_text(encoding="utf-8"))["shard"] for p in written) == [0, 1]
@@ -0,0 +1,57 @@
+from scraper.urls import (
+    DENY_EXTENSIONS,
+    EXCLUDE_SUBSTRINGS,
+    ExtensionMatcher,
+    SubstringMatcher,
+    canonicalize_url,
+)
+
+
+def test_canonicalize_keeps_trailing_slash_by_default():
+    assert canonicalize_url("http://WEB.dmi.unict.it:80//corsi/l-31/#orari") == "https://web.dmi.unict.it/corsi/l-31/"
+    assert canonicalize_url("https://web.dmi.unict.it/corsi/l-31") == "https://web.dmi.unict.it/corsi/l-31"
+
+
+def test_canonicalize_strips_trailing_slash_on_request():
+    assert canonicalize_url("https://web.dmi.unict.it/corsi/l-31/", strip_trailing_slash=True) == \
+        "https://web.dmi.unict.it/corsi/l-31"
+    assert canonicalize_url("https://web.dmi.unict.it/", strip_trailing_slash=True) == "https://web.dmi.unict.it/"
+
+
+def test_canonicalize_drops_session_parameters_and_sorts_query():
+    url = "https://web.dmi.unict.it/orari?canale=2&PHPSESSID=abc&anno=2025&utm_source=x"
+    assert canonicalize_url(url) == "https://web.dmi.unict.it/orari?anno=2025&canale=2"
+
+
+def test_canonicalize_keeps_valueless_keys_as_sent():
+    assert canonicalize_url("https://web.dmi.unict.it/orari?stampa") == "https://web.dmi.unict.it/orari?stampa"
+    assert canonicalize_url("https://web.dmi.unict.it/orari?stampa=") == "https://web.dmi.unict.it/orari?stampa="
+    assert canonicalize_url("https://web.dmi.unict.it/orari?stampa&anno=2025&&sid=1") == \
+        "https://web.dmi.unict.it/orari?anno=2025&stampa"
+
+
+def test_canonicalize_does_not_reencode_values():
+    url = "https://web.dmi.unict.it/cerca?q=analisi+1%20e%202&ordine=%C3%A0"
+    assert canonicalize_url(url) == "https://web.dmi.unict.it/cerca?ordine=%C3%A0&q=analisi+1%20e%202"
+    # Encoded session keys are still recognised
+    assert canonicalize_url("https://web.dmi.unict.it/cerca?q=x&utm%5Fsource=y") == "https://web.dmi.unict.it/cerca?q=x"
+
+
+def test_canonicalize_keeps_the_order_of_repeated_keys():
+    url = "https://web.dmi.unict.it/orari?corso=lm-18&anno=2025&corso=l-31"
+    assert canonicalize_url(url) == "https://web.dmi.unict.it/orari?anno=2025&corso=lm-18&corso=l-31"
+
+
+def test_matchers_agree_with_linear_checks():
+    is_excluded = SubstringMatcher(EXCLUDE_SUBSTRINGS)
+    has_denied_extension = ExtensionMatcher(DENY_EXTENSIONS)
+    urls = [
+        "https://web.dmi.unict.it/corsi/l-31",
+        "https://web.dmi.unict.it/notizie/123",
+        "https://web.dmi.unict.it/docs/orario.PDF",
+        "https://web.dmi.unict.it/docs/sorgenti.tar.gz",
+        "https://web.dmi.unict.it/docs/v1.2",
+    ]
+    for url in urls:
+        assert is_excluded(url) == any(part in url for part in EXCLUDE_SUBSTRINGS)
+        assert has_denied_extension(url) == any(url.lower().endswith("." + ext) for ext in DENY_EXTENSIONS)